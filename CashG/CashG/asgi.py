@@ -9,8 +9,33 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
+from whitenoise.middleware import WhiteNoiseMiddleware
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'CashG.settings')
+# Switches settings to the async views and async-safe middleware
+os.environ.setdefault('CASHG_ASGI', '1')
 
-application = get_asgi_application()
+
+
+class StaticFilesHandler(ASGIStaticFilesHandler):
+    """
+    Serve STATIC_URL requests outside the middleware stack, through WhiteNoise.
+
+    WhiteNoise's middleware is WSGI-only, so it isn't in MIDDLEWARE under
+    ASGI; calling it here, in the handler's worker thread, still gives the
+    collectstatic output with hashed names, immutable cache headers and
+    brotli/gzip negotiation. Files WhiteNoise doesn't know fall back to
+    Django's finder-based view.
+    """
+
+    def __init__(self, application):
+        super().__init__(application)
+        self.whitenoise = WhiteNoiseMiddleware(super().serve)
+
+    def serve(self, request):
+        return self.whitenoise(request)
+
+
+application = StaticFilesHandler(get_asgi_application())
@@ -55,9 +55,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'CashGApp.middleware.QueryMetricsMiddleware',
+    'CashGApp.routers.PinAfterWriteMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'CashGApp.ratelimit.RateLimitMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -71,12 +74,21 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates are kept in memory; with DEBUG on, Django's
+            # autoreloader empties the cache when a template file changes
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'CashGApp.context_processors.idempotency_key',
+                'CashGApp.context_processors.built_assets',
             ],
         },
     },
@@ -84,23 +96,87 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'CashG.wsgi.application'
 
+ASGI_APPLICATION = 'CashG.asgi.application'
+
+# Set by CashG/asgi.py. Under ASGI every middleware must be async-capable or
+# Django runs the whole stack in one shared sync thread, so WhiteNoise (sync
+# only) is dropped and asgi.py serves static files itself.
+CASHG_ASYNC_VIEWS = os.getenv('CASHG_ASGI') == '1'
+
+if CASHG_ASYNC_VIEWS:
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 # DATABASES
+# Connections are persistent and health-checked before reuse. Setting
+# DATABASE_POOL_SIZE on PostgreSQL switches to psycopg 3's connection pool
+# instead (Django requires CONN_MAX_AGE = 0 with a pool). DATABASE_REPLICA_URL
+# adds a read replica used by the views marked @replica_reads
+# (CashGApp/routers.py).
+#
+# SQLite runs in WAL mode so readers never block the writer, waits up to
+# 20 seconds for a lock instead of failing with "database is locked", and
+# starts every transaction with BEGIN IMMEDIATE: SQLite ignores
+# select_for_update(), so a transaction must hold the write lock from its
+# first read for its balance checks to stay true until commit.
+SQLITE_OPTIONS = {
+    'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,
+}
+
+
+def database_config(env):
+    # sslmode is a PostgreSQL option; other backends reject it
+    ssl_require = os.getenv(env, '').startswith('postgres')
+    config = dj_database_url.config(env=env, conn_max_age=600, conn_health_checks=True, ssl_require=ssl_require)
+    if os.getenv('DATABASE_POOL_SIZE') and config['ENGINE'] == 'django.db.backends.postgresql':
+        config['CONN_MAX_AGE'] = 0
+        config.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': 2,
+            'max_size': int(os.getenv('DATABASE_POOL_SIZE')),
+            'timeout': 10,
+        }
+    if config['ENGINE'] == 'django.db.backends.sqlite3':
+        config['OPTIONS'] = {**SQLITE_OPTIONS, **config.get('OPTIONS', {})}
+    return config
+
+
 if os.getenv('DATABASE_URL'):
     DATABASES = {
-        'default': dj_database_url.config(conn_max_age=600, ssl_require=True)
+        'default': database_config('DATABASE_URL')
     }
 else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': SQLITE_OPTIONS,
         }
     }
 
+if os.getenv('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = {
+        **database_config('DATABASE_REPLICA_URL'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['CashGApp.routers.PrimaryReplicaRouter']
+
+# Under ASGI each request's sync work runs in a fresh thread, so persistent
+# per-thread server connections would only pile up; use the pool (or
+# reconnect). SQLite keeps them: its connections are cheap file handles, and
+# closing the last one forces a WAL checkpoint.
+if CASHG_ASYNC_VIEWS:
+    for database in DATABASES.values():
+        if database['ENGINE'] != 'django.db.backends.sqlite3' and 'pool' not in database.get('OPTIONS', {}):
+            database['CONN_MAX_AGE'] = 0
+
 
 
 # Password validation
@@ -141,9 +217,232 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 STATIC_URL = '/static/'
 
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Hashed file names, served with far-future immutable cache headers, plus
+# gzip and (with the brotli package installed) brotli copies written by
+# collectstatic. Django 5.1 dropped STATICFILES_STORAGE in favour of STORAGES.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# CashG
+# Transaction history is paginated with (timestamp, id) keyset cursors; the
+# streaming "view all" mode fetches this many rows per query.
+
+CASHG_HISTORY_PAGE_SIZE = 50
+
+CASHG_HISTORY_STREAM_CHUNK_SIZE = 500
+
+# History search uses a pg_trgm index on PostgreSQL and an FTS5 table on
+# SQLite (CashGApp/search.py), created after every migrate
+
+CASHG_TRANSACTION_SEARCH_INDEX = True
+
+# Purged Tailwind stylesheet and subset icon font written here by
+# `manage.py build_assets` (build.sh runs it before collectstatic). Until
+# they have been built, pages load Tailwind and Font Awesome from their CDNs.
+
+CASHG_ASSETS_DIR = os.path.join(BASE_DIR, 'CashGApp', 'static', 'CashGApp', 'dist')
+
+CASHG_BUILT_ASSETS = os.path.exists(os.path.join(CASHG_ASSETS_DIR, 'app.css'))
+
+# Rows fetched and written per chunk by statement exports (CashGApp/statements.py)
+
+CASHG_STATEMENT_CHUNK_SIZE = 2000
+
+# Identifier generation (see CashGApp/idgen.py). IDs are produced without a
+# lookup and collisions are retried on IntegrityError up to this many times.
+
+CASHG_ID_GENERATOR = 'CashGApp.idgen.SnowflakeIdGenerator'
+
+# Snowflake worker id, 0-1023, unique to each process that generates IDs
+# (every gunicorn/uvicorn worker and run_jobs process), or 'auto' to derive
+# one from the host name and process id. Required when DEBUG is off.
+
+CASHG_WORKER_ID = os.getenv('CASHG_WORKER_ID', 'auto' if DEBUG else None)
+
+# Generated account numbers carry a Luhn check digit. Keep the length apart
+# from the 10-digit numbers issued before, which have none.
+
+CASHG_ACCOUNT_NUMBER_LENGTH = 12
+
+CASHG_ID_MAX_ATTEMPTS = 5
+
+# Deadlock / serialization-failure retries for money movements (CashGApp/db.py)
+
+CASHG_DB_RETRY_ATTEMPTS = 4
+
+CASHG_DB_RETRY_BASE_DELAY = 0.02
+
+CASHG_DB_RETRY_MAX_DELAY = 0.5
+
+# On SQLite only one connection can write at a time, so money movements in
+# the same process queue on a lock instead of contending for the database
+# file; other processes still wait on SQLite's busy timeout.
+
+CASHG_SQLITE_SERIALIZE_WRITES = True
+
+# Under ASGI, deposit / withdraw / transfer run in a thread pool this large
+# (CashGApp/async_views.py); each thread holds at most one DB connection.
+
+CASHG_ASYNC_DB_THREADS = int(os.getenv('CASHG_ASYNC_DB_THREADS', '8'))
+
+# Idempotency keys for money-movement POSTs are kept this long (seconds)
+
+CASHG_IDEMPOTENCY_TTL = 24 * 60 * 60
+
+# Largest page the JSON API's transaction history will return
+
+CASHG_API_MAX_PAGE_SIZE = 200
+
+# Request instrumentation (CashGApp/middleware.py). /metrics/ serves the
+# Prometheus text format to these addresses only.
+
+CASHG_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+CASHG_N_PLUS_ONE_THRESHOLD = 5
+
+# Account snapshot / recent-activity cache (CashGApp/account_cache.py),
+# only with REDIS_URL: versions and entries live in the shared cache so an
+# invalidation in one worker reaches all of them, and each process keeps an
+# LRU of CASHG_ACCOUNT_CACHE_SIZE entries in front of it. Without it the
+# snapshots are read from the database.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+if os.getenv('REDIS_URL'):
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+
+# Rendered transaction-history rows, keyed by reference number (see
+# transaction_rows.html). Rows never change, so entries don't expire; the
+# oldest are culled past MAX_ENTRIES. Point it at a DummyCache to turn
+# fragment caching off.
+
+CACHES['fragments'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'cashg-fragments',
+    'OPTIONS': {'MAX_ENTRIES': 50000},
+}
+
+CASHG_ACCOUNT_CACHE_ALIAS = 'shared' if 'shared' in CACHES else None
+
+CASHG_ACCOUNT_CACHE_SIZE = 10000
+
+CASHG_ACCOUNT_CACHE_TTL = 60
+
+# With REDIS_URL, sessions are cached and written through to the database
+# (cached_db) and the signed-in User is read through the account cache above,
+# which takes the session and User queries off every authenticated request.
+# Without a shared cache both come straight from the database: a per-process
+# copy would keep a logged-out session or a deactivated user valid in the
+# other workers.
+
+if 'shared' in CACHES:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    SESSION_CACHE_ALIAS = 'shared'
+    AUTHENTICATION_BACKENDS = ['CashGApp.backends.CachedModelBackend']
+
+# Transfer recipients by account number (CashGApp/recipients.py), cached per
+# process; changes made in another process show up after the TTL (seconds)
+
+CASHG_RECIPIENT_CACHE_SIZE = 10000
+
+CASHG_RECIPIENT_CACHE_TTL = 300
+
+# After a request writes, that client reads from the primary for this many
+# seconds so it sees its own writes despite replica lag (CashGApp/routers.py)
+
+CASHG_REPLICA_PIN_SECONDS = 5
+
+# Append-only double-entry ledger with running balances (CashGApp/ledger.py).
+# Schedule `manage.py ledger_checkpoint` (e.g. nightly) so balance_as_of()
+# and reconcile_ledger only replay postings since the latest checkpoint.
+
+CASHG_LEDGER_ENABLED = True
+
+# Monthly Transaction partitions (PostgreSQL) and archival of cold history
+# (CashGApp/partitions.py). rollover_transactions keeps partitions created
+# this many months ahead and, when CASHG_TRANSACTION_HOT_MONTHS is set,
+# archives everything older than that many whole months.
+
+CASHG_TRANSACTION_PARTITION_MONTHS_AHEAD = 3
+
+CASHG_TRANSACTION_HOT_MONTHS = None
+
+# Token-bucket rate limits on POSTs (CashGApp/ratelimit.py), checked before
+# the view runs. CASHG_RATE_LIMITED_VIEWS maps URL names to a scope; each
+# scope's rules are keyed by 'ip', 'username_ip' (the submitted login name
+# from one client IP) or 'user' (the signed-in session) with a rate of N per
+# s/m/h/d, e.g. '10/m' or '30/5m'. Buckets are kept in the shared cache when REDIS_URL is set so the
+# limits hold across workers.
+
+CASHG_RATE_LIMITS = {
+    'login': {'ip': '20/m', 'username_ip': '5/m'},
+    'signup': {'ip': '5/h'},
+    'money': {'ip': '60/m', 'user': '20/m'},
+}
+
+CASHG_RATE_LIMITED_VIEWS = {
+    'login': 'login',
+    'signup': 'signup',
+    'deposit': 'money',
+    'withdraw': 'money',
+    'transfer': 'money',
+    'api:deposit': 'money',
+    'api:withdraw': 'money',
+    'api:transfer': 'money',
+}
+
+CASHG_RATE_LIMIT_CACHE = 'shared' if 'shared' in CACHES else 'default'
+
+# Reverse proxies in front of the app that append to X-Forwarded-For (Render
+# has one); the client address is taken that many hops from the right.
+
+CASHG_TRUSTED_PROXY_COUNT = int(os.getenv('CASHG_TRUSTED_PROXY_COUNT', '1' if os.getenv('RENDER') else '0'))
+
+# Post-commit job queue (CashGApp/jobs.py). Money movements queue their
+# audit log entry and e-mail receipts as Job rows; `manage.py run_jobs`
+# workers run them, retrying failures with exponential backoff up to
+# CASHG_JOB_MAX_ATTEMPTS runs. A job not finished within its lease is run
+# again. Set CASHG_JOB_THREADS to also run jobs in threads of the web process.
+
+CASHG_JOB_THREADS = int(os.getenv('CASHG_JOB_THREADS', '0'))
+
+CASHG_JOB_BATCH_SIZE = 20
+
+CASHG_JOB_POLL_INTERVAL = 2.0
+
+CASHG_JOB_LEASE_SECONDS = 300
+
+CASHG_JOB_MAX_ATTEMPTS = 8
+
+CASHG_JOB_RETRY_BASE_DELAY = 5
+
+CASHG_JOB_RETRY_MAX_DELAY = 3600
+
+# Finished jobs are kept this long (seconds) for `run_jobs --purge`
+
+CASHG_JOB_RETENTION = 7 * 24 * 60 * 60
+
+# Receipts go to the console unless a real backend is configured
+
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'CashG <no-reply@cashg.local>')
@@ -0,0 +1,302 @@
+"""
+Read-through cache for the account snapshot and recent activity shown on
+the dashboard and the deposit / withdraw / transfer forms, and for the
+signed-in User that backends.CachedModelBackend loads on every request.
+
+Entries are versioned per user. Every money movement bumps the owner's
+version once its transaction commits, which orphans all of that user's
+entries at once; an entry read from the database is stored under the
+version seen *before* the read, so a movement committing mid-read can't
+leave a stale entry behind under the new version.
+
+Caching needs CASHG_ACCOUNT_CACHE_ALIAS to name a cache every worker shares
+(Redis): versions live there, so an invalidation in one worker reaches all
+of them. Reads try a small in-process LRU first, checked against the shared
+version, then the shared cache. Without the alias every read goes to the
+database, since a per-process copy would go stale when another worker
+moves money.
+"""
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import metrics
+from .models import Account, Transaction
+from .routers import use_primary
+
+logger = logging.getLogger(__name__)
+
+RECENT_TRANSACTIONS = 5
+
+hits_total = metrics.counter('cashg_account_cache_hits_total', 'Account cache hits by kind and layer.')
+misses_total = metrics.counter('cashg_account_cache_misses_total', 'Account cache misses by kind.')
+invalidations_total = metrics.counter('cashg_account_cache_invalidations_total', 'Per-user account cache invalidations.')
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe least-recently-used mapping with per-entry expiry"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local = LRUCache(settings.CASHG_ACCOUNT_CACHE_SIZE)
+_local_versions = {}
+_local_versions_lock = threading.Lock()
+
+
+def _shared():
+    alias = settings.CASHG_ACCOUNT_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def _version_key(user_id):
+    return f'cashg:account-version:{user_id}'
+
+
+def _version(user_id):
+    """Return the user's current cache version, or None if entries can't be cached"""
+    local_version = _local_versions.get(user_id, 0)
+    shared = _shared()
+    if shared is None:
+        return None
+    key = _version_key(user_id)
+    try:
+        shared_version = shared.get(key)
+        if shared_version is None:
+            # Start from the clock, so a version key evicted from the shared
+            # cache can never come back with a number older entries still use
+            shared.add(key, time.time_ns(), timeout=None)
+            shared_version = shared.get(key)
+    except Exception:
+        logger.exception('Shared account cache unavailable')
+        return None
+    return (local_version, shared_version)
+
+
+async def _aversion(user_id):
+    """Async version of _version()"""
+    local_version = _local_versions.get(user_id, 0)
+    shared = _shared()
+    if shared is None:
+        return None
+    key = _version_key(user_id)
+    try:
+        shared_version = await shared.aget(key)
+        if shared_version is None:
+            await shared.aadd(key, time.time_ns(), timeout=None)
+            shared_version = await shared.aget(key)
+    except Exception:
+        logger.exception('Shared account cache unavailable')
+        return None
+    return (local_version, shared_version)
+
+
+def _local_hit(kind, user_id, version):
+    cached = _local.get((kind, user_id))
+    if cached is not _MISSING and cached[0] == version:
+        hits_total.inc(kind=kind, layer='local')
+        return cached[1]
+    return _MISSING
+
+
+def _read_through(kind, user_id, load):
+    version = _version(user_id)
+    if version is None:
+        misses_total.inc(kind=kind)
+        with use_primary():
+            return load()
+
+    value = _local_hit(kind, user_id, version)
+    if value is not _MISSING:
+        return value
+
+    shared = _shared()
+    shared_key = f'cashg:{kind}:{user_id}:{version[1]}'
+    if shared is not None:
+        try:
+            value = shared.get(shared_key, _MISSING)
+        except Exception:
+            logger.exception('Shared account cache unavailable')
+            value = _MISSING
+        if value is not _MISSING:
+            hits_total.inc(kind=kind, layer='shared')
+            _local.set((kind, user_id), (version, value), settings.CASHG_ACCOUNT_CACHE_TTL)
+            return value
+
+    misses_total.inc(kind=kind)
+    # A lagging replica could otherwise be cached under the new version
+    with use_primary():
+        value = load()
+    if value is None:
+        return None
+    _local.set((kind, user_id), (version, value), settings.CASHG_ACCOUNT_CACHE_TTL)
+    if shared is not None:
+        try:
+            shared.set(shared_key, value, settings.CASHG_ACCOUNT_CACHE_TTL)
+        except Exception:
+            logger.exception('Shared account cache unavailable')
+    return value
+
+
+async def _aread_through(kind, user_id, aload):
+    """Async version of _read_through(); ``aload`` is a coroutine function"""
+    version = await _aversion(user_id)
+    if version is None:
+        misses_total.inc(kind=kind)
+        with use_primary():
+            return await aload()
+
+    value = _local_hit(kind, user_id, version)
+    if value is not _MISSING:
+        return value
+
+    shared = _shared()
+    shared_key = f'cashg:{kind}:{user_id}:{version[1]}'
+    if shared is not None:
+        try:
+            value = await shared.aget(shared_key, _MISSING)
+        except Exception:
+            logger.exception('Shared account cache unavailable')
+            value = _MISSING
+        if value is not _MISSING:
+            hits_total.inc(kind=kind, layer='shared')
+            _local.set((kind, user_id), (version, value), settings.CASHG_ACCOUNT_CACHE_TTL)
+            return value
+
+    misses_total.inc(kind=kind)
+    with use_primary():
+        value = await aload()
+    if value is None:
+        return None
+    _local.set((kind, user_id), (version, value), settings.CASHG_ACCOUNT_CACHE_TTL)
+    if shared is not None:
+        try:
+            await shared.aset(shared_key, value, settings.CASHG_ACCOUNT_CACHE_TTL)
+        except Exception:
+            logger.exception('Shared account cache unavailable')
+    return value
+
+
+def account_snapshot(user):
+    """Return a copy of ``user``'s Account, raising Account.DoesNotExist like Account.objects.get()"""
+    account = _read_through('account', user.pk, lambda: Account.objects.filter(user_id=user.pk).first())
+    if account is None:
+        raise Account.DoesNotExist
+    # Views may refresh_from_db() the instance, so never hand out the cached object itself
+    return copy.copy(account)
+
+
+def recent_transactions(account):
+    """Return the account's latest RECENT_TRANSACTIONS transactions, newest first"""
+    return list(_read_through('recent', account.user_id, lambda: list(
+        Transaction.objects.filter(account_id=account.pk).order_by('-timestamp', '-pk')[:RECENT_TRANSACTIONS]
+    )))
+
+
+async def aaccount_snapshot(user):
+    """Async version of account_snapshot()"""
+    account = await _aread_through('account', user.pk, Account.objects.filter(user_id=user.pk).afirst)
+    if account is None:
+        raise Account.DoesNotExist
+    return copy.copy(account)
+
+
+async def arecent_transactions(account):
+    """Async version of recent_transactions()"""
+    async def load():
+        return [txn async for txn in
+                Transaction.objects.filter(account_id=account.pk).order_by('-timestamp', '-pk')[:RECENT_TRANSACTIONS]]
+    return list(await _aread_through('recent', account.user_id, load))
+
+
+def user_snapshot(user_id):
+    """Return a copy of the User with pk ``user_id``, or None if there is none"""
+    cached = _read_through('user', user_id, lambda: User.objects.filter(pk=user_id).first())
+    return copy.copy(cached) if cached is not None else None
+
+
+async def auser_snapshot(user_id):
+    """Async version of user_snapshot()"""
+    cached = await _aread_through('user', user_id, User.objects.filter(pk=user_id).afirst)
+    return copy.copy(cached) if cached is not None else None
+
+
+def invalidate(*user_ids):
+    """Drop every cached entry for ``user_ids`` in this process and in the shared cache"""
+    shared = _shared()
+    for user_id in set(user_ids):
+        invalidations_total.inc()
+        with _local_versions_lock:
+            _local_versions[user_id] = _local_versions.get(user_id, 0) + 1
+        if shared is None:
+            continue
+        key = _version_key(user_id)
+        try:
+            try:
+                shared.incr(key)
+            except ValueError:
+                shared.add(key, time.time_ns(), timeout=None)
+        except Exception:
+            logger.exception('Could not invalidate shared account cache for user %s', user_id)
+
+
+def invalidate_on_commit(*user_ids):
+    """Invalidate ``user_ids`` once the current transaction commits (immediately outside one)"""
+    transaction.on_commit(lambda: invalidate(*user_ids))
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def _account_changed(sender, instance, **kwargs):
+    # Admin edits, signups and deletions; the service layer updates balances
+    # with queryset.update(), which sends no signal, and invalidates explicitly
+    invalidate_on_commit(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def _user_changed(sender, instance, **kwargs):
+    # Password changes and deactivation must reach the cached User; logins
+    # (last_login) land here too, which costs one reload per login
+    invalidate_on_commit(instance.pk)
@@ -1,7 +1,69 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.models import User
+from django.db import transaction
 from .models import *
 # Register your models here.
 
-admin.site.register(Account)
+# Ledger entries are append-only and protect their account (and so its
+# user) from deletion. Customers are deactivated here instead of deleted.
+
+
+def deactivate_accounts(accounts):
+    """Deactivate ``accounts`` one save() at a time, so the account and recipient caches drop them"""
+    count = 0
+    for account in accounts:
+        if account.is_active:
+            account.is_active = False
+            account.save(update_fields=['is_active', 'updated_at'])
+            count += 1
+    return count
+
+
+@admin.register(Account)
+class AccountAdmin(admin.ModelAdmin):
+    list_display = ('account_number', 'user', 'account_type', 'balance', 'is_active')
+    list_filter = ('account_type', 'is_active')
+    search_fields = ('account_number', 'user__username')
+    actions = ['deactivate']
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description='Deactivate selected accounts', permissions=['change'])
+    def deactivate(self, request, queryset):
+        with transaction.atomic():
+            count = deactivate_accounts(queryset.order_by('pk').select_for_update())
+        self.message_user(request, f'{count} account(s) deactivated.', messages.SUCCESS)
+
+
+class CustomerUserAdmin(UserAdmin):
+    actions = ['deactivate']
+
+    def has_delete_permission(self, request, obj=None):
+        # Staff users without an account can still be deleted one at a time
+        if obj is not None and obj.accounts.exists():
+            return False
+        return super().has_delete_permission(request, obj)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # Bulk deletion would stop at the first customer's ledger entries
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='Deactivate selected users and their accounts', permissions=['change'])
+    def deactivate(self, request, queryset):
+        with transaction.atomic():
+            users = list(queryset.filter(is_active=True).select_for_update())
+            for user in users:
+                user.is_active = False
+                user.save(update_fields=['is_active'])
+            deactivate_accounts(Account.objects.filter(user__in=queryset).order_by('pk').select_for_update())
+        self.message_user(request, f'{len(users)} user(s) deactivated.', messages.SUCCESS)
+
+
+admin.site.unregister(User)
+admin.site.register(User, CustomerUserAdmin)
 admin.site.register(Transaction)
 admin.site.register(Transfer)
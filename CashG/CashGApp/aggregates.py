@@ -0,0 +1,68 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AccountSummary, DailyAccountSummary
+
+# Which running total each transaction type feeds
+TOTAL_FIELDS = {
+    'DEPOSIT': 'total_deposits',
+    'WITHDRAWAL': 'total_withdrawals',
+    'TRANSFER': 'total_transfers',
+    'RECEIVED': 'total_received',
+}
+
+
+def summary_for(account):
+    """Return the account's AccountSummary, or an unsaved all-zero one"""
+    try:
+        return AccountSummary.objects.get(account=account)
+    except AccountSummary.DoesNotExist:
+        return AccountSummary(account=account)
+
+
+async def asummary_for(account):
+    """Async version of summary_for()"""
+    try:
+        return await AccountSummary.objects.aget(account=account)
+    except AccountSummary.DoesNotExist:
+        return AccountSummary(account=account)
+
+
+def record_transactions(*transactions):
+    """
+    Fold freshly written Transaction rows into the per-account and per-day totals.
+
+    Must be called inside the same transaction.atomic() block that wrote the
+    rows so the totals commit or roll back with the ledger. Costs one UPDATE
+    per (account) and per (account, day) touched; the row is only INSERTed
+    the first time an account or day is seen.
+    """
+    account_deltas = defaultdict(lambda: defaultdict(int))
+    daily_deltas = defaultdict(lambda: defaultdict(int))
+    for txn in transactions:
+        field = TOTAL_FIELDS[txn.transaction_type]
+        day = timezone.localdate(txn.timestamp)
+        for deltas in (account_deltas[txn.account_id], daily_deltas[(txn.account_id, day)]):
+            deltas[field] += txn.amount
+            deltas['transaction_count'] += 1
+
+    for account_id, deltas in account_deltas.items():
+        _apply(AccountSummary, {'account_id': account_id}, deltas)
+    for (account_id, day), deltas in daily_deltas.items():
+        _apply(DailyAccountSummary, {'account_id': account_id, 'date': day}, deltas)
+
+
+def _apply(model, key, deltas):
+    """Add ``deltas`` to the summary row identified by ``key``, creating it if needed"""
+    increments = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**key).update(**increments):
+        return
+    try:
+        # Savepoint so a concurrent first insert doesn't poison the outer transaction
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:
+        model.objects.filter(**key).update(**increments)
@@ -0,0 +1,267 @@
+"""
+Versioned JSON API (mounted at /api/v1/).
+
+Responses are built from ``.values()`` / ``.only()`` projections rather
+than full model instances, and the balance and history endpoints honour
+``If-None-Match`` so polling clients get a bodyless 304 when nothing has
+changed. Authentication is the regular Django session (with CSRF on
+POSTs).
+"""
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError
+from django.http import HttpResponseNotModified, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.csrf import csrf_protect
+from django.views.decorators.http import require_GET, require_POST
+
+from . import account_cache, idempotency, partitions, recipients, services
+from .models import Account, Transaction
+from .pagination import InvalidCursor, paginate
+
+ACCOUNT_FIELDS = ('pk', 'account_number', 'account_type', 'balance', 'is_active', 'updated_at')
+TRANSACTION_FIELDS = ('timestamp', 'transaction_type', 'amount', 'description', 'reference_number')
+
+
+def error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_login_required(view):
+    """Like login_required, but answers 401 JSON instead of redirecting to the login page"""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error('Authentication required.', 401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _own_account(request):
+    return Account.objects.filter(user=request.user).values(*ACCOUNT_FIELDS).first()
+
+
+def _etag(*parts):
+    return quote_etag(hashlib.sha1('|'.join(str(p) for p in parts).encode()).hexdigest()[:20])
+
+
+def _not_modified(request, etag):
+    """Return a 304 response if the client already has ``etag``, else None"""
+    response = get_conditional_response(request, etag=etag)
+    if isinstance(response, HttpResponseNotModified):
+        return response
+    return None
+
+
+def _payload(request):
+    """Read a JSON object body, falling back to form data"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+def _amount(data):
+    try:
+        return services.cents(str(data.get('amount')))
+    except services.InvalidAmount:
+        return None
+
+
+def _account_json(row):
+    return {
+        'account_number': row['account_number'],
+        'account_type': row['account_type'],
+        'balance': str(row['balance']),
+        'is_active': row['is_active'],
+    }
+
+
+@require_GET
+@api_login_required
+def balance(request):
+    account = _own_account(request)
+    if account is None:
+        return error('Account not found.', 404)
+    etag = _etag(account['pk'], account['updated_at'], account['balance'])
+    response = _not_modified(request, etag) or JsonResponse(_account_json(account))
+    response['ETag'] = etag
+    return response
+
+
+@require_GET
+@api_login_required
+def history(request):
+    account = _own_account(request)
+    if account is None:
+        return error('Account not found.', 404)
+    try:
+        limit = min(int(request.GET.get('limit', settings.CASHG_HISTORY_PAGE_SIZE)), settings.CASHG_API_MAX_PAGE_SIZE)
+    except ValueError:
+        return error('limit must be an integer.', 400)
+    cursor = request.GET.get('cursor')
+
+    # Every money movement and archiving run bumps the account's updated_at, so it versions the whole history
+    etag = _etag(account['pk'], account['updated_at'], cursor, limit)
+    response = _not_modified(request, etag)
+    if response is None:
+        transactions = Transaction.objects.filter(account_id=account['pk']).only(*TRANSACTION_FIELDS)
+        try:
+            page = paginate(transactions, cursor=cursor, page_size=max(limit, 1))
+        except InvalidCursor:
+            return error('Invalid cursor.', 400)
+        # Archived transactions are only in statements; the last page says where the history stops
+        archived_until = None if page.has_next else partitions.archived_until(account['pk'])
+        response = JsonResponse({
+            'results': [
+                {
+                    'reference_number': txn.reference_number,
+                    'type': txn.transaction_type,
+                    'amount': str(txn.amount),
+                    'description': txn.description,
+                    'timestamp': txn.timestamp.isoformat(),
+                }
+                for txn in page
+            ],
+            'next': page.next_cursor,
+            'previous': page.prev_cursor,
+            'archived_until': archived_until and archived_until.isoformat(),
+        })
+    response['ETag'] = etag
+    return response
+
+
+@require_GET
+@api_login_required
+def account_lookup(request, account_number):
+    recipient = recipients.lookup(account_number)
+    if recipient is None:
+        return error('Account not found.', 404)
+    return JsonResponse(_recipient_json(recipient))
+
+
+def _recipient_json(recipient):
+    return {'account_number': recipient.account_number, 'is_active': recipient.is_active, 'holder': recipient.holder}
+
+
+@require_GET
+@api_login_required
+def validate_transfer(request):
+    """Check a transfer before it is submitted: the recipient and, if given, the amount"""
+    try:
+        account = account_cache.account_snapshot(request.user)
+    except Account.DoesNotExist:
+        return error('Account not found.', 404)
+    errors = []
+    try:
+        recipient = recipients.resolve(account, request.GET.get('recipient_account'))
+    except recipients.InvalidRecipient as e:
+        recipient = None
+        errors.append(str(e))
+    if 'amount' in request.GET:
+        amount = _amount(request.GET)
+        if amount is None:
+            errors.append('Invalid amount.')
+        elif not (1 <= amount <= 50000):
+            errors.append('Transfer amount must be between ₱1 and ₱50,000.')
+        elif amount > account.balance:
+            errors.append('Insufficient balance.')
+    return JsonResponse({
+        'valid': not errors,
+        'errors': errors,
+        'recipient': _recipient_json(recipient) if recipient else None,
+    })
+
+
+class ValidationFailed(Exception):
+    """A money-movement request that fails the same checks as the HTML forms"""
+
+
+def _movement(operation, handler, fields):
+    """Wrap a money-movement handler with auth, payload parsing and idempotency replay"""
+    @require_POST
+    @csrf_protect
+    @api_login_required
+    @functools.wraps(handler)
+    def view(request):
+        data = _payload(request)
+        if data is None:
+            return error('Request body must be a JSON object.', 400)
+        amount = _amount(data)
+        if amount is None:
+            return error('Invalid amount.', 400)
+        params = {field: str(data.get(field) or '') for field in fields}
+
+        key = idempotency.get_key(request)
+        request_fingerprint = idempotency.fingerprint(operation, amount=amount, **params)
+        if key:
+            try:
+                prior = idempotency.lookup(request.user, key, operation, request_fingerprint)
+            except idempotency.KeyReused:
+                return error('Idempotency key was already used for a different request.', 422)
+            if prior is not None:
+                return _replayed(prior)
+
+        account = Account.objects.filter(user=request.user).only('pk', 'user', 'account_number', 'account_type').first()
+        if account is None:
+            return error('Account not found.', 404)
+        pending = idempotency.pending(request.user, key, operation, request_fingerprint) if key else None
+        try:
+            reference = handler(account, amount, pending, **params)
+        except IntegrityError:
+            prior = key and idempotency.lookup(request.user, key, operation, request_fingerprint)
+            if prior:
+                return _replayed(prior)
+            raise
+        except ValidationFailed as e:
+            return error(str(e), 400)
+        except services.AccountNotFound:
+            return error('Account not found.', 404)
+        except services.InactiveAccount:
+            return error('Account is inactive.', 409)
+        except services.InsufficientFunds:
+            return error('Insufficient balance.', 409)
+        except OperationalError:
+            return error('The bank is busy right now; nothing was processed. Please retry.', 503)
+        return JsonResponse({'reference': reference, 'amount': f'{amount:.2f}'}, status=201)
+    return view
+
+
+def _replayed(prior):
+    response = JsonResponse({'reference': prior.reference, 'amount': str(prior.amount)}, status=201)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _deposit(account, amount, pending, description):
+    if amount < 1:
+        raise ValidationFailed('Amount must be at least ₱1.00.')
+    return services.deposit(account, amount, description, idempotency_key=pending).reference_number
+
+
+def _withdraw(account, amount, pending, description):
+    if not (200 <= amount <= 50000):
+        raise ValidationFailed('Withdrawal must be between ₱200 and ₱50,000.')
+    return services.withdraw(account, amount, description, idempotency_key=pending).reference_number
+
+
+def _transfer(account, amount, pending, recipient_account, note):
+    if not (1 <= amount <= 50000):
+        raise ValidationFailed('Transfer amount must be between ₱1 and ₱50,000.')
+    try:
+        recipient = recipients.resolve(account, recipient_account)
+    except recipients.InvalidRecipient as e:
+        raise ValidationFailed(str(e))
+    return services.transfer(account, recipient.account(), amount, note, idempotency_key=pending).transfer_id
+
+
+deposit = _movement('deposit', _deposit, ('description',))
+withdraw = _movement('withdraw', _withdraw, ('description',))
+transfer = _movement('transfer', _transfer, ('recipient_account', 'note'))
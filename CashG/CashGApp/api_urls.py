@@ -0,0 +1,14 @@
+from django.urls import path
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('account/', api.balance, name='balance'),
+    path('transactions/', api.history, name='history'),
+    path('accounts/<str:account_number>/', api.account_lookup, name='account-lookup'),
+    path('deposit/', api.deposit, name='deposit'),
+    path('withdraw/', api.withdraw, name='withdraw'),
+    path('transfer/', api.transfer, name='transfer'),
+    path('transfer/validate/', api.validate_transfer, name='transfer-validate'),
+]
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CashgappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'CashGApp'
+
+    def ready(self):
+        # Connect the receivers that invalidate cached account snapshots and
+        # recipients, open new accounts in the ledger and install the query
+        # recorder / write detector on new connections; register the job
+        # handlers and the post-migrate search index setup
+        from . import account_cache, ledger, middleware, recipients, routers, search, tasks  # noqa: F401
@@ -0,0 +1,202 @@
+"""
+Views used when CashG is served over ASGI (CASHG_ASYNC_VIEWS).
+
+The read-only pages are native async views on the async ORM, so a worker
+keeps serving other requests while they wait on the database. The
+money-movement views stay synchronous, because they rely on
+transaction.atomic() and row locks. ``offload`` runs them in a bounded thread
+pool rather than Django's single shared sync thread.
+"""
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.db import close_old_connections
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.template.loader import get_template, render_to_string
+
+from . import account_cache, partitions, statements, views
+from .aggregates import asummary_for
+from .models import Account, Profile, Transaction
+from .pagination import InvalidCursor, aiter_chunks, apaginate
+from .routers import replica_reads, use_primary
+from .search import HistoryFilter
+
+_executor = ThreadPoolExecutor(max_workers=settings.CASHG_ASYNC_DB_THREADS, thread_name_prefix='cashg-db')
+
+
+def offload(view):
+    """Run the sync ``view`` in the bounded DB thread pool and await it"""
+    def run(request, *args, **kwargs):
+        # Pool threads live outside Django's request cycle, so expire their connections here
+        close_old_connections()
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            close_old_connections()
+
+    run_in_pool = sync_to_async(run, thread_sensitive=False, executor=_executor)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run_in_pool(request, *args, **kwargs)
+    return wrapper
+
+
+deposit = offload(views.deposit)
+withdraw = offload(views.withdraw)
+transfer = offload(views.transfer)
+
+
+async def _resolve_user(request):
+    # Templates read {{ user }}; resolve it now so rendering never touches the database
+    request.user = await request.auser()
+    return request.user
+
+
+@login_required
+@replica_reads
+async def dashboard(request):
+    user = await _resolve_user(request)
+    try:
+        account = await account_cache.aaccount_snapshot(user)
+        recent_transactions = await account_cache.arecent_transactions(account)
+    except Account.DoesNotExist:
+        messages.error(request, "Account not found. Please contact support.")
+        return redirect('login')
+
+    context = {
+        'account': account,
+        'recent_transactions': recent_transactions,
+    }
+    return render(request, 'dashboard.html', context)
+
+
+@login_required
+@replica_reads
+async def history(request):
+    user = await _resolve_user(request)
+    try:
+        account = await Account.objects.aget(user=user)
+    except Account.DoesNotExist:
+        messages.error(request, "Account not found.")
+        return redirect('dashboard')
+
+    filters = HistoryFilter(request.GET)
+    for error in filters.errors:
+        messages.error(request, error)
+    transactions = filters.apply(Transaction.objects.filter(account=account))
+    summary = await asummary_for(account)
+    context = {
+        'account': account,
+        'total_deposits': summary.total_deposits,
+        'total_withdrawals': summary.total_withdrawals,
+        'total_transfers': summary.total_transfers,
+        'total_transactions': summary.transaction_count,
+        'filters': filters,
+        'transaction_types': Transaction.TRANSACTION_TYPE,
+    }
+
+    if request.GET.get('stream') and context['total_transactions']:
+        context['archived_until'] = await partitions.aarchived_until(account.pk)
+        return _stream_history(request, context, transactions)
+
+    try:
+        context['transactions'] = await apaginate(
+            transactions,
+            cursor=request.GET.get('cursor'),
+            page_size=settings.CASHG_HISTORY_PAGE_SIZE,
+        )
+    except InvalidCursor:
+        messages.error(request, "Invalid page link. Showing your latest transactions.")
+        context['transactions'] = await apaginate(transactions, page_size=settings.CASHG_HISTORY_PAGE_SIZE)
+    if not context['transactions'].has_next:
+        context['archived_until'] = await partitions.aarchived_until(account.pk)
+
+    return render(request, 'transactions.html', context)
+
+
+def _stream_history(request, context, transactions):
+    """Async version of views._stream_history()"""
+    page = render_to_string(
+        'transactions.html',
+        {**context, 'streaming': True, 'stream_marker': views.HISTORY_STREAM_MARKER},
+        request=request,
+    )
+    head, tail = page.split(views.HISTORY_STREAM_MARKER, 1)
+    rows_template = get_template('transaction_rows.html')
+    transactions = transactions.using(transactions.db)
+
+    async def render_page():
+        yield head
+        async for chunk in aiter_chunks(transactions, settings.CASHG_HISTORY_STREAM_CHUNK_SIZE):
+            yield rows_template.render({'transactions': chunk})
+        yield tail
+
+    return StreamingHttpResponse(render_page(), content_type='text/html; charset=utf-8')
+
+
+@login_required
+@replica_reads
+async def statement(request):
+    user = await _resolve_user(request)
+    try:
+        account = await Account.objects.aget(user=user)
+    except Account.DoesNotExist:
+        messages.error(request, "Account not found.")
+        return redirect('dashboard')
+
+    try:
+        start, end, fmt, compress = views.statement_options(request)
+    except statements.InvalidPeriod as e:
+        messages.error(request, str(e))
+        return redirect('history')
+
+    content = await statements.astream(account, start, end, fmt, compress)
+    return views.statement_response(content, account, start, end, fmt, compress)
+
+
+async def _aaccount_and_profile(user):
+    """Async version of views._account_and_profile()"""
+    account = await Account.objects.filter(user=user).afirst()
+    user_profile = await Profile.objects.filter(user=user).afirst()
+    if account is None or user_profile is None:
+        with use_primary():
+            if account is None:
+                account, created = await Account.objects.aget_or_create(
+                    user=user,
+                    defaults={
+                        'account_number': f"ACC{user.id:06d}",
+                        'account_type': 'Savings',
+                        'balance': 0.00
+                    }
+                )
+            if user_profile is None:
+                user_profile, created = await Profile.objects.aget_or_create(user=user)
+    return account, user_profile
+
+
+@login_required
+@replica_reads
+async def profile(request):
+    user = await _resolve_user(request)
+    account, user_profile = await _aaccount_and_profile(user)
+
+    if request.method == 'POST':
+        messages.success(request, "Profile updated successfully.")
+        return redirect('profile')
+
+    summary = await asummary_for(account)
+    context = {
+        'account': account,
+        'profile': user_profile,
+        'total_deposits': summary.total_deposits,
+        'total_withdrawals': summary.total_withdrawals,
+        'total_transfers': summary.total_transfers,
+        'total_transactions': summary.transaction_count,
+    }
+    return render(request, 'profile.html', context)
@@ -0,0 +1,35 @@
+"""
+Authentication backend that serves the per-request User lookup from a cache.
+
+Django's AuthenticationMiddleware loads the signed-in User with a query on
+every request. CachedModelBackend reads it through account_cache instead, so
+it shares that cache's per-process LRU, its shared Redis layer and its
+per-user versioning. Saving or deleting a User invalidates the entry once
+the change commits, so a password change or deactivation is seen on the
+next request by every worker. settings.py only enables this backend when
+the shared cache is configured. Logging in still checks the password against
+the database.
+"""
+from django.contrib.auth.backends import ModelBackend
+from django.utils.functional import SimpleLazyObject, empty
+
+from . import account_cache
+
+
+def loaded_user(request):
+    """The request's user if the view or a middleware already loaded it, else None; loading it costs queries"""
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        # request.auser() caches here without touching the lazy request.user
+        return getattr(request, '_acached_user', None)
+    return user
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        user = account_cache.user_snapshot(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        user = await account_cache.auser_snapshot(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
@@ -0,0 +1,211 @@
+"""
+Batch posting of deposits and transfers, e.g. payroll files.
+
+A batch is posted in chunks. Each chunk locks every account it touches in
+primary-key order, validates lines against running balances in memory,
+then writes all balance changes with a single ``UPDATE ... CASE``, all
+transaction rows with ``bulk_create`` and the chunk's ledger postings. A
+line that fails validation is reported and skipped without affecting the
+rest of its chunk; if the chunk itself fails, only its accepted lines are
+reported as rolled back. Posted lines queue the same audit and receipt jobs
+as services.py, through ``tasks.enqueue_movements``.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import DatabaseError, transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from . import account_cache, idgen, ledger, services
+from .aggregates import record_transactions
+from .db import serialized_writes
+from .models import Account, Transaction, Transfer
+from .tasks import enqueue_movements
+
+LINE_TYPES = ('DEPOSIT', 'TRANSFER')
+
+
+@dataclass
+class BatchLine:
+    line_number: int
+    type: str
+    account: str
+    amount: str
+    recipient: str = ''
+    description: str = ''
+    parse_error: str = ''
+
+
+@dataclass
+class LineResult:
+    line_number: int
+    ok: bool
+    reference: str = ''
+    error: str = ''
+
+
+class LineError(Exception):
+    """A batch line that cannot be posted"""
+
+
+def post_batch(lines, chunk_size=500):
+    """Post an iterable of BatchLine and yield one LineResult per line, in order"""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield from post_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from post_chunk(chunk)
+
+
+def post_chunk(lines):
+    """Post a list of BatchLine in a single database transaction"""
+    results = [None] * len(lines)
+    try:
+        with serialized_writes('batch'), transaction.atomic():
+            _post_chunk(lines, results)
+    except DatabaseError as e:
+        # Lines that failed validation keep their own error; only the accepted ones were rolled back
+        for i, line in enumerate(lines):
+            if results[i] is None or results[i].ok:
+                results[i] = LineResult(line.line_number, False, error=f'Chunk rolled back: {e}')
+    return results
+
+
+def _post_chunk(lines, results):
+    """Post ``lines``, filling ``results`` in as each line is validated"""
+    numbers = set()
+    for line in lines:
+        numbers.add(line.account)
+        if line.recipient:
+            numbers.add(line.recipient)
+
+    # Deterministic lock order so concurrent batches and transfers can't deadlock
+    accounts = {
+        account.account_number: account
+        for account in Account.objects.select_for_update()
+        .filter(account_number__in=numbers)
+        .order_by('pk')
+        .only('pk', 'user', 'account_number', 'account_type', 'balance', 'is_active')
+    }
+    balances = {account.pk: account.balance for account in accounts.values()}
+
+    generator = idgen.get_generator()
+    rows = []
+    postings = []
+    transfers = []
+    movements = []
+    for i, line in enumerate(lines):
+        try:
+            amount, account, recipient = _validate(line, accounts)
+        except LineError as e:
+            results[i] = LineResult(line.line_number, False, error=str(e))
+            continue
+
+        if line.type == 'DEPOSIT':
+            balances[account.pk] += amount
+            txn = Transaction(
+                account_id=account.pk,
+                amount=amount,
+                transaction_type='DEPOSIT',
+                description=line.description or f'Deposit to {account.account_type} account',
+                reference_number=generator.reference_number(),
+            )
+            rows.append(txn)
+            postings.append((txn.reference_number, [(account.pk, amount, txn)]))
+            movements.append(('deposit', txn.reference_number, [txn]))
+            results[i] = LineResult(line.line_number, True, reference=txn.reference_number)
+            continue
+
+        if balances[account.pk] < amount:
+            results[i] = LineResult(line.line_number, False, error='Insufficient balance.')
+            continue
+        balances[account.pk] -= amount
+        balances[recipient.pk] += amount
+        note = line.description
+        sent_txn = Transaction(
+            account_id=account.pk,
+            amount=amount,
+            transaction_type='TRANSFER',
+            description=f'Transfer to {recipient.account_number}: {note}' if note else f'Transfer to {recipient.account_number}',
+            reference_number=generator.reference_number(),
+        )
+        received_txn = Transaction(
+            account_id=recipient.pk,
+            amount=amount,
+            transaction_type='RECEIVED',
+            description=f'Received from {account.account_number}: {note}' if note else f'Received from {account.account_number}',
+            reference_number=generator.reference_number(),
+        )
+        rows.extend((sent_txn, received_txn))
+        transfer = Transfer(
+            sender_account_id=account.pk,
+            recipient_account_id=recipient.pk,
+            amount=amount,
+            note=note,
+            transfer_id=generator.transfer_id(),
+        )
+        transfers.append(transfer)
+        postings.append((transfer.transfer_id, [
+            (account.pk, -amount, sent_txn),
+            (recipient.pk, amount, received_txn),
+        ]))
+        movements.append(('transfer', transfer.transfer_id, [sent_txn, received_txn]))
+        results[i] = LineResult(line.line_number, True, reference=transfer.transfer_id)
+
+    deltas = {
+        account.pk: balances[account.pk] - account.balance
+        for account in accounts.values()
+        if balances[account.pk] != account.balance
+    }
+    if deltas:
+        Account.objects.filter(pk__in=deltas).update(balance=F('balance') + Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+            default=Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ), updated_at=timezone.now())
+        account_cache.invalidate_on_commit(*(account.user_id for account in accounts.values() if account.pk in deltas))
+    Transaction.objects.bulk_create(rows)
+    Transfer.objects.bulk_create(transfers)
+    record_transactions(*rows)
+    ledger.post(postings)
+    if movements:
+        # The same audit and receipt jobs services.py queues for single movements
+        enqueue_movements(movements)
+
+
+def _validate(line, accounts):
+    """Return (amount, account, recipient) for a postable line or raise LineError"""
+    if line.parse_error:
+        raise LineError(line.parse_error)
+    if line.type not in LINE_TYPES:
+        raise LineError(f'Unknown type {line.type!r}; expected one of {", ".join(LINE_TYPES)}.')
+    try:
+        amount = services.cents(line.amount)
+    except services.InvalidAmount:
+        raise LineError(f'Invalid amount {line.amount!r}.')
+
+    account = accounts.get(line.account)
+    if account is None:
+        raise LineError(f'Account {line.account} not found.')
+    if not account.is_active:
+        raise LineError(f'Account {line.account} is inactive.')
+
+    if line.type == 'DEPOSIT':
+        if amount < 1:
+            raise LineError('Amount must be at least ₱1.00.')
+        return amount, account, None
+
+    if not (1 <= amount <= 50000):
+        raise LineError('Transfer amount must be between ₱1 and ₱50,000.')
+    recipient = accounts.get(line.recipient)
+    if recipient is None:
+        raise LineError(f'Recipient account {line.recipient} not found.')
+    if not recipient.is_active:
+        raise LineError(f'Recipient account {line.recipient} is inactive.')
+    if recipient.pk == account.pk:
+        raise LineError('Cannot transfer to your own account.')
+    return amount, account, recipient
@@ -0,0 +1,156 @@
+"""
+Shared pieces of the benchmark and load-test commands.
+
+Everything here runs against the configured database and creates users
+whose names start with BENCH_PREFIX, so point DATABASE_URL at a scratch
+database before using it.
+"""
+import itertools
+import math
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import close_old_connections, connection
+from django.db.models import Sum
+from django.test import Client, override_settings
+
+from . import idgen, ledger
+from .models import Account, Transaction
+
+BENCH_PREFIX = 'bench_'
+OPENING_BALANCE = Decimal('1000000.00')
+
+
+def seed_accounts(count, opening_balance=OPENING_BALANCE):
+    """Return ``count`` bench accounts ordered by pk, bulk-creating any that don't exist yet"""
+    bench_accounts = (Account.objects.filter(user__username__startswith=BENCH_PREFIX)
+                      .select_related('user').order_by('pk'))
+    existing = list(bench_accounts[:count])
+    missing = count - len(existing)
+    if missing > 0:
+        start = User.objects.filter(username__startswith=BENCH_PREFIX).count()
+        usernames = [f'{BENCH_PREFIX}{i:06d}' for i in range(start, start + missing)]
+        # One shared hash: bench users log in with force_login, never a password
+        password = make_password(None)
+        User.objects.bulk_create([User(username=name, password=password) for name in usernames])
+        users = User.objects.filter(username__in=usernames).order_by('pk')
+        generator = idgen.get_generator()
+        Account.objects.bulk_create([
+            Account(user=user, balance=opening_balance, account_number=generator.account_number())
+            for user in users
+        ])
+        # bulk_create sends no post_save, so open them in the ledger here
+        ledger.open_accounts(Account.objects.filter(user__in=users).values_list('pk', flat=True))
+        existing = list(bench_accounts[:count])
+    return existing
+
+
+def zipf_chooser(items, skew, rng):
+    """
+    Return a function picking from ``items`` with Zipf weights 1/rank**skew.
+
+    skew=0 is uniform; around 1.0 a handful of hot accounts take most of the traffic.
+    """
+    cum_weights = list(itertools.accumulate(1 / (rank ** skew) for rank in range(1, len(items) + 1)))
+    return lambda: rng.choices(items, cum_weights=cum_weights)[0]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class LatencyRecorder:
+    """Thread-safe collection of per-operation latencies and outcomes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.outcomes = defaultdict(int)
+
+    def record(self, operation, seconds, outcome):
+        with self._lock:
+            self.latencies[operation].append(seconds)
+            self.outcomes[(operation, outcome)] += 1
+
+    def summary(self):
+        """Yield (operation, count, p50, p95, p99) with latencies in milliseconds"""
+        for operation, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            yield (operation, len(values), *(percentile(values, p) * 1000 for p in (50, 95, 99)))
+
+
+def without_rate_limits():
+    """Lift the request rate limits (see ratelimit.py) for a run whose traffic all comes from one address"""
+    return override_settings(CASHG_RATE_LIMITED_VIEWS={})
+
+
+class ClientCache:
+    """One logged-in django.test.Client per thread and account, created on first use"""
+
+    def __init__(self, cookies=None):
+        self.cookies = cookies or {}
+        self.local = threading.local()
+
+    def get(self, account):
+        clients = self.local.__dict__.setdefault('clients', {})
+        if account.pk not in clients:
+            client = Client()
+            client.force_login(account.user)
+            for name, value in self.cookies.items():
+                client.cookies[name] = value
+            clients[account.pk] = client
+        return clients[account.pk]
+
+
+def run_concurrently(plan, threads, execute):
+    """
+    Split ``plan`` across ``threads`` worker threads and call ``execute(item)``
+    for each item. Returns wall-clock seconds. Each thread gets its own
+    database connection and closes it when done.
+    """
+    def worker(items):
+        close_old_connections()
+        try:
+            for item in items:
+                execute(item)
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker, args=(plan[i::threads],)) for i in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - started
+
+
+def balances(account_ids):
+    return dict(Account.objects.filter(pk__in=account_ids).values_list('pk', 'balance'))
+
+
+def ledger_mismatches(balances_before, since):
+    """
+    Return (account id, expected, actual) for every account whose balance is
+    not its balance before the run plus the ledger rows written since ``since``.
+    """
+    signed = {'DEPOSIT': 1, 'RECEIVED': 1, 'WITHDRAWAL': -1, 'TRANSFER': -1}
+    expected = dict(balances_before)
+    rows = (Transaction.objects.filter(account_id__in=expected, timestamp__gte=since)
+            .values('account_id', 'transaction_type').annotate(total=Sum('amount')).order_by())
+    for row in rows:
+        expected[row['account_id']] += signed[row['transaction_type']] * row['total']
+    actual = balances(expected)
+    return [(pk, expected[pk], actual[pk]) for pk in expected if expected[pk] != actual[pk]]
+
+
+def random_amount(rng, low, high):
+    return Decimal(rng.randint(low * 100, high * 100)) / 100
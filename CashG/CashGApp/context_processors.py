@@ -0,0 +1,13 @@
+import uuid
+
+from django.conf import settings
+
+
+def idempotency_key(request):
+    """A fresh key for money-movement forms, so a resubmitted POST is applied only once"""
+    return {'idempotency_key': uuid.uuid4().hex}
+
+
+def built_assets(request):
+    """Whether base.html can link the self-hosted assets from build_assets instead of the CDNs"""
+    return {'built_assets': settings.CASHG_BUILT_ASSETS}
@@ -0,0 +1,92 @@
+"""
+Database helpers shared by the money-movement code.
+"""
+import functools
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+from . import metrics
+
+# SQLSTATEs for serialization_failure and deadlock_detected
+POSTGRES_RETRYABLE = {'40001', '40P01'}
+# ER_LOCK_DEADLOCK and ER_LOCK_WAIT_TIMEOUT
+MYSQL_RETRYABLE = {1213, 1205}
+
+retries_total = metrics.counter('cashg_db_retries_total', 'Transactions retried after a deadlock or serialization failure.')
+retries_exhausted_total = metrics.counter(
+    'cashg_db_retries_exhausted_total', 'Transactions that still failed after the last retry.')
+lock_wait_seconds = metrics.histogram('cashg_lock_wait_seconds', 'Time spent acquiring account row locks.')
+write_queue_seconds = metrics.histogram(
+    'cashg_sqlite_write_queue_seconds', 'Time money movements waited for this process\'s SQLite write slot.')
+
+_sqlite_write_lock = threading.Lock()
+
+
+def is_retryable(exc):
+    """True if ``exc`` is a deadlock, serialization failure or lock timeout worth retrying"""
+    cause = exc.__cause__
+    sqlstate = getattr(cause, 'pgcode', None) or getattr(getattr(cause, 'diag', None), 'sqlstate', None)
+    if sqlstate in POSTGRES_RETRYABLE:
+        return True
+    args = getattr(cause, 'args', ())
+    if args and args[0] in MYSQL_RETRYABLE:
+        return True
+    return 'database is locked' in str(exc)
+
+
+def retry_on_conflict(operation):
+    """
+    Retry the decorated function on deadlocks and serialization failures.
+
+    Retries are bounded by CASHG_DB_RETRY_ATTEMPTS with full-jitter
+    exponential backoff. The function must open its own transaction; when
+    called inside an outer atomic block it runs once and the outer caller
+    owns the retry.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if connection.in_atomic_block:
+                return func(*args, **kwargs)
+            attempts = settings.CASHG_DB_RETRY_ATTEMPTS
+            for attempt in range(1, attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as e:
+                    if not is_retryable(e):
+                        raise
+                    if attempt == attempts:
+                        retries_exhausted_total.inc(operation=operation)
+                        raise
+                    retries_total.inc(operation=operation)
+                    backoff = min(settings.CASHG_DB_RETRY_MAX_DELAY,
+                                  settings.CASHG_DB_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+                    time.sleep(random.uniform(0, backoff))
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def serialized_writes(operation):
+    """
+    On SQLite, let one thread per process run a money movement at a time.
+
+    Wrap the ``transaction.atomic()`` block with it. Threads queue on a lock
+    in Python, so they don't all hold connections spinning on SQLite's busy
+    timeout. A no-op on other databases, when CASHG_SQLITE_SERIALIZE_WRITES
+    is off, and inside an outer transaction (which already holds the write
+    lock, since SQLite transactions begin IMMEDIATE).
+    """
+    if (connection.vendor != 'sqlite' or not settings.CASHG_SQLITE_SERIALIZE_WRITES
+            or connection.in_atomic_block):
+        yield
+        return
+    started = time.perf_counter()
+    with _sqlite_write_lock:
+        write_queue_seconds.observe(time.perf_counter() - started, operation=operation)
+        yield
@@ -0,0 +1,88 @@
+"""
+Idempotency keys for deposit, withdraw and transfer POSTs.
+
+A client sends an ``Idempotency-Key`` header (or ``idempotency_key`` form
+field). The first request with a key stores its outcome in the same
+transaction as the money movement; a replay of that key is answered from
+the stored row with a single indexed SELECT and never reaches the account
+rows. Keys expire after CASHG_IDEMPOTENCY_TTL seconds.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+FORM_FIELD = 'idempotency_key'
+MAX_KEY_LENGTH = 255
+
+
+class KeyReused(Exception):
+    """The key was already used for a different request"""
+
+
+def get_key(request):
+    """Return the request's idempotency key, or None if it didn't send one"""
+    key = (request.META.get(HEADER) or request.POST.get(FORM_FIELD) or '').strip()
+    return key[:MAX_KEY_LENGTH] or None
+
+
+def fingerprint(operation, **params):
+    """Hash the parameters that define a request, so key reuse with a different payload is caught"""
+    payload = json.dumps({'operation': operation, **{k: str(v) for k, v in params.items()}}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def lookup(user, key, operation, request_fingerprint):
+    """
+    Return the stored outcome for ``key``, or None if it hasn't been used.
+
+    Raises KeyReused if the key belongs to a different request. An expired
+    row is deleted so the key can be used again.
+    """
+    record = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if record is None:
+        return None
+    if record.expires_at <= timezone.now():
+        record.delete()
+        return None
+    if record.operation != operation or record.fingerprint != request_fingerprint:
+        raise KeyReused(key)
+    return record
+
+
+def pending(user, key, operation, request_fingerprint):
+    """Build the unsaved row a service saves alongside the ledger writes"""
+    return IdempotencyKey(
+        user=user,
+        key=key,
+        operation=operation,
+        fingerprint=request_fingerprint,
+        expires_at=timezone.now() + timedelta(seconds=settings.CASHG_IDEMPOTENCY_TTL),
+    )
+
+
+def complete(record, reference, amount):
+    """Store the outcome; must run inside the money movement's atomic block"""
+    if record is None:
+        return
+    record.reference = reference
+    record.amount = amount
+    # A conflict retry may re-run this after a rollback; always insert afresh
+    record.pk = None
+    record.save(force_insert=True)
+
+
+def purge_expired(batch_size=1000):
+    """Delete expired keys in batches and return how many were removed"""
+    removed = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+                   .values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return removed
+        removed += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,182 @@
+"""
+Query-free identifier generation for accounts, transactions and transfers.
+
+Generators never look the database up before an insert; uniqueness is
+enforced by the unique constraint on the target column and a collision is
+handled by regenerating and retrying (see ``save_with_generated_id``). The
+active generator is chosen with the ``CASHG_ID_GENERATOR`` setting.
+
+Snowflakes are unique only while every process generating them has its own
+worker id; see ``configured_worker_id``.
+"""
+import os
+import secrets
+import socket
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, router, transaction
+from django.utils.module_loading import import_string
+
+CROCKFORD32 = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+# Snowflake layout: 41 bits of milliseconds, 10 bits of worker, 12 bits of sequence
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+def luhn_check_digit(digits):
+    """Return the Luhn check digit for a string of decimal digits"""
+    total = 0
+    for i, ch in enumerate(reversed(digits)):
+        d = int(ch)
+        if i % 2 == 0:
+            d *= 2
+            if d > 9:
+                d -= 9
+        total += d
+    return str((10 - total % 10) % 10)
+
+
+def is_valid_account_number(account_number):
+    """Check the format and Luhn check digit of a generated account number"""
+    return (
+        len(account_number) == settings.CASHG_ACCOUNT_NUMBER_LENGTH
+        and account_number.isdigit()
+        and luhn_check_digit(account_number[:-1]) == account_number[-1]
+    )
+
+
+def encode_base32(value, length=13):
+    """Encode a non-negative integer as fixed-width Crockford base32"""
+    chars = []
+    for _ in range(length):
+        value, rem = divmod(value, 32)
+        chars.append(CROCKFORD32[rem])
+    return ''.join(reversed(chars))
+
+
+def configured_worker_id():
+    """
+    Return this process's snowflake worker id from CASHG_WORKER_ID.
+
+    'auto' derives one from the host name and process id. That is unique
+    per process but can clash between two of them; a clash is survived by
+    ``save_with_generated_id`` retrying, at the cost of a failed insert.
+    """
+    value = settings.CASHG_WORKER_ID
+    if value is None:
+        raise ImproperlyConfigured(
+            f'CASHG_WORKER_ID is not set. Give every process generating IDs its own number '
+            f'from 0 to {MAX_WORKER}, or set it to "auto" to derive one from the host and process.')
+    if value == 'auto':
+        return zlib.crc32(f'{socket.gethostname()}:{os.getpid()}'.encode()) & MAX_WORKER
+    try:
+        worker_id = int(value)
+    except ValueError:
+        worker_id = -1
+    if not 0 <= worker_id <= MAX_WORKER:
+        raise ImproperlyConfigured(f'CASHG_WORKER_ID must be "auto" or a number from 0 to {MAX_WORKER}, not {value!r}.')
+    return worker_id
+
+
+class SnowflakeIdGenerator:
+    """
+    Time-ordered 64-bit IDs, unique per (millisecond, worker, sequence).
+
+    Reference numbers and transfer IDs are the prefixed base32 form of the
+    snowflake, so they sort by creation time. Account numbers are random
+    digits plus a Luhn check digit: customers type them, so they must stay
+    short and reject typos rather than encode time.
+    """
+
+    def __init__(self, worker_id=None):
+        if worker_id is None:
+            worker_id = configured_worker_id()
+        self.worker_id = worker_id & MAX_WORKER
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_id(self):
+        """Return the next snowflake as an int"""
+        with self._lock:
+            now = int(time.time() * 1000) - EPOCH_MS
+            if now < self._last_ms:
+                # Clock went backwards; keep issuing from the last timestamp
+                now = self._last_ms
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    while now <= self._last_ms:
+                        now = int(time.time() * 1000) - EPOCH_MS
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (now << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+    def reference_number(self):
+        return f'TXN{encode_base32(self.next_id())}'
+
+    def transfer_id(self):
+        return f'TRF{encode_base32(self.next_id())}'
+
+    def account_number(self):
+        payload_length = settings.CASHG_ACCOUNT_NUMBER_LENGTH - 1
+        payload = str(secrets.randbelow(9 * 10 ** (payload_length - 1)) + 10 ** (payload_length - 1))
+        return payload + luhn_check_digit(payload)
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_generator():
+    """Return the process-wide generator configured by CASHG_ID_GENERATOR"""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = import_string(settings.CASHG_ID_GENERATOR)()
+    return _generator
+
+
+def save_with_generated_id(instance, field_name, generate, save, *args, **kwargs):
+    """
+    Fill ``field_name`` with ``generate()`` and call ``save``, retrying with a
+    fresh value if the insert hits a unique constraint violation.
+
+    Inside an atomic block each attempt runs in a savepoint so a collision
+    doesn't abort the surrounding transaction. In autocommit mode no extra
+    statements are issued.
+    """
+    using = kwargs.get('using') or router.db_for_write(type(instance), instance=instance)
+    attempts = settings.CASHG_ID_MAX_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        setattr(instance, field_name, generate())
+        try:
+            if transaction.get_connection(using).in_atomic_block:
+                with transaction.atomic(using=using):
+                    return save(*args, **kwargs)
+            return save(*args, **kwargs)
+        except IntegrityError:
+            if attempt == attempts or not _value_taken(instance, field_name, using):
+                raise
+
+
+def _value_taken(instance, field_name, using):
+    """
+    True when the generated value already exists, i.e. it caused the IntegrityError.
+
+    Only consulted after an insert has already failed, so the happy path
+    stays lookup-free.
+    """
+    model = type(instance)
+    value = getattr(instance, field_name)
+    return model._default_manager.using(using).filter(**{field_name: value}).exists()
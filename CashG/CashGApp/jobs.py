@@ -0,0 +1,175 @@
+"""
+Database-backed queue for work that follows a committed money movement.
+
+``enqueue()`` writes Job rows inside the caller's transaction, so a job
+exists if and only if the movement it belongs to committed, and adds an
+on_commit hook that wakes this process's worker threads. Workers
+(``manage.py run_jobs``, or CASHG_JOB_THREADS threads started in the web
+process on first use) claim due jobs by pushing their ``run_at`` forward by
+CASHG_JOB_LEASE_SECONDS with a conditional UPDATE, so two workers never
+claim the same job at once. A failing handler is retried with exponential
+backoff until it has run CASHG_JOB_MAX_ATTEMPTS times; a job whose worker
+died is claimed again once its lease runs out. Delivery is at-least-once,
+so handlers must tolerate running twice. No broker is involved.
+
+Handlers are registered with ``@task(name)`` (see tasks.py) and called with
+the job's payload as keyword arguments.
+"""
+import datetime
+import logging
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import metrics
+from .db import serialized_writes
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+jobs_total = metrics.counter('cashg_jobs_total', 'Jobs run, by name and outcome (done, retry, failed).')
+job_seconds = metrics.histogram('cashg_job_seconds', 'Job handler run time.')
+
+_handlers = {}
+_wake = threading.Event()
+_threads_lock = threading.Lock()
+_threads = []
+
+
+def task(name):
+    """Register the decorated function as the handler for jobs called ``name``"""
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, delay=0):
+    """Queue job ``name`` in the current transaction and return it; workers see it once it commits"""
+    return enqueue_many([(name, payload)], delay)[0]
+
+
+def enqueue_many(jobs, delay=0):
+    """Queue (name, payload) pairs with one INSERT; see enqueue()"""
+    for name, _ in jobs:
+        if name not in _handlers:
+            raise ValueError(f'No handler registered for job {name!r}.')
+    run_at = timezone.now() + datetime.timedelta(seconds=delay)
+    created = Job.objects.bulk_create([Job(name=name, payload=payload or {}, run_at=run_at) for name, payload in jobs])
+    transaction.on_commit(_notify)
+    return created
+
+
+def _notify():
+    _start_threads()
+    _wake.set()
+
+
+def _start_threads():
+    """Start the CASHG_JOB_THREADS in-process workers if they aren't running yet"""
+    if len(_threads) >= settings.CASHG_JOB_THREADS:
+        return
+    with _threads_lock:
+        while len(_threads) < settings.CASHG_JOB_THREADS:
+            thread = threading.Thread(target=work, name=f'cashg-jobs-{len(_threads)}', daemon=True)
+            thread.start()
+            _threads.append(thread)
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that has failed ``attempts`` times"""
+    return min(settings.CASHG_JOB_RETRY_MAX_DELAY, settings.CASHG_JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+
+
+def claim(limit):
+    """Lease up to ``limit`` due jobs to the calling worker and return them"""
+    now = timezone.now()
+    due = list(Job.objects.filter(status='PENDING', run_at__lte=now)
+               .order_by('run_at', 'pk').values_list('pk', 'attempts')[:limit])
+    lease = now + datetime.timedelta(seconds=settings.CASHG_JOB_LEASE_SECONDS)
+    claimed = []
+    for pk, attempts in due:
+        # Conditional on the attempts just read: of two workers racing for a job, only one updates it
+        with serialized_writes('jobs'):
+            if Job.objects.filter(pk=pk, status='PENDING', attempts=attempts).update(
+                    attempts=attempts + 1, run_at=lease):
+                claimed.append(pk)
+    return list(Job.objects.filter(pk__in=claimed).order_by('pk'))
+
+
+def run(job):
+    """Run a claimed job's handler and record the outcome; return True if it succeeded"""
+    started = time.perf_counter()
+    try:
+        handler = _handlers.get(job.name)
+        if handler is None:
+            raise LookupError(f'No handler registered for job {job.name!r}.')
+        handler(**job.payload)
+    except Exception:
+        logger.exception('Job %s #%s failed (attempt %s)', job.name, job.pk, job.attempts)
+        failed = job.attempts >= settings.CASHG_JOB_MAX_ATTEMPTS
+        now = timezone.now()
+        with serialized_writes('jobs'):
+            Job.objects.filter(pk=job.pk).update(
+                status='FAILED' if failed else 'PENDING',
+                run_at=now + datetime.timedelta(seconds=backoff(job.attempts)),
+                last_error=traceback.format_exc(),
+                finished_at=now if failed else None,
+            )
+        jobs_total.inc(name=job.name, outcome='failed' if failed else 'retry')
+        return False
+    finally:
+        job_seconds.observe(time.perf_counter() - started, name=job.name)
+    with serialized_writes('jobs'):
+        Job.objects.filter(pk=job.pk).update(status='DONE', finished_at=timezone.now(), last_error='')
+    jobs_total.inc(name=job.name, outcome='done')
+    return True
+
+
+def run_due(batch_size):
+    """Claim and run one batch of due jobs; return how many were claimed"""
+    jobs = claim(batch_size)
+    for job in jobs:
+        run(job)
+    return len(jobs)
+
+
+def work(batch_size=None, poll_interval=None, stop=None, once=False):
+    """
+    Run due jobs until ``stop`` (a threading.Event) is set.
+
+    Between empty batches the worker sleeps for ``poll_interval`` seconds or
+    until a commit in this process enqueues a job. With ``once`` it returns
+    as soon as no job is due. Returns the number of jobs run.
+    """
+    batch_size = batch_size or settings.CASHG_JOB_BATCH_SIZE
+    poll_interval = poll_interval or settings.CASHG_JOB_POLL_INTERVAL
+    done = 0
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        try:
+            ran = run_due(batch_size)
+        except Exception:
+            # A database hiccup shouldn't kill the worker; the jobs stay queued
+            logger.exception('Claiming jobs failed')
+            ran = 0
+        done += ran
+        if ran:
+            continue
+        if once:
+            break
+        _wake.wait(poll_interval)
+        _wake.clear()
+    close_old_connections()
+    return done
+
+
+def purge(older_than):
+    """Delete jobs that finished successfully more than ``older_than`` seconds ago; return the count"""
+    cutoff = timezone.now() - datetime.timedelta(seconds=older_than)
+    deleted, _ = Job.objects.filter(status='DONE', finished_at__lt=cutoff).delete()
+    return deleted
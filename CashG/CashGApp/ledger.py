@@ -0,0 +1,109 @@
+"""
+Append-only double-entry ledger (CASHG_LEDGER_ENABLED).
+
+Every money movement appends one LedgerEntry per leg in the same
+transaction that changes ``Account.balance``; each account leg records the
+balance right after it, read back from the row the movement has just
+updated and still holds locked. ``BalanceCheckpoint`` rows, written when an
+account is opened and then periodically by ``manage.py ledger_checkpoint``,
+pin an account's balance at a given entry, so the balance at any past moment
+is the nearest earlier checkpoint plus the postings since (``balance_as_of``)
+and ``manage.py reconcile_ledger`` only has to replay entries written after
+the latest checkpoint.
+"""
+from django.conf import settings
+from django.db.models import Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Account, BalanceCheckpoint, LedgerEntry
+
+
+class BalanceUnavailable(Exception):
+    """No checkpoint is old enough to reconstruct the requested balance"""
+
+
+def post(postings):
+    """
+    Append the entries for ``postings``, a list of (journal, legs) in posting order.
+
+    ``legs`` are (account_id, signed amount, Transaction); each entry is
+    posted at its transaction's timestamp, so statements built from
+    Transaction rows line up with ``balance_as_of``. Any imbalance is booked
+    to the external cash side. Must be called inside the transaction.atomic()
+    block that applied the balance changes, after they were applied.
+    """
+    if not settings.CASHG_LEDGER_ENABLED or not postings:
+        return
+    account_ids = {account_id for _, legs in postings for account_id, _, _ in legs}
+    running = dict(Account.objects.filter(pk__in=account_ids).values_list('pk', 'balance'))
+    # Work back from the updated balances to where these postings started
+    for _, legs in postings:
+        for account_id, amount, _ in legs:
+            running[account_id] -= amount
+
+    entries = []
+    for journal, legs in postings:
+        for account_id, amount, txn in legs:
+            running[account_id] += amount
+            entries.append(LedgerEntry(journal=journal, account_id=account_id, reference=txn.reference_number,
+                                       amount=amount, balance_after=running[account_id], posted_at=txn.timestamp))
+        external = -sum(amount for _, amount, _ in legs)
+        if external:
+            entries.append(LedgerEntry(journal=journal, amount=external, posted_at=txn.timestamp))
+    LedgerEntry.objects.bulk_create(entries)
+
+
+def _last_entry_ids():
+    return Subquery(LedgerEntry.objects.filter(account=OuterRef('pk')).order_by('-pk').values('pk')[:1])
+
+
+def open_accounts(account_ids):
+    """Write an opening checkpoint at the current balance for each of ``account_ids``"""
+    # Balance and latest entry come from one statement, so they can't straddle a posting
+    rows = (Account.objects.filter(pk__in=account_ids)
+            .annotate(last_entry=Coalesce(_last_entry_ids(), Value(0)))
+            .values_list('pk', 'balance', 'last_entry'))
+    now = timezone.now()
+    return len(BalanceCheckpoint.objects.bulk_create([
+        BalanceCheckpoint(account_id=pk, balance=balance, last_entry_id=last_entry, as_of=now)
+        for pk, balance, last_entry in rows
+    ]))
+
+
+def checkpoint(account_ids):
+    """Checkpoint each of ``account_ids`` with entries since its last checkpoint; return how many were written"""
+    last_entries = dict(LedgerEntry.objects.filter(account_id__in=account_ids)
+                        .values('account_id').annotate(last=Max('pk')).values_list('account_id', 'last'))
+    checkpointed = dict(BalanceCheckpoint.objects.filter(account_id__in=account_ids)
+                        .values('account_id').annotate(last=Max('last_entry_id')).values_list('account_id', 'last'))
+    due = [last for account_id, last in last_entries.items() if last > checkpointed.get(account_id, 0)]
+    # Entries never change, so the latest one's running balance needs no lock
+    written = len(BalanceCheckpoint.objects.bulk_create([
+        BalanceCheckpoint(account_id=entry.account_id, balance=entry.balance_after,
+                          last_entry_id=entry.pk, as_of=entry.posted_at)
+        for entry in LedgerEntry.objects.filter(pk__in=due)
+    ]))
+    # Accounts created before the ledger was enabled
+    unopened = [pk for pk in account_ids if pk not in last_entries and pk not in checkpointed]
+    return written + open_accounts(unopened)
+
+
+def balance_as_of(account, when):
+    """Return the account's balance at ``when``: the nearest checkpoint plus the postings since"""
+    nearest = (BalanceCheckpoint.objects.filter(account=account, as_of__lte=when)
+               .order_by('-as_of', '-last_entry_id').first())
+    if nearest is None:
+        raise BalanceUnavailable(f'No checkpoint for account {account.pk} at or before {when}.')
+    since = (LedgerEntry.objects.filter(account=account, pk__gt=nearest.last_entry_id, posted_at__lte=when)
+             .aggregate(total=Sum('amount'))['total'])
+    return nearest.balance + (since or 0)
+
+
+@receiver(post_save, sender=Account)
+def _open_new_account(sender, instance, created, **kwargs):
+    # Bulk-created accounts send no signal; ledger_checkpoint opens those
+    if created and settings.CASHG_LEDGER_ENABLED:
+        open_accounts([instance.pk])
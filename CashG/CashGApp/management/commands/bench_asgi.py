@@ -0,0 +1,134 @@
+import asyncio
+import random
+import threading
+import time
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from CashGApp.benchmark import LatencyRecorder, run_concurrently, seed_accounts, without_rate_limits
+
+# (request name, weight): mostly page loads, some money movement
+WORKLOAD = (('dashboard', 4), ('history', 2), ('deposit', 2), ('transfer', 2))
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive a mix of dashboard, history, deposit and transfer requests with a fixed number in flight '
+        'and report throughput and latency for the handler this process is configured for. Run it as is '
+        'for WSGI (sync views, --wsgi-threads requests served at a time like a gunicorn worker) and with '
+        'CASHG_ASGI=1 for ASGI (async read views, money movements in the CASHG_ASYNC_DB_THREADS pool). '
+        'Creates bench_* users.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight at once.')
+        parser.add_argument('--wsgi-threads', type=int, default=1,
+                            help='Requests a WSGI worker serves at once; 1 is the Procfile\'s sync worker.')
+        parser.add_argument('--db-latency-ms', type=float, default=0.0,
+                            help='Sleep this long in every SQL query, to model a remote database.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1.')
+        accounts = seed_accounts(options['accounts'])
+        rng = random.Random(options['seed'])
+        names, weights = zip(*WORKLOAD)
+        plan = []
+        for _ in range(options['requests']):
+            account, recipient = rng.sample(accounts, 2)
+            plan.append((rng.choices(names, weights)[0], account, recipient, rng.randint(1, 50)))
+
+        if options['db_latency_ms']:
+            self.add_db_latency(options['db_latency_ms'] / 1000)
+
+        recorder = LatencyRecorder()
+        with without_rate_limits():
+            if settings.CASHG_ASYNC_VIEWS:
+                label = f"ASGI, {settings.CASHG_ASYNC_DB_THREADS} DB threads"
+                elapsed = asyncio.run(self.run_async(plan, options['concurrency'], recorder))
+            else:
+                label = f"WSGI, {options['wsgi_threads']} thread(s)"
+                elapsed = self.run_sync(plan, options['concurrency'], options['wsgi_threads'], recorder)
+
+        total = len(plan)
+        self.stdout.write(self.style.SUCCESS(
+            f"{label}: {total} requests, {options['concurrency']} in flight, in {elapsed:.2f}s "
+            f"-> {total / elapsed:.1f} req/sec"))
+        for name, count, p50, p95, p99 in recorder.summary():
+            self.stdout.write(f'  {name:>10} {count:>6}  p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  p99 {p99:7.2f} ms')
+        for (name, status), count in sorted(recorder.outcomes.items()):
+            self.stdout.write(f'  {name:>10} HTTP {status}: {count}')
+
+    def add_db_latency(self, seconds):
+        def slow(execute, sql, params, many, context):
+            time.sleep(seconds)
+            return execute(sql, params, many, context)
+
+        def install(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow)
+
+        # weak=False: the receiver is a closure that would otherwise be collected
+        connection_created.connect(install, weak=False)
+        for conn in connections.all(initialized_only=True):
+            conn.execute_wrappers.append(slow)
+
+    @staticmethod
+    def request_args(name, recipient, amount):
+        if name == 'deposit':
+            return 'post', {'amount': str(amount), 'description': 'bench'}
+        if name == 'transfer':
+            return 'post', {'amount': str(amount), 'recipient_account': recipient.account_number}
+        return 'get', None
+
+    def run_sync(self, plan, concurrency, wsgi_threads, recorder):
+        # run_concurrently hands item j to thread j % concurrency; log each
+        # thread's clients in up front so logins aren't part of the run
+        clients = [{} for _ in range(concurrency)]
+        for j, (name, account, recipient, amount) in enumerate(plan):
+            worker_clients = clients[j % concurrency]
+            if account.pk not in worker_clients:
+                worker_clients[account.pk] = Client()
+                worker_clients[account.pk].force_login(account.user)
+        work = [(clients[j % concurrency][item[1].pk], *item) for j, item in enumerate(plan)]
+        # Requests beyond the worker's threads wait their turn, as in gunicorn's accept queue
+        worker_slots = threading.BoundedSemaphore(wsgi_threads)
+
+        def execute(item):
+            client, name, account, recipient, amount = item
+            method, data = self.request_args(name, recipient, amount)
+            started = time.perf_counter()
+            with worker_slots:
+                response = getattr(client, method)(reverse(name), data)
+            recorder.record(name, time.perf_counter() - started, response.status_code)
+
+        return run_concurrently(work, concurrency, execute)
+
+    async def run_async(self, plan, concurrency, recorder):
+        clients = [{} for _ in range(concurrency)]
+        for j, (name, account, recipient, amount) in enumerate(plan):
+            worker_clients = clients[j % concurrency]
+            if account.pk not in worker_clients:
+                worker_clients[account.pk] = AsyncClient()
+                await worker_clients[account.pk].aforce_login(account.user)
+
+        async def worker(i):
+            for name, account, recipient, amount in plan[i::concurrency]:
+                method, data = self.request_args(name, recipient, amount)
+                started = time.perf_counter()
+                # Like ASGIHandler, give each request its own thread for thread-sensitive work
+                async with ThreadSensitiveContext():
+                    response = await getattr(clients[i][account.pk], method)(reverse(name), data)
+                recorder.record(name, time.perf_counter() - started, response.status_code)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        return time.perf_counter() - started
@@ -0,0 +1,91 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from CashGApp.benchmark import seed_accounts
+
+VIEWS = ('dashboard', 'deposit', 'withdraw', 'transfer', 'history', 'profile')
+
+# What settings.py uses without a shared cache
+UNCACHED = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+}
+
+
+def cached_settings():
+    """What settings.py uses with REDIS_URL; an in-process cache stands in for Redis if it isn't set"""
+    shared = settings.CACHES.get('shared', {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                            'LOCATION': 'bench-shared'})
+    return {
+        'CACHES': {**settings.CACHES, 'shared': shared},
+        'CASHG_ACCOUNT_CACHE_ALIAS': 'shared',
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+        'SESSION_CACHE_ALIAS': 'shared',
+        'AUTHENTICATION_BACKENDS': ['CashGApp.backends.CachedModelBackend'],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Count SQL queries and time per authenticated page with database sessions and an uncached '
+        'User lookup, then with cached_db sessions and the cached auth backend on the shared cache '
+        '(in-process when REDIS_URL is unset). Creates bench_* users.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=10)
+        parser.add_argument('--requests', type=int, default=5, help='Requests per page and account, per mode.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be at least 1.')
+        accounts = seed_accounts(options['accounts'])
+        results = {}
+        for mode, overrides in (('db sessions', UNCACHED), ('cached', cached_settings())):
+            with override_settings(**overrides):
+                results[mode] = self.measure(accounts, options['requests'])
+
+        self.stdout.write(f'{"":>10}  {"db sessions":>22}  {"cached":>22}')
+        for view in VIEWS:
+            cells = [f'{queries:5.1f} queries {ms:6.2f} ms' for queries, ms in (results[mode][view] for mode in results)]
+            self.stdout.write(f'{view:>10}  ' + '  '.join(f'{cell:>22}' for cell in cells))
+        saved = sum(results['db sessions'][view][0] - results['cached'][view][0] for view in VIEWS) / len(VIEWS)
+        self.stdout.write(self.style.SUCCESS(f'{saved:.1f} fewer queries per authenticated page on average'))
+
+    def measure(self, accounts, repeat):
+        """Return {view: (mean queries, mean ms)} over warm requests by every account"""
+        # New clients so their SessionMiddleware loads the overridden engine
+        clients = []
+        for account in accounts:
+            client = Client()
+            client.force_login(account.user)
+            for view in VIEWS:
+                # Warm every cache before measuring
+                client.get(reverse(view))
+            clients.append(client)
+
+        results = {}
+        for view in VIEWS:
+            url = reverse(view)
+            queries = seconds = 0
+            for client in clients:
+                for _ in range(repeat):
+                    with ExitStack() as stack:
+                        captured = [stack.enter_context(CaptureQueriesContext(connection))
+                                    for connection in connections.all()]
+                        started = time.perf_counter()
+                        response = client.get(url)
+                        seconds += time.perf_counter() - started
+                    if response.status_code != 200:
+                        raise CommandError(f'{view} answered {response.status_code}.')
+                    queries += sum(len(capture.captured_queries) for capture in captured)
+            count = len(clients) * repeat
+            results[view] = (queries / count, seconds / count * 1000)
+        return results
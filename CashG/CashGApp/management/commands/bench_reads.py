@@ -0,0 +1,63 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import reverse
+
+from CashGApp.benchmark import ClientCache, LatencyRecorder, run_concurrently, seed_accounts
+from CashGApp.routers import PIN_COOKIE, replica_configured
+
+VIEWS = ('dashboard', 'history', 'profile')
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure latency of the read-only pages when every request opens a new database connection, '
+        'when connections are reused (CONN_MAX_AGE or DATABASE_POOL_SIZE), and when reads go to '
+        'DATABASE_REPLICA_URL. Creates bench_* users; run loadtest first to give them history.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=50)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=300, help='Requests per mode.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1:
+            raise CommandError('--threads must be at least 1.')
+        accounts = seed_accounts(options['accounts'])
+        rng = random.Random(options['seed'])
+        plan = [(rng.choice(VIEWS), rng.choice(accounts)) for _ in range(options['requests'])]
+
+        modes = {
+            # The pin cookie keeps @replica_reads views on the primary
+            'reconnect': (ClientCache(cookies={PIN_COOKIE: '1'}), True),
+            'persistent': (ClientCache(cookies={PIN_COOKIE: '1'}), False),
+        }
+        if replica_configured():
+            modes['replica'] = (ClientCache(), False)
+        else:
+            self.stdout.write('DATABASE_REPLICA_URL is not set; skipping the replica mode.')
+
+        for mode, (clients, reconnect) in modes.items():
+            recorder = LatencyRecorder()
+
+            def execute(item, clients=clients, reconnect=reconnect, recorder=recorder):
+                view, account = item
+                # Logging in is outside the timed section
+                client = clients.get(account)
+                started = time.perf_counter()
+                response = client.get(reverse(view))
+                if reconnect:
+                    # What CONN_MAX_AGE = 0 without a pool does at the end of every request
+                    connections.close_all()
+                recorder.record(view, time.perf_counter() - started, response.status_code)
+
+            elapsed = run_concurrently(plan, options['threads'], execute)
+
+            self.stdout.write(self.style.SUCCESS(
+                f'{mode}: {len(plan)} requests in {elapsed:.2f}s -> {len(plan) / elapsed:.1f} req/sec'))
+            for view, count, p50, p95, p99 in recorder.summary():
+                self.stdout.write(f'  {view:>10} {count:>6}  p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  p99 {p99:7.2f} ms')
@@ -0,0 +1,115 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.template import engines
+from django.template.loader import get_template
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from CashGApp import account_cache, idgen, ledger
+from CashGApp.aggregates import record_transactions
+from CashGApp.benchmark import seed_accounts
+from CashGApp.models import Account, Transaction
+
+TEMPLATES = ('dashboard.html', 'transactions.html', 'transfer.html', 'login.html')
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure template loading with and without the cached loader, and render time of the full '
+        '(streamed) history page of one bench account with --rows transactions, without the row '
+        'fragment cache, with it cold and with it warm.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Transactions on the bench account.')
+        parser.add_argument('--repeat', type=int, default=5, help='Renders per mode.')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1.')
+        account = seed_accounts(1)[0]
+        added = self.seed_history(account, options['rows'])
+        if added:
+            self.stdout.write(f'Added {added} transactions to {account.user.username}.')
+
+        self.bench_loading(options['repeat'] * 20)
+        self.bench_history(account, options['repeat'])
+
+    def seed_history(self, account, rows):
+        """Top ``account`` up to ``rows`` transactions; return how many were added"""
+        missing = rows - Transaction.objects.filter(account=account).count()
+        if missing <= 0:
+            return 0
+        generator = idgen.get_generator()
+        now = timezone.now()
+        amount = Decimal('1.00')
+        txns = [
+            Transaction(account=account, transaction_type='DEPOSIT', amount=amount, timestamp=now,
+                        description=f'Bench deposit {i}', reference_number=generator.reference_number())
+            for i in range(missing)
+        ]
+        # Written the way services.deposit would, so balances, aggregates and the ledger still agree
+        with transaction.atomic():
+            Account.objects.filter(pk=account.pk).update(balance=F('balance') + amount * missing)
+            txns = Transaction.objects.bulk_create(txns, batch_size=1000)
+            record_transactions(*txns)
+            ledger.post([(txn.reference_number, [(account.pk, amount, txn)]) for txn in txns])
+            account_cache.invalidate_on_commit(account.user_id)
+        return missing
+
+    def bench_loading(self, loads):
+        loader = engines['django'].engine.template_loaders[0]
+        for mode, reset in (('uncached loader', True), ('cached loader', False)):
+            timings = []
+            for _ in range(loads):
+                started = time.perf_counter()
+                if reset:
+                    loader.reset()
+                for name in TEMPLATES:
+                    get_template(name)
+                timings.append(time.perf_counter() - started)
+            self.report(f'{mode}: load {len(TEMPLATES)} templates', timings)
+
+    def bench_history(self, account, repeat):
+        client = Client()
+        client.force_login(account.user)
+        url = f"{reverse('history')}?stream=1"
+        fragments = caches['fragments']
+
+        def render():
+            started = time.perf_counter()
+            response = client.get(url)
+            body = b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                raise CommandError(f'History page answered {response.status_code}.')
+            return elapsed, len(body)
+
+        no_fragments = {**settings.CACHES, 'fragments': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=no_fragments):
+            timings = [render()[0] for _ in range(repeat)]
+        self.report('no fragment cache: history page', timings)
+
+        timings = []
+        for _ in range(repeat):
+            fragments.clear()
+            elapsed, size = render()
+            timings.append(elapsed)
+        self.report('cold fragment cache: history page', timings)
+
+        timings = [render()[0] for _ in range(repeat)]
+        self.report('warm fragment cache: history page', timings)
+        self.stdout.write(f'  {size / 1024:.0f} KiB of HTML per render')
+
+    def report(self, label, timings):
+        self.stdout.write(self.style.SUCCESS(
+            f'{label}: median {statistics.median(timings) * 1000:.2f} ms, '
+            f'min {min(timings) * 1000:.2f} ms over {len(timings)} runs'))
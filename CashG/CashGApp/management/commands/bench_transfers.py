@@ -0,0 +1,91 @@
+import random
+import threading
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, transaction
+
+from CashGApp import services
+from CashGApp.aggregates import record_transactions
+from CashGApp.benchmark import run_concurrently, seed_accounts
+from CashGApp.models import Account, Transaction, Transfer
+
+
+def locked_transfer(sender, recipient, amount, note=''):
+    """The pre-service-layer transfer: SELECT ... FOR UPDATE, Python arithmetic, full save()"""
+    with transaction.atomic():
+        sender = Account.objects.select_for_update().get(pk=sender.pk)
+        recipient = Account.objects.select_for_update().get(pk=recipient.pk)
+        if amount > sender.balance:
+            raise services.InsufficientFunds(sender.pk)
+        sender.balance -= amount
+        recipient.balance += amount
+        sender.save()
+        recipient.save()
+        sent_txn = Transaction.objects.create(
+            account=sender, amount=amount, transaction_type='TRANSFER',
+            description=f'Transfer to {recipient.account_number}')
+        received_txn = Transaction.objects.create(
+            account=recipient, amount=amount, transaction_type='RECEIVED',
+            description=f'Received from {sender.account_number}')
+        record_transactions(sent_txn, received_txn)
+        return Transfer.objects.create(sender_account=sender, recipient_account=recipient, amount=amount, note=note)
+
+
+MODES = {
+    'locked': locked_transfer,
+    'conditional': services.transfer,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure transfers/sec under concurrency for the locked (select_for_update + save) and '
+        'conditional-UPDATE transfer paths. Creates bench_* users in the configured database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=[*MODES, 'both'], default='both')
+        parser.add_argument('--accounts', type=int, default=50)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--transfers', type=int, default=2000, help='Total transfers per mode.')
+        parser.add_argument('--hot', type=float, default=0.5,
+                            help='Fraction of transfers sent to the single hottest recipient.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        accounts = seed_accounts(options['accounts'])
+        modes = list(MODES) if options['mode'] == 'both' else [options['mode']]
+        for mode in modes:
+            stats = self.run(MODES[mode], accounts, options)
+            self.stdout.write(
+                f"{mode:>12}: {stats['ok']} ok, {stats['failed']} failed in {stats['elapsed']:.2f}s "
+                f"-> {stats['ok'] / stats['elapsed']:.1f} transfers/sec"
+            )
+
+    def run(self, transfer, accounts, options):
+        rng = random.Random(options['seed'])
+        hot = accounts[0]
+        plan = []
+        for _ in range(options['transfers']):
+            sender = rng.choice(accounts[1:])
+            recipient = hot if rng.random() < options['hot'] else rng.choice(accounts)
+            if recipient.pk == sender.pk:
+                recipient = hot
+            plan.append((sender, recipient, Decimal(rng.randint(1, 500))))
+
+        counts = {'ok': 0, 'failed': 0}
+        lock = threading.Lock()
+
+        def execute(item):
+            sender, recipient, amount = item
+            try:
+                transfer(sender, recipient, amount)
+                outcome = 'ok'
+            except (services.MovementError, DatabaseError):
+                outcome = 'failed'
+            with lock:
+                counts[outcome] += 1
+
+        elapsed = run_concurrently(plan, options['threads'], execute)
+        return {**counts, 'elapsed': elapsed}
@@ -0,0 +1,94 @@
+import os
+import re
+import subprocess
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+ASSETS_SRC = Path(settings.BASE_DIR) / 'assets'
+TEMPLATES_DIR = Path(settings.BASE_DIR) / 'CashGApp' / 'templates'
+# The CDN build the templates were written against (see base.html)
+TAILWIND_VERSION = 'v3.4.17'
+
+ICON_CLASS = re.compile(r'(?<![\w/-])fa-([a-z0-9-]+)')
+ICON_RULE = re.compile(r'^\.fa-([a-z0-9-]+)::before \{\s*content: "\\([0-9a-f]+)"; \}', re.MULTILINE)
+ICONS_CSS = (
+    '{license}'
+    '@font-face{{font-family:"Font Awesome 6 Free";font-style:normal;font-weight:900;font-display:block;'
+    'src:url(fa-solid-900.woff2) format("woff2")}}'
+    '.fas,.fa-solid{{-moz-osx-font-smoothing:grayscale;-webkit-font-smoothing:antialiased;display:inline-block;'
+    'font-family:"Font Awesome 6 Free";font-weight:900;font-style:normal;font-variant:normal;line-height:1;'
+    'text-rendering:auto}}'
+    '{rules}\n'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the self-hosted front-end assets into CASHG_ASSETS_DIR: a minified Tailwind stylesheet '
+        'holding only the classes used in the templates, and a Font Awesome solid font subset to the '
+        'icons they use. Run before collectstatic (build.sh does).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tailwind', default=os.getenv('TAILWINDCSS', 'tailwindcss'),
+                            help='Tailwind CLI to run; the pytailwindcss one downloads the binary on first use.')
+
+    def handle(self, *args, **options):
+        out = Path(settings.CASHG_ASSETS_DIR)
+        out.mkdir(parents=True, exist_ok=True)
+        # The stylesheet goes last: its presence is what switches pages to the built assets
+        self.build_icons(out)
+        self.build_stylesheet(out, options['tailwind'])
+
+    def build_icons(self, out):
+        try:
+            import fontawesomefree
+            from fontTools import subset
+        except ImportError as e:
+            raise CommandError(f'{e.name} is not installed; pip install -r requirements.txt') from e
+        source = Path(fontawesomefree.__file__).parent / 'static' / 'fontawesomefree'
+        stylesheet = (source / 'css' / 'all.css').read_text(encoding='utf-8')
+        codepoints = dict(ICON_RULE.findall(stylesheet))
+
+        used = set()
+        for template in TEMPLATES_DIR.rglob('*.html'):
+            used.update(ICON_CLASS.findall(template.read_text(encoding='utf-8')))
+        icons = sorted(name for name in used if name in codepoints)
+        for name in sorted(used - set(codepoints) - {'solid'}):
+            self.stderr.write(self.style.WARNING(f'fa-{name} is not a Font Awesome icon; ignoring it.'))
+        if not icons:
+            raise CommandError(f'No Font Awesome icons found in {TEMPLATES_DIR}.')
+
+        font_options = subset.Options()
+        font_options.flavor = 'woff2'
+        font_options.layout_features = []
+        font = subset.load_font(str(source / 'webfonts' / 'fa-solid-900.woff2'), font_options)
+        subsetter = subset.Subsetter(font_options)
+        subsetter.populate(unicodes={int(codepoints[name], 16) for name in icons})
+        subsetter.subset(font)
+        subset.save_font(font, str(out / 'fa-solid-900.woff2'), font_options)
+
+        license = stylesheet[:stylesheet.index('*/') + 2].replace('/*!', '/*', 1) + '\n'
+        rules = ''.join(f'.fa-{name}:before{{content:"\\{codepoints[name]}"}}' for name in icons)
+        (out / 'icons.css').write_text(ICONS_CSS.format(license=license, rules=rules), encoding='utf-8')
+
+        full = (source / 'css' / 'all.min.css').stat().st_size + (source / 'webfonts' / 'fa-solid-900.woff2').stat().st_size
+        built = (out / 'icons.css').stat().st_size + (out / 'fa-solid-900.woff2').stat().st_size
+        self.stdout.write(self.style.SUCCESS(
+            f'Icons: {len(icons)} used, {built / 1024:.1f} KiB (full Font Awesome: {full / 1024:.1f} KiB)'))
+
+    def build_stylesheet(self, out, tailwind):
+        env = {**os.environ}
+        env.setdefault('TAILWINDCSS_VERSION', TAILWIND_VERSION)
+        command = [tailwind, '--config', str(ASSETS_SRC / 'tailwind.config.js'),
+                   '--input', str(ASSETS_SRC / 'tailwind.css'), '--output', str(out / 'app.css'), '--minify']
+        try:
+            subprocess.run(command, check=True, env=env)
+        except FileNotFoundError as e:
+            raise CommandError(f'Tailwind CLI {tailwind!r} not found; pip install -r requirements.txt '
+                               f'or pass --tailwind') from e
+        except subprocess.CalledProcessError as e:
+            raise CommandError(f'Tailwind CLI failed with exit status {e.returncode}.') from e
+        self.stdout.write(self.style.SUCCESS(f'Stylesheet: {(out / "app.css").stat().st_size / 1024:.1f} KiB'))
@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from CashGApp import statements
+from CashGApp.models import Account
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the statement of one account for a date range (inclusive) as CSV or JSON Lines, with '
+        'opening and closing balances. Rows are streamed, so memory use does not depend on the range.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('account_number')
+        parser.add_argument('--start', required=True, help='First day, YYYY-MM-DD.')
+        parser.add_argument('--end', required=True, help='Last day, YYYY-MM-DD.')
+        parser.add_argument('--format', choices=sorted(statements.FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip.')
+        parser.add_argument('--output', '-o', help='File to write; defaults to standard output.')
+        parser.add_argument('--chunk-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            account = Account.objects.get(account_number=options['account_number'])
+        except Account.DoesNotExist:
+            raise CommandError(f"Account {options['account_number']} not found.")
+        try:
+            start, end = statements.parse_period(options['start'], options['end'])
+        except statements.InvalidPeriod as e:
+            raise CommandError(str(e))
+
+        content = statements.stream(account, start, end, options['format'], options['gzip'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'wb') as f:
+                for data in content:
+                    f.write(data)
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}."))
+            return
+        out = sys.stdout.buffer
+        for data in content:
+            out.write(data)
+        out.flush()
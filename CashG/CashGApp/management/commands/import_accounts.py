@@ -0,0 +1,103 @@
+import csv
+import json
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from CashGApp.onboarding import ImportRecord, existing_usernames, import_records, password_pool
+
+FIELDS = ('username', 'password', 'password_hash', 'first_name', 'last_name', 'email', 'account_type',
+          'phone_number', 'address', 'balance')
+
+
+class Command(BaseCommand):
+    help = (
+        'Create users, profiles and accounts from a CSV or JSONL file of existing customers. Each line needs '
+        'username; password (plain, hashed here) or password_hash (a Django password hash), first_name, '
+        'last_name, email, account_type (Client or Admin), phone_number, address and balance are optional. '
+        'Users without a password get an unusable one. Existing usernames are skipped, so rerunning an '
+        'interrupted import resumes it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Customer file, or '-' for stdin.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format. Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Records written per database transaction.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes hashing passwords; 1 hashes in this process.')
+        parser.add_argument('--report', help='Write per-line results as CSV to this path instead of stdout.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--chunk-size and --workers must be at least 1.')
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        source = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        report_file = open(options['report'], 'w', newline='', encoding='utf-8') if options['report'] else self.stdout
+        report = csv.writer(report_file)
+        report.writerow(['line', 'status', 'username', 'account_number', 'error'])
+
+        counts = {'IMPORTED': 0, 'SKIPPED': 0, 'FAILED': 0}
+        started = time.monotonic()
+        try:
+            with password_pool(options['workers']) as pool:
+                existing = existing_usernames()
+                self.stderr.write(f'{len(existing)} existing usernames loaded.')
+                records = read_jsonl(source) if fmt == 'jsonl' else read_csv(source)
+                for done, result in enumerate(import_records(records, options['chunk_size'], pool, existing), 1):
+                    report.writerow([result.line_number, result.status, result.username,
+                                     result.account_number, result.error])
+                    counts[result.status] += 1
+                    if done % options['chunk_size'] == 0:
+                        self.progress(counts, started)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if report_file is not self.stdout:
+                report_file.close()
+
+        summary = self.progress(counts, started, final=True)
+        self.stderr.write(self.style.WARNING(summary) if counts['FAILED'] else self.style.SUCCESS(summary))
+
+    def progress(self, counts, started, final=False):
+        elapsed = time.monotonic() - started
+        line = (f'{"Done" if final else "Progress"}: {counts["IMPORTED"]} imported, {counts["SKIPPED"]} skipped, '
+                f'{counts["FAILED"]} failed in {elapsed:.1f}s ({counts["IMPORTED"] / max(elapsed, 1e-6):.1f} accounts/sec).')
+        if not final:
+            self.stderr.write(line)
+        return line
+
+
+def _record(line_number, raw):
+    values = {field: str(raw.get(field) or '') for field in FIELDS}
+    # Passwords are taken verbatim; surrounding spaces may be part of them
+    return ImportRecord(line_number, **{field: value if field == 'password' else value.strip()
+                                        for field, value in values.items()})
+
+
+def read_csv(source):
+    reader = csv.DictReader(source)
+    if 'username' not in (reader.fieldnames or ()):
+        raise CommandError('CSV header is missing: username')
+    # Line 1 is the header
+    for line_number, raw in enumerate(reader, start=2):
+        yield _record(line_number, raw)
+
+
+def read_jsonl(source):
+    for line_number, raw in enumerate(source, start=1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except json.JSONDecodeError as e:
+            yield ImportRecord(line_number, '', parse_error=f'Invalid JSON: {e}')
+            continue
+        if not isinstance(record, dict):
+            yield ImportRecord(line_number, '', parse_error='Each line must be a JSON object.')
+            continue
+        yield _record(line_number, record)
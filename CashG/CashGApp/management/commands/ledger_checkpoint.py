@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from CashGApp import ledger
+from CashGApp.models import Account
+
+
+class Command(BaseCommand):
+    help = (
+        'Checkpoint the ledger balance of every account with postings since its last checkpoint, and open '
+        'accounts created before the ledger was enabled. Schedule it periodically (e.g. nightly).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        written = accounts = 0
+        last_pk = 0
+        while True:
+            chunk = list(Account.objects.filter(pk__gt=last_pk).order_by('pk')
+                         .values_list('pk', flat=True)[:options['chunk_size']])
+            if not chunk:
+                break
+            written += ledger.checkpoint(chunk)
+            accounts += len(chunk)
+            last_pk = chunk[-1]
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} checkpoints for {accounts} accounts.'))
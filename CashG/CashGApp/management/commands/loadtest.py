@@ -0,0 +1,177 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+from django.urls import reverse
+from django.utils import timezone
+
+from CashGApp import db, services
+from CashGApp.benchmark import (
+    ClientCache, LatencyRecorder, balances, ledger_mismatches, random_amount, run_concurrently, seed_accounts,
+    without_rate_limits, zipf_chooser,
+)
+
+OPERATIONS = ('deposit', 'withdraw', 'transfer')
+
+# Amount ranges (in pesos) that pass the views' own validation
+AMOUNTS = {
+    'deposit': (1, 5000),
+    'withdraw': (200, 5000),
+    'transfer': (1, 5000),
+}
+
+
+def parse_mix(value):
+    """Parse 'deposit=0.3,withdraw=0.2,transfer=0.5' into normalised weights"""
+    weights = dict.fromkeys(OPERATIONS, 0.0)
+    try:
+        for part in value.split(','):
+            name, weight = part.split('=')
+            if name.strip() not in weights:
+                raise ValueError(name)
+            weights[name.strip()] = float(weight)
+    except ValueError:
+        raise CommandError(f'Invalid --mix {value!r}; expected e.g. deposit=0.3,withdraw=0.2,transfer=0.5')
+    total = sum(weights.values())
+    if total <= 0:
+        raise CommandError('--mix needs at least one positive weight.')
+    return {name: weight / total for name, weight in weights.items()}
+
+
+class ServiceDriver:
+    """Calls the service layer directly: measures the money-movement code without HTTP"""
+
+    def __call__(self, operation, account, amount, recipient):
+        try:
+            if operation == 'deposit':
+                services.deposit(account, amount, 'loadtest')
+            elif operation == 'withdraw':
+                services.withdraw(account, amount, 'loadtest')
+            else:
+                services.transfer(account, recipient, amount, 'loadtest')
+        except services.InsufficientFunds:
+            return 'rejected'
+        except services.MovementError:
+            return 'failed'
+        except DatabaseError:
+            return 'error'
+        return 'ok'
+
+
+class ViewDriver:
+    """POSTs to the real views through django.test.Client, one logged-in client per thread and account"""
+
+    def __init__(self):
+        self.clients = ClientCache()
+
+    def __call__(self, operation, account, amount, recipient):
+        data = {'amount': str(amount), 'description': 'loadtest'}
+        if operation == 'transfer':
+            data['recipient_account'] = recipient.account_number
+        try:
+            response = self.clients.get(account).post(reverse(operation), data)
+        except DatabaseError:
+            return 'error'
+        # The views redirect to the dashboard on success and re-render the form on a rejection
+        return 'ok' if response.status_code == 302 else 'rejected'
+
+
+DRIVERS = {
+    'service': ServiceDriver,
+    'views': ViewDriver,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive concurrent deposits, withdrawals and transfers with hot-account skew and report '
+        'latency percentiles, throughput, retries and a balance-conservation check. '
+        'Creates bench_* users in the configured database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--driver', choices=DRIVERS, default='service',
+                            help='Call the service layer directly or POST to the views.')
+        parser.add_argument('--accounts', type=int, default=100)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--operations', type=int, default=2000)
+        parser.add_argument('--mix', default='deposit=0.3,withdraw=0.2,transfer=0.5')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Zipf exponent for picking accounts; 0 is uniform.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['accounts'] < 2:
+            raise CommandError('--accounts must be at least 2.')
+        if options['threads'] < 1:
+            raise CommandError('--threads must be at least 1.')
+        mix = parse_mix(options['mix'])
+
+        accounts = seed_accounts(options['accounts'])
+        plan = self.build_plan(accounts, mix, options)
+
+        driver = DRIVERS[options['driver']]()
+        recorder = LatencyRecorder()
+
+        def execute(item):
+            operation, account, amount, recipient = item
+            started = time.perf_counter()
+            outcome = driver(operation, account, amount, recipient)
+            recorder.record(operation, time.perf_counter() - started, outcome)
+
+        account_ids = [account.pk for account in accounts]
+        balances_before = balances(account_ids)
+        retries_before = self.retry_counts()
+        run_start = timezone.now()
+        with without_rate_limits():
+            elapsed = run_concurrently(plan, options['threads'], execute)
+        retries_after = self.retry_counts()
+
+        self.report(recorder, elapsed, retries_before, retries_after)
+        self.check_invariants(balances_before, run_start)
+
+    def build_plan(self, accounts, mix, options):
+        rng = random.Random(options['seed'])
+        pick = zipf_chooser(accounts, options['skew'], rng)
+        operations, weights = zip(*mix.items())
+        plan = []
+        for _ in range(options['operations']):
+            operation = rng.choices(operations, weights)[0]
+            account = pick()
+            recipient = None
+            if operation == 'transfer':
+                recipient = pick()
+                while recipient.pk == account.pk:
+                    recipient = rng.choice(accounts)
+            plan.append((operation, account, random_amount(rng, *AMOUNTS[operation]), recipient))
+        return plan
+
+    def retry_counts(self):
+        return (
+            sum(value for _, value in db.retries_total.samples()),
+            sum(value for _, value in db.retries_exhausted_total.samples()),
+        )
+
+    def report(self, recorder, elapsed, retries_before, retries_after):
+        total = sum(recorder.outcomes.values())
+        self.stdout.write(f'{total} operations in {elapsed:.2f}s -> {total / elapsed:.1f} ops/sec')
+        self.stdout.write(f"{'operation':>10} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for operation, count, p50, p95, p99 in recorder.summary():
+            self.stdout.write(f'{operation:>10} {count:>7} {p50:>9.2f} {p95:>9.2f} {p99:>9.2f}')
+        for (operation, outcome), count in sorted(recorder.outcomes.items()):
+            self.stdout.write(f'{operation:>10} {outcome}: {count}')
+        self.stdout.write(
+            f'Deadlock/serialization retries: {retries_after[0] - retries_before[0]}, '
+            f'gave up after retrying: {retries_after[1] - retries_before[1]}'
+        )
+
+    def check_invariants(self, balances_before, run_start):
+        # Transfers move money between bench accounts, so every peso in or out
+        # of the pool must show up as a deposit or withdrawal row
+        mismatches = ledger_mismatches(balances_before, run_start)
+        if mismatches:
+            for pk, expected, actual in mismatches[:10]:
+                self.stderr.write(f'Account {pk}: expected {expected}, found {actual}')
+            raise CommandError(f'Balance conservation failed for {len(mismatches)} account(s).')
+        self.stdout.write(self.style.SUCCESS('Balance conservation holds: every balance matches its ledger.'))
@@ -0,0 +1,95 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from CashGApp.batch import BatchLine, post_batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Post a CSV or JSONL file of deposits and transfers. Each line needs type (DEPOSIT or TRANSFER), '
+        'account and amount; transfers also need recipient. description is optional.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Batch file, or '-' for stdin.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format. Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Lines posted per database transaction.')
+        parser.add_argument('--report', help='Write per-line results as CSV to this path instead of stdout.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        source = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        report_file = open(options['report'], 'w', newline='', encoding='utf-8') if options['report'] else self.stdout
+        report = csv.writer(report_file)
+        report.writerow(['line', 'status', 'reference', 'error'])
+
+        posted = failed = 0
+        started = time.monotonic()
+        try:
+            lines = read_jsonl(source) if fmt == 'jsonl' else read_csv(source)
+            for result in post_batch(lines, chunk_size=options['chunk_size']):
+                report.writerow([result.line_number, 'OK' if result.ok else 'FAILED', result.reference, result.error])
+                if result.ok:
+                    posted += 1
+                else:
+                    failed += 1
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if report_file is not self.stdout:
+                report_file.close()
+
+        elapsed = time.monotonic() - started
+        summary = f'Posted {posted} lines, {failed} failed, in {elapsed:.2f}s.'
+        if failed:
+            self.stderr.write(self.style.WARNING(summary))
+        else:
+            self.stderr.write(self.style.SUCCESS(summary))
+
+
+def _field(record, name):
+    # JSON values may be numbers, e.g. an amount of 12.5
+    return str(record.get(name) or '').strip()
+
+
+def _line(line_number, record):
+    return BatchLine(
+        line_number=line_number,
+        type=_field(record, 'type').upper(),
+        account=_field(record, 'account'),
+        amount=_field(record, 'amount'),
+        recipient=_field(record, 'recipient'),
+        description=_field(record, 'description'),
+    )
+
+
+def read_csv(source):
+    reader = csv.DictReader(source)
+    missing = {'type', 'account', 'amount'} - set(reader.fieldnames or ())
+    if missing:
+        raise CommandError(f'CSV header is missing: {", ".join(sorted(missing))}')
+    # Line 1 is the header
+    for line_number, record in enumerate(reader, start=2):
+        yield _line(line_number, record)
+
+
+def read_jsonl(source):
+    for line_number, raw in enumerate(source, start=1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except json.JSONDecodeError as e:
+            yield BatchLine(line_number, '', '', '', parse_error=f'Invalid JSON: {e}')
+            continue
+        if not isinstance(record, dict):
+            yield BatchLine(line_number, '', '', '', parse_error='Each line must be a JSON object.')
+            continue
+        yield _line(line_number, record)
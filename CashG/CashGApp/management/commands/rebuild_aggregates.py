@@ -0,0 +1,103 @@
+import itertools
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+from CashGApp.aggregates import TOTAL_FIELDS
+from CashGApp.db import serialized_writes
+from CashGApp.models import AccountSummary, ArchivedTransaction, DailyAccountSummary, Transaction
+
+SUMMARY_FIELDS = [*TOTAL_FIELDS.values(), 'transaction_count']
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-account and per-day transaction aggregates from the ledger in one pass.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Compare stored aggregates with the ledger and report drift without writing.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            accounts, days = self.compute()
+            drift = self.verify(AccountSummary, accounts, lambda row: row.account_id)
+            drift += self.verify(DailyAccountSummary, days, lambda row: (row.account_id, row.date))
+            if drift:
+                raise CommandError(f'{drift} aggregate rows disagree with the ledger.')
+            self.stdout.write(self.style.SUCCESS(
+                f'Aggregates match the ledger ({len(accounts)} accounts, {len(days)} account-days).'))
+            return
+
+        batch_size = options['batch_size']
+        with serialized_writes('rebuild_aggregates'), transaction.atomic():
+            # Movements that commit after compute() would otherwise be lost
+            # when their summary updates are overwritten by the rebuild
+            self.lock_summaries()
+            accounts, days = self.compute()
+            AccountSummary.objects.all().delete()
+            DailyAccountSummary.objects.all().delete()
+            AccountSummary.objects.bulk_create(
+                (AccountSummary(account_id=account_id, **totals) for account_id, totals in accounts.items()),
+                batch_size=batch_size,
+            )
+            DailyAccountSummary.objects.bulk_create(
+                (DailyAccountSummary(account_id=account_id, date=day, **totals)
+                 for (account_id, day), totals in days.items()),
+                batch_size=batch_size,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt aggregates for {len(accounts)} accounts and {len(days)} account-days.'))
+
+    def lock_summaries(self):
+        """Hold off record_transactions() until this transaction ends"""
+        if connection.vendor == 'postgresql':
+            # Also blocks first-time INSERTs, which row locks can't
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {AccountSummary._meta.db_table}, '
+                               f'{DailyAccountSummary._meta.db_table} IN EXCLUSIVE MODE')
+        else:
+            # On SQLite the IMMEDIATE transaction already holds the write lock
+            for model in (AccountSummary, DailyAccountSummary):
+                list(model.objects.select_for_update().values_list('pk', flat=True).iterator())
+
+    def compute(self):
+        """Aggregate the whole ledger, archived rows included, with one GROUP BY (account, day, type) query per table"""
+        def empty():
+            return dict.fromkeys(SUMMARY_FIELDS, 0)
+
+        accounts = defaultdict(empty)
+        days = defaultdict(empty)
+        rows = itertools.chain.from_iterable(
+            model.objects
+            .annotate(day=TruncDate('timestamp'))
+            .values('account_id', 'day', 'transaction_type')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by()
+            .iterator()
+            for model in (ArchivedTransaction, Transaction)
+        )
+        for row in rows:
+            field = TOTAL_FIELDS[row['transaction_type']]
+            for totals in (accounts[row['account_id']], days[(row['account_id'], row['day'])]):
+                totals[field] += row['total']
+                totals['transaction_count'] += row['count']
+        return accounts, days
+
+    def verify(self, model, expected, key):
+        """Count and report rows of ``model`` that differ from ``expected``"""
+        expected = dict(expected)
+        drift = 0
+        for row in model.objects.iterator():
+            totals = expected.pop(key(row), None)
+            actual = {field: getattr(row, field) for field in SUMMARY_FIELDS}
+            if totals is None or any(actual[field] != totals[field] for field in SUMMARY_FIELDS):
+                drift += 1
+                self.stderr.write(f'{model.__name__} {key(row)}: stored {actual}, ledger {totals}')
+        for missing in expected:
+            drift += 1
+            self.stderr.write(f'{model.__name__} {missing}: missing')
+        return drift
@@ -0,0 +1,109 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import OuterRef, Subquery, Sum
+
+from CashGApp.models import Account, BalanceCheckpoint, LedgerEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Verify every account against the ledger: each posting\'s running balance must follow from the '
+        'previous one, and the last must equal Account.balance. Starts from each account\'s latest '
+        'checkpoint (--full: its first) and streams accounts and postings in chunks, so memory stays '
+        'bounded however large the ledger grows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Replay from each account\'s opening checkpoint and check that every journal '
+                                 'balances.')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Accounts per chunk.')
+
+    def handle(self, *args, **options):
+        self.mismatches = 0
+        accounts = postings = unanchored = 0
+        last_pk = 0
+        while True:
+            chunk = self.next_chunk(last_pk, options['chunk_size'], options['full'])
+            if not chunk:
+                break
+            replayed, skipped = self.reconcile(chunk)
+            accounts += len(chunk)
+            postings += replayed
+            unanchored += skipped
+            last_pk = chunk[-1][0]
+
+        if options['full']:
+            self.check_journals()
+        if unanchored:
+            self.stdout.write(self.style.WARNING(
+                f'{unanchored} accounts have neither a checkpoint nor postings; run ledger_checkpoint.'))
+        if self.mismatches:
+            raise CommandError(f'{self.mismatches} ledger mismatches in {accounts} accounts.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Ledger matches balances ({accounts} accounts, {postings} postings replayed).'))
+
+    def next_chunk(self, last_pk, size, full):
+        """Return [(pk, balance, last entry id, starting checkpoint id)] for the next ``size`` accounts"""
+        checkpoints = BalanceCheckpoint.objects.filter(account=OuterRef('pk'))
+        checkpoints = checkpoints.order_by('last_entry_id', 'pk') if full else checkpoints.order_by('-last_entry_id', '-pk')
+        # Balance and last entry come from one statement, so a concurrent posting is either in both or neither
+        return list(
+            Account.objects.filter(pk__gt=last_pk).order_by('pk')
+            .annotate(
+                last_entry=Subquery(LedgerEntry.objects.filter(account=OuterRef('pk')).order_by('-pk').values('pk')[:1]),
+                checkpoint=Subquery(checkpoints.values('pk')[:1]),
+            )
+            .values_list('pk', 'balance', 'last_entry', 'checkpoint')[:size]
+        )
+
+    def reconcile(self, chunk):
+        """Replay the chunk's postings; return (postings replayed, accounts with nothing to check against)"""
+        checkpoints = BalanceCheckpoint.objects.in_bulk([row[3] for row in chunk if row[3]])
+        # account -> (running balance or None until anchored, replay entries after this id, up to this id)
+        state = {}
+        unanchored = 0
+        for pk, balance, last_entry, checkpoint_id in chunk:
+            checkpoint = checkpoints.get(checkpoint_id)
+            if checkpoint is None and last_entry is None:
+                unanchored += 1
+                continue
+            start = checkpoint.last_entry_id if checkpoint else 0
+            state[pk] = [checkpoint.balance if checkpoint else None, start, last_entry or 0]
+
+        replayed = 0
+        pending = [row for row in state.values() if row[2] > row[1]]
+        if pending:
+            entries = (
+                LedgerEntry.objects
+                .filter(account_id__in=list(state), pk__gt=min(row[1] for row in pending),
+                        pk__lte=max(row[2] for row in pending))
+                .order_by('account_id', 'pk')
+                .values_list('account_id', 'pk', 'amount', 'balance_after')
+            )
+            for account_id, entry_id, amount, balance_after in entries.iterator(chunk_size=2000):
+                running, start, end = state[account_id]
+                if not start < entry_id <= end:
+                    continue
+                replayed += 1
+                if running is not None and running + amount != balance_after:
+                    self.mismatch(f'Account {account_id} entry {entry_id}: expected {running + amount}, '
+                                  f'recorded {balance_after}')
+                # Continue from the recorded balance, so a broken link is reported where it
+                # happens rather than again on every later entry
+                state[account_id][0] = balance_after
+
+        for pk, balance, last_entry, checkpoint_id in chunk:
+            if pk in state and state[pk][0] != balance:
+                self.mismatch(f'Account {pk}: balance {balance}, ledger {state[pk][0]}')
+        return replayed, unanchored
+
+    def check_journals(self):
+        """Report journals whose legs don't sum to zero"""
+        unbalanced = (LedgerEntry.objects.values('journal').annotate(total=Sum('amount'))
+                      .exclude(total=0).order_by())
+        for row in unbalanced.iterator():
+            self.mismatch(f'Journal {row["journal"]} is off by {row["total"]}')
+
+    def mismatch(self, message):
+        self.mismatches += 1
+        self.stderr.write(message)
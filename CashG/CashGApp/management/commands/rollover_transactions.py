@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from CashGApp import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Keep Transaction\'s monthly partitions created ahead of time (PostgreSQL) and move months older '
+        'than --keep-months into ArchivedTransaction. Schedule it daily or at least monthly.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--setup', action='store_true',
+                            help='Convert the Transaction table to monthly partitions first (PostgreSQL, one-off; '
+                                 'locks the table while it runs).')
+        parser.add_argument('--months-ahead', type=int, default=settings.CASHG_TRANSACTION_PARTITION_MONTHS_AHEAD)
+        parser.add_argument('--keep-months', type=int, default=settings.CASHG_TRANSACTION_HOT_MONTHS,
+                            help='Archive transactions from before the start of the month this many months ago.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows moved per transaction on databases without partitioning.')
+
+    def handle(self, *args, **options):
+        try:
+            if options['setup']:
+                if partitions.setup(options['months_ahead']):
+                    self.stdout.write(self.style.SUCCESS('Partitioned the transaction tables by month.'))
+                else:
+                    self.stdout.write('The transaction tables are already partitioned.')
+            if partitions.is_partitioned():
+                for name in partitions.ensure_partitions(options['months_ahead']):
+                    self.stdout.write(f'Created partition {name}.')
+            elif connection.vendor == 'postgresql':
+                self.stdout.write('Transaction is not partitioned; run with --setup to partition it.')
+        except partitions.PartitioningError as e:
+            raise CommandError(str(e))
+
+        if options['keep_months'] is None:
+            return
+        if options['keep_months'] < 1:
+            raise CommandError('--keep-months must be at least 1.')
+        before = partitions.month_start(timezone.localdate(), -options['keep_months'])
+        if partitions.is_partitioned():
+            moved = partitions.archive_partitions(before)
+            for name in moved:
+                self.stdout.write(f'Archived partition {name}.')
+            self.stdout.write(self.style.SUCCESS(f'Archived {len(moved)} partitions from before {before:%Y-%m-%d}.'))
+        else:
+            moved = partitions.archive_rows(before, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Archived {moved} transactions from before {before:%Y-%m-%d}.'))
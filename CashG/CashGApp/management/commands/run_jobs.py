@@ -0,0 +1,52 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from CashGApp import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued post-commit jobs (audit log entries, e-mail receipts) until interrupted. Start one or more '
+        'alongside the web process; they coordinate through the database. --once drains the due jobs and exits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=1, help='Worker threads in this process.')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Jobs claimed per query (default CASHG_JOB_BATCH_SIZE).')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Seconds to wait when no job is due (default CASHG_JOB_POLL_INTERVAL).')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due.')
+        parser.add_argument('--purge', action='store_true',
+                            help='Delete jobs finished more than CASHG_JOB_RETENTION seconds ago and exit.')
+
+    def handle(self, *args, **options):
+        if options['purge']:
+            removed = jobs.purge(settings.CASHG_JOB_RETENTION)
+            self.stdout.write(self.style.SUCCESS(f'Removed {removed} finished jobs.'))
+            return
+        if options['threads'] < 1:
+            raise CommandError('--threads must be at least 1.')
+
+        stop = threading.Event()
+        counts = []
+
+        def worker():
+            counts.append(jobs.work(options['batch_size'], options['poll_interval'], stop, options['once']))
+
+        threads = [threading.Thread(target=worker, name=f'run-jobs-{i}') for i in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                # join() with a timeout so Ctrl-C reaches this thread
+                while thread.is_alive():
+                    thread.join(1)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping after the jobs in hand...')
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write(self.style.SUCCESS(f'Ran {sum(counts)} jobs.'))
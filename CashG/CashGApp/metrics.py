@@ -0,0 +1,101 @@
+"""
+In-process metrics registry.
+
+Counters and histograms are plain Python objects guarded by a lock; they
+are per process and reset on restart, so with several gunicorn workers
+each scrape of /metrics/ sees the worker that served it.
+"""
+import threading
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        with self._lock:
+            return list(self._values.items())
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(tuple(sorted(labels.items())), ((), 0.0))
+        return sum(counts)
+
+    def samples(self):
+        with self._lock:
+            return [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+
+
+REGISTRY = {}
+
+
+def counter(name, documentation):
+    """Return the registered Counter called ``name``, creating it on first use"""
+    return REGISTRY.setdefault(name, Counter(name, documentation))
+
+
+def histogram(name, documentation, buckets=DEFAULT_BUCKETS):
+    """Return the registered Histogram called ``name``, creating it on first use"""
+    return REGISTRY.setdefault(name, Histogram(name, documentation, buckets))
+
+
+def _format_labels(key, extra=()):
+    pairs = [*key, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus():
+    """Render every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        if isinstance(metric, Counter):
+            lines.append(f'# TYPE {name} counter')
+            for key, value in metric.samples():
+                lines.append(f'{name}{_format_labels(key)} {value}')
+            continue
+        lines.append(f'# TYPE {name} histogram')
+        for key, counts, total in metric.samples():
+            cumulative = 0
+            for bound, count in zip((*metric.buckets, '+Inf'), counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(key, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(key)} {total}')
+            lines.append(f'{name}_count{_format_labels(key)} {cumulative}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,186 @@
+import logging
+import time
+from collections import Counter as SQLCounter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import FileResponse
+
+from . import metrics
+from .backends import loaded_user
+
+logger = logging.getLogger('CashGApp.performance')
+
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+requests_total = metrics.counter('cashg_http_requests_total', 'HTTP requests by view, method and status.')
+request_seconds = metrics.histogram('cashg_http_request_seconds', 'Total request latency by view.')
+db_seconds = metrics.histogram('cashg_db_query_seconds_per_request', 'Time spent in SQL per request, by view.')
+db_queries = metrics.histogram('cashg_db_queries_per_request', 'SQL queries executed per request, by view.',
+                               buckets=QUERY_COUNT_BUCKETS)
+n_plus_one_total = metrics.counter(
+    'cashg_n_plus_one_total', 'Requests that ran the same SQL statement at least CASHG_N_PLUS_ONE_THRESHOLD times.')
+
+
+class _QueryRecorder:
+    """Counts and times every query issued during a request"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = SQLCounter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            # Parameters are bound separately, so identical text means an identical query shape
+            self.statements[sql] += 1
+
+
+# The recorder follows the request's context into sync_to_async threads,
+# which a per-request execute_wrapper on one thread's connection would not
+_current_recorder = ContextVar('cashg_query_recorder', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    recorder = _current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def _install_query_recorder(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _recording(content, recorder, done):
+    """Iterate streamed ``content`` with ``recorder`` active, then call ``done()``"""
+    iterator = iter(content)
+    try:
+        while True:
+            token = _current_recorder.set(recorder)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current_recorder.reset(token)
+            yield chunk
+    finally:
+        done()
+
+
+async def _arecording(content, recorder, done):
+    """Async version of _recording()"""
+    iterator = aiter(content)
+    try:
+        while True:
+            token = _current_recorder.set(recorder)
+            try:
+                chunk = await anext(iterator)
+            except StopAsyncIteration:
+                return
+            finally:
+                _current_recorder.reset(token)
+            yield chunk
+    finally:
+        done()
+
+
+def _may_see_timing(request):
+    # Only a user the request already loaded: loading one here would add queries to every response
+    user = loaded_user(request)
+    return settings.DEBUG or bool(user and user.is_staff)
+
+
+class QueryMetricsMiddleware:
+    """
+    Record per-view query counts, DB time and total latency.
+
+    Results go into the metrics registry (scraped from /metrics/). With
+    DEBUG on, or for staff users on pages that loaded the user, they also go
+    into a Server-Timing header; other clients don't learn how long our
+    queries take. A request that runs
+    the same statement CASHG_N_PLUS_ONE_THRESHOLD or more times is counted
+    and logged as a likely N+1. Works under both WSGI and ASGI.
+
+    Streamed responses are measured until their last chunk is sent, but
+    their header has to go out first, so it only covers the work done
+    before streaming began and says so.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = _QueryRecorder()
+        token = _current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_recorder.reset(token)
+        if _may_see_timing(request):
+            self.add_timing(response, recorder, started)
+        return self.finish(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        recorder = _QueryRecorder()
+        token = _current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_recorder.reset(token)
+        if _may_see_timing(request):
+            self.add_timing(response, recorder, started)
+        return self.finish(request, response, recorder, started)
+
+    def add_timing(self, response, recorder, started):
+        scope = ' before streaming' if response.streaming else ''
+        response['Server-Timing'] = (
+            f'db;dur={recorder.seconds * 1000:.1f};desc="{recorder.count} queries{scope}", '
+            f'total;dur={(time.perf_counter() - started) * 1000:.1f}'
+        )
+
+    def finish(self, request, response, recorder, started):
+        def done():
+            self.record(request, response, recorder, time.perf_counter() - started)
+
+        # Files are left alone: wrapping them would lose the server's sendfile path
+        if not response.streaming or isinstance(response, FileResponse):
+            done()
+        elif response.is_async:
+            response.streaming_content = _arecording(response.streaming_content, recorder, done)
+        else:
+            response.streaming_content = _recording(response.streaming_content, recorder, done)
+        return response
+
+    def record(self, request, response, recorder, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        requests_total.inc(view=view, method=request.method, status=response.status_code)
+        request_seconds.observe(elapsed, view=view)
+        db_seconds.observe(recorder.seconds, view=view)
+        db_queries.observe(recorder.count, view=view)
+
+        if recorder.statements:
+            sql, repeats = recorder.statements.most_common(1)[0]
+            if repeats >= settings.CASHG_N_PLUS_ONE_THRESHOLD:
+                n_plus_one_total.inc(view=view)
+                logger.warning('Possible N+1 in %s: %d executions of %s', view, repeats, sql[:200])
@@ -2,8 +2,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
-import random
-import string
+from . import idgen
 
 # Create your models here.
 
@@ -41,16 +40,14 @@ class Account(models.Model):
         return f'{self.user.username} - {self.account_number}'
     
     def save(self, *args, **kwargs):
-        if not self.account_number:
-            self.account_number = self.generate_account_number()
-        super().save(*args, **kwargs)
+        if self.account_number:
+            return super().save(*args, **kwargs)
+        idgen.save_with_generated_id(self, 'account_number', self.generate_account_number,
+                                     super().save, *args, **kwargs)
     
     def generate_account_number(self):
-        """Generate a unique 10-digit account number"""
-        while True:
-            account_number = ''.join(random.choices(string.digits, k=10))
-            if not Account.objects.filter(account_number=account_number).exists():
-                return account_number
+        """Generate an account number; uniqueness is enforced on insert"""
+        return idgen.get_generator().account_number()
     
     def can_withdraw(self, amount):
         """Check if account has sufficient balance for withdrawal"""
@@ -75,20 +72,49 @@ class Transaction(models.Model):
     description = models.TextField(blank=True)
     reference_number = models.CharField(max_length=50, unique=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Serves history/dashboard keyset pagination: account filter + (timestamp, id) order
+            models.Index(fields=['account', '-timestamp', '-id'], name='txn_account_ts_id_idx'),
+            # Type-filtered history pages, in the same keyset order
+            models.Index(fields=['account', 'transaction_type', '-timestamp', '-id'], name='txn_account_type_ts_id_idx'),
+        ]
+
     def __str__(self):
         return f'{self.transaction_type} of ₱{self.amount} on {self.timestamp}'
     
     def save(self, *args, **kwargs):
-        if not self.reference_number:
-            self.reference_number = self.generate_reference_number()
-        super().save(*args, **kwargs)
+        if self.reference_number:
+            return super().save(*args, **kwargs)
+        idgen.save_with_generated_id(self, 'reference_number', self.generate_reference_number,
+                                     super().save, *args, **kwargs)
     
     def generate_reference_number(self):
-        """Generate a unique reference number"""
-        while True:
-            ref_number = f"TXN{''.join(random.choices(string.ascii_uppercase + string.digits, k=8))}"
-            if not Transaction.objects.filter(reference_number=ref_number).exists():
-                return ref_number
+        """Generate a time-ordered reference number; uniqueness is enforced on insert"""
+        return idgen.get_generator().reference_number()
+
+class ArchivedTransaction(models.Model):
+    """
+    A Transaction moved out of the live table by ``manage.py rollover_transactions``.
+
+    On PostgreSQL whole monthly partitions of the Transaction table are
+    attached here, so the columns must stay identical to Transaction's.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='archived_transactions')
+    transaction_type = models.CharField(max_length=255, choices=Transaction.TRANSACTION_TYPE)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    timestamp = models.DateTimeField()
+    description = models.TextField(blank=True)
+    reference_number = models.CharField(max_length=50, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['account', '-timestamp', '-id'], name='archived_txn_account_ts_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.transaction_type} of ₱{self.amount} on {self.timestamp} (archived)'
 
 class Transfer(models.Model):
     sender_account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='sent_transfers')
@@ -103,18 +129,146 @@ class Transfer(models.Model):
         return f'Transfer {self.transfer_id}: ₱{self.amount} from {self.sender_account.user.username} to {self.recipient_account.user.username}'
     
     def save(self, *args, **kwargs):
-        if not self.transfer_id:
-            self.transfer_id = self.generate_transfer_id()
-        super().save(*args, **kwargs)
+        if self.transfer_id:
+            return super().save(*args, **kwargs)
+        idgen.save_with_generated_id(self, 'transfer_id', self.generate_transfer_id,
+                                     super().save, *args, **kwargs)
     
     def generate_transfer_id(self):
-        """Generate a unique transfer ID"""
-        while True:
-            transfer_id = f"TRF{''.join(random.choices(string.ascii_uppercase + string.digits, k=10))}"
-            if not Transfer.objects.filter(transfer_id=transfer_id).exists():
-                return transfer_id
-    
+        """Generate a time-ordered transfer ID; uniqueness is enforced on insert"""
+        return idgen.get_generator().transfer_id()
+
+
+class AccountSummary(models.Model):
+    """Running per-account totals, maintained alongside every ledger write"""
+    account = models.OneToOneField(Account, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    total_deposits = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_withdrawals = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_transfers = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_received = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transaction_count = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f'Summary for {self.account_id}'
+
+
+class DailyAccountSummary(models.Model):
+    """Per-account totals for a single day"""
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='daily_summaries')
+    date = models.DateField()
+    total_deposits = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_withdrawals = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_transfers = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_received = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transaction_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'date'], name='daily_summary_account_date_uniq'),
+        ]
+
+    def __str__(self):
+        return f'Summary for {self.account_id} on {self.date}'
 
 
+class IdempotencyKey(models.Model):
+    """The outcome of a money movement, keyed by the client-supplied idempotency key"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    operation = models.CharField(max_length=20)
+    fingerprint = models.CharField(max_length=64)
+    reference = models.CharField(max_length=50)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.operation} {self.key} -> {self.reference}'
+
 
-    
\ No newline at end of file
+class LedgerEntry(models.Model):
+    """
+    One leg of a double-entry posting. Entries are only ever inserted.
+
+    The legs of a journal sum to zero: money entering or leaving the bank
+    (deposits, withdrawals) is balanced by a leg with no account, the
+    external cash side. Account legs carry the account's balance right
+    after the posting.
+    """
+    journal = models.CharField(max_length=50, db_index=True)
+    account = models.ForeignKey(Account, on_delete=models.PROTECT, null=True, blank=True, related_name='ledger_entries')
+    reference = models.CharField(max_length=50, blank=True)
+    # Signed: credits positive, debits negative
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    posted_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Serves reconciliation / replay from a checkpoint: account filter + id order
+            models.Index(fields=['account', 'id'], name='ledger_account_id_idx'),
+            # Serves balance_as_of(): account filter + posted_at cut-off
+            models.Index(fields=['account', 'posted_at'], name='ledger_account_posted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.journal}: {self.amount} on {self.account_id or "cash"}'
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError('Ledger entries are append-only.')
+        return super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('Ledger entries are append-only.')
+
+
+class BalanceCheckpoint(models.Model):
+    """An account's balance after every ledger entry up to and including ``last_entry_id``"""
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='balance_checkpoints')
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    # 0 for the opening checkpoint of an account with no entries yet
+    last_entry_id = models.BigIntegerField(default=0)
+    as_of = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['account', 'as_of'], name='checkpoint_account_as_of_idx'),
+            models.Index(fields=['account', 'last_entry_id'], name='checkpoint_account_entry_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.account_id}: ₱{self.balance} as of {self.as_of}'
+
+
+class Job(models.Model):
+    """A unit of post-commit work for ``manage.py run_jobs`` (see jobs.py)"""
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    # When the job is next due; a claimed job's lease, so an unfinished claim is picked up again
+    run_at = models.DateTimeField()
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
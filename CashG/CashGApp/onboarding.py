@@ -0,0 +1,215 @@
+"""
+Bulk onboarding of existing customers (``manage.py import_accounts``).
+
+Records are streamed and imported in chunks. The import works like this:
+  * usernames are checked against a set of every existing username, loaded
+    once, so validation costs no per-row query;
+  * passwords are hashed in a pool of worker processes, since PBKDF2 is
+    CPU-bound and a thread pool would serialize on the GIL;
+  * account numbers are drawn a chunk at a time, with one query to drop any
+    that are already taken;
+  * each chunk's User, Profile and Account rows are written with
+    bulk_create in one transaction, then opened in the ledger.
+
+Rows whose username already exists are skipped before any hashing, so
+rerunning an interrupted import resumes after the last committed chunk.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import DatabaseError, transaction
+
+from . import idgen, ledger
+from .db import serialized_writes
+from .models import Account, Profile
+
+# Profile account type -> Account type, as views.signup maps them
+ACCOUNT_TYPES = {'Client': 'SAVINGS', 'Admin': 'CHECKING'}
+MAX_BALANCE = Decimal('9999999999.99')
+# Passwords sent to a pool worker per task; a PBKDF2 hash takes a few hundred ms
+HASHES_PER_TASK = 8
+
+
+@dataclass
+class ImportRecord:
+    line_number: int
+    username: str
+    password: str = ''
+    password_hash: str = ''
+    first_name: str = ''
+    last_name: str = ''
+    email: str = ''
+    account_type: str = ''
+    phone_number: str = ''
+    address: str = ''
+    balance: str = ''
+    parse_error: str = ''
+
+
+@dataclass
+class ImportResult:
+    line_number: int
+    status: str  # IMPORTED, SKIPPED or FAILED
+    username: str = ''
+    account_number: str = ''
+    error: str = ''
+
+
+class RecordError(Exception):
+    """A record that cannot be imported"""
+
+
+def existing_usernames():
+    return set(User.objects.values_list('username', flat=True).iterator(chunk_size=10000))
+
+
+def validate(record):
+    """Return the cleaned fields of ``record`` or raise RecordError; the password is not hashed yet"""
+    if record.parse_error:
+        raise RecordError(record.parse_error)
+    if not record.username or len(record.username) > User._meta.get_field('username').max_length:
+        raise RecordError('Username must be 1 to 150 characters.')
+    try:
+        User.username_validator(record.username)
+    except ValidationError as e:
+        raise RecordError(e.messages[0])
+    if record.password_hash:
+        try:
+            identify_hasher(record.password_hash)
+        except ValueError:
+            raise RecordError('Unknown password hash format.')
+    elif record.password and len(record.password) < 8:
+        raise RecordError('Password must be at least 8 characters long.')
+    if record.email:
+        try:
+            validate_email(record.email)
+        except ValidationError:
+            raise RecordError('Invalid email address.')
+    account_type = record.account_type or 'Client'
+    if account_type not in ACCOUNT_TYPES:
+        raise RecordError('account_type must be Client or Admin.')
+    if len(record.phone_number) > Profile._meta.get_field('phone_number').max_length:
+        raise RecordError('Phone number is too long.')
+    try:
+        balance = Decimal(record.balance or '0').quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise RecordError('Balance must be a number.')
+    if not Decimal('0') <= balance <= MAX_BALANCE:
+        raise RecordError('Balance must be between 0 and 9,999,999,999.99.')
+    return {'account_type': account_type, 'balance': balance}
+
+
+def allocate_account_numbers(count):
+    """Return ``count`` distinct account numbers not in use, checking each block with one query"""
+    generator = idgen.get_generator()
+    numbers = set()
+    while len(numbers) < count:
+        block = {generator.account_number() for _ in range(count - len(numbers))} - numbers
+        taken = set(Account.objects.filter(account_number__in=block).values_list('account_number', flat=True))
+        numbers |= block - taken
+    return list(numbers)
+
+
+def password_pool(workers):
+    """A process pool for hashing passwords, or a null context when ``workers`` is 1"""
+    if workers == 1:
+        return nullcontext()
+    # Spawned, not forked: children must not inherit this process's database connections
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=django.setup)
+
+
+def hash_passwords(pool, passwords):
+    """Hash ``passwords`` (None for an unusable password) in ``pool``, preserving order"""
+    if pool is None:
+        return [make_password(password) for password in passwords]
+    return list(pool.map(make_password, passwords, chunksize=HASHES_PER_TASK))
+
+
+def import_records(records, chunk_size=1000, pool=None, existing=None):
+    """Import an iterable of ImportRecord and yield one ImportResult per record, in order"""
+    if existing is None:
+        existing = existing_usernames()
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield from import_chunk(chunk, existing, pool)
+            chunk = []
+    if chunk:
+        yield from import_chunk(chunk, existing, pool)
+
+
+def import_chunk(records, existing, pool=None):
+    """Validate, hash and write one chunk of records in a single transaction"""
+    results = {}
+    accepted = []
+    for record in records:
+        if record.username in existing:
+            results[record.line_number] = ImportResult(record.line_number, 'SKIPPED', record.username,
+                                                       error='Username already exists.')
+            continue
+        try:
+            cleaned = validate(record)
+        except RecordError as e:
+            results[record.line_number] = ImportResult(record.line_number, 'FAILED', record.username, error=str(e))
+            continue
+        # Claimed now, so a later duplicate in the same file is skipped too
+        existing.add(record.username)
+        accepted.append((record, cleaned))
+
+    if accepted:
+        # Records without a password get an unusable one and must reset it
+        hashed = iter(hash_passwords(pool, [record.password or None for record, _ in accepted
+                                            if not record.password_hash]))
+        hashes = [record.password_hash or next(hashed) for record, _ in accepted]
+        try:
+            with serialized_writes('import_accounts'), transaction.atomic():
+                numbers = _write(accepted, hashes)
+        except DatabaseError as e:
+            for record, _ in accepted:
+                existing.discard(record.username)
+                results[record.line_number] = ImportResult(record.line_number, 'FAILED', record.username,
+                                                           error=f'Chunk rolled back: {e}')
+        else:
+            for (record, _), number in zip(accepted, numbers):
+                results[record.line_number] = ImportResult(record.line_number, 'IMPORTED', record.username, number)
+    return [results[record.line_number] for record in records]
+
+
+def _write(accepted, hashes):
+    users = User.objects.bulk_create([
+        User(username=record.username, password=password, first_name=record.first_name[:150],
+             last_name=record.last_name[:150], email=record.email)
+        for (record, _), password in zip(accepted, hashes)
+    ])
+    if any(user.pk is None for user in users):
+        # Backends that can't return ids from a bulk INSERT (MySQL)
+        ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'pk'))
+        for user in users:
+            user.pk = ids[user.username]
+
+    Profile.objects.bulk_create([
+        Profile(user=user, account_type=cleaned['account_type'], phone_number=record.phone_number or None,
+                address=record.address or None)
+        for user, (record, cleaned) in zip(users, accepted)
+    ])
+    numbers = allocate_account_numbers(len(users))
+    Account.objects.bulk_create([
+        Account(user=user, account_number=number, account_type=ACCOUNT_TYPES[cleaned['account_type']],
+                balance=cleaned['balance'])
+        for user, (_, cleaned), number in zip(users, accepted, numbers)
+    ])
+    # bulk_create sends no post_save, so open the accounts in the ledger here
+    if settings.CASHG_LEDGER_ENABLED:
+        ledger.open_accounts(Account.objects.filter(user__in=users).values_list('pk', flat=True))
+    return numbers
@@ -0,0 +1,156 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination token cannot be decoded"""
+
+
+def encode_cursor(direction, timestamp, pk):
+    """Encode a (timestamp, id) keyset position as an opaque URL-safe token"""
+    raw = f'{direction}|{timestamp.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a token produced by encode_cursor into (direction, timestamp, id)"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, timestamp, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, TypeError, UnicodeDecodeError) as e:
+        raise InvalidCursor(token) from e
+
+
+class KeysetPage:
+    """One page of a newest-first keyset walk over a queryset"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+
+def _after(timestamp, pk):
+    """Rows older than the given position in (-timestamp, -id) order"""
+    # The plain bound is redundant, but unlike the OR lets PostgreSQL skip
+    # the monthly partitions newer than the position (see partitions.py)
+    return Q(timestamp__lte=timestamp) & (Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, pk__lt=pk))
+
+
+def _before(timestamp, pk):
+    """Rows newer than the given position in (-timestamp, -id) order"""
+    return Q(timestamp__gte=timestamp) & (Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, pk__gt=pk))
+
+
+def _page_query(queryset, cursor, page_size):
+    """Return (query, direction, position) for the page ``cursor`` points at"""
+    direction, position = 'next', None
+    if cursor:
+        direction, timestamp, pk = decode_cursor(cursor)
+        position = (timestamp, pk)
+    if direction == 'prev':
+        return queryset.filter(_before(*position)).order_by('timestamp', 'pk')[:page_size + 1], direction, position
+    if position is not None:
+        queryset = queryset.filter(_after(*position))
+    return queryset.order_by('-timestamp', '-pk')[:page_size + 1], direction, position
+
+
+def _build_page(rows, direction, position, page_size):
+    has_more = len(rows) > page_size
+    if direction == 'prev':
+        items = rows[:page_size][::-1]
+        has_newer, has_older = has_more, True
+    else:
+        items = rows[:page_size]
+        has_newer, has_older = position is not None, has_more
+
+    if not items:
+        return KeysetPage(items)
+
+    first, last = items[0], items[-1]
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor('next', last.timestamp, last.pk) if has_older else None,
+        prev_cursor=encode_cursor('prev', first.timestamp, first.pk) if has_newer else None,
+    )
+
+
+def paginate(queryset, cursor=None, page_size=50):
+    """
+    Return a KeysetPage of ``queryset`` ordered newest first.
+
+    Each page is a single indexed range scan of at most ``page_size + 1`` rows,
+    so the cost does not grow with how deep into the history the user is.
+    """
+    query, direction, position = _page_query(queryset, cursor, page_size)
+    return _build_page(list(query), direction, position, page_size)
+
+
+async def apaginate(queryset, cursor=None, page_size=50):
+    """Async version of paginate()"""
+    query, direction, position = _page_query(queryset, cursor, page_size)
+    return _build_page([row async for row in query], direction, position, page_size)
+
+
+def _chunk_query(queryset, position, chunk_size):
+    chunk_qs = queryset if position is None else queryset.filter(_after(*position))
+    return chunk_qs.order_by('-timestamp', '-pk')[:chunk_size]
+
+
+def iter_chunks(queryset, chunk_size=500):
+    """
+    Yield lists of rows from ``queryset`` newest first, ``chunk_size`` at a time.
+
+    Walks the (timestamp, id) index with keyset queries instead of holding a
+    cursor open, so memory stays bounded on every database backend.
+    """
+    position = None
+    while True:
+        chunk = list(_chunk_query(queryset, position, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        position = (chunk[-1].timestamp, chunk[-1].pk)
+
+
+async def aiter_chunks(queryset, chunk_size=500):
+    """Async version of iter_chunks()"""
+    position = None
+    while True:
+        chunk = [row async for row in _chunk_query(queryset, position, chunk_size)]
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        position = (chunk[-1].timestamp, chunk[-1].pk)
+
+
+def iter_rows(queryset, chunk_size=500):
+    """Yield rows from ``queryset`` one by one, newest first, via iter_chunks"""
+    for chunk in iter_chunks(queryset, chunk_size):
+        yield from chunk
@@ -0,0 +1,260 @@
+"""
+Monthly partitioning of Transaction and archival of cold history.
+
+On PostgreSQL ``setup()`` turns the Transaction table into one partitioned
+by RANGE (timestamp). The existing rows become a single partition holding
+everything before next month, each later month gets its own partition
+(``ensure_partitions``, run ahead of time by ``manage.py
+rollover_transactions``) and a DEFAULT partition catches rows beyond the
+last month created. Queries that bound ``timestamp`` (statements, keyset
+pages) only touch the partitions that can match. ArchivedTransaction's
+table is partitioned the same way, so ``archive_partitions()`` moves a
+month by detaching it from one table and attaching it to the other
+without copying a row.
+
+Other backends keep a single Transaction table; ``archive_rows()`` moves
+old rows into ArchivedTransaction in primary-key chunks instead.
+
+Partitioned tables need the partition key in every unique constraint, so
+the partitioned table itself can only enforce (reference_number,
+timestamp). ``setup()`` therefore also creates a plain table keyed by
+reference_number that a trigger fills on every insert; a reused reference
+fails there with the usual IntegrityError, and archived months keep their
+references reserved.
+
+Archiving moves rows out of the history pages and the API, which only read
+the live table: ``archived_until()`` tells them where that history stops,
+and every account that lost rows has its updated_at bumped, since that is
+what versions the API's history ETags. Statements and rebuild_aggregates
+read both tables.
+"""
+import datetime
+import re
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .db import serialized_writes
+from .models import Account, ArchivedTransaction, Transaction
+
+TABLE = Transaction._meta.db_table
+ARCHIVE_TABLE = ArchivedTransaction._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+# Every reference number ever used, live or archived (PostgreSQL, after setup())
+REFERENCE_TABLE = f'{TABLE}_reference'
+# Monthly partitions are named <table>_pYYYYMM; the rows that predate
+# partitioning live in <table>_before_YYYYMM
+_PARTITION_NAME = re.compile(r'_(p|before_)(\d{4})(\d{2})$')
+
+
+class PartitioningError(Exception):
+    """Partitioning was requested where it isn't available or set up"""
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def _literal(moment):
+    # Only ever formats datetimes computed here, never user input
+    return f"'{moment.isoformat()}'"
+
+
+def month_start(day, months=0):
+    """Return the aware start of the month ``months`` after the one containing ``day``"""
+    index = day.year * 12 + day.month - 1 + months
+    return datetime.datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.get_current_timezone())
+
+
+def _newest_archived(account_id):
+    return (ArchivedTransaction.objects.filter(account_id=account_id)
+            .order_by('-timestamp', '-id').values_list('timestamp', flat=True))
+
+
+def archived_until(account_id):
+    """Return the timestamp of the account's newest archived transaction, or None if nothing is archived"""
+    return _newest_archived(account_id).first()
+
+
+async def aarchived_until(account_id):
+    """Async version of archived_until()"""
+    return await _newest_archived(account_id).afirst()
+
+
+def is_partitioned(table=TABLE):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [_quote(table)])
+        return cursor.fetchone() is not None
+
+
+def partitions(table=TABLE):
+    """
+    Return [(name, lower, upper)] for the month partitions of ``table``, oldest first.
+
+    ``lower`` is None for the partition holding the rows that predate partitioning.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s)', [_quote(table)])
+        names = [row[0] for row in cursor.fetchall()]
+    result = []
+    for name in names:
+        match = _PARTITION_NAME.search(name)
+        if match is None:
+            continue
+        kind, year, month = match.groups()
+        bound = month_start(datetime.date(int(year), int(month), 1))
+        if kind == 'p':
+            result.append((name, bound, month_start(bound, 1)))
+        else:
+            result.append((name, None, bound))
+    return sorted(result, key=lambda partition: partition[2])
+
+
+def _plain_indexes(cursor, table):
+    """Return [(name, 'USING ...' clause)] for the non-unique indexes of ``table``"""
+    cursor.execute(
+        'SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid '
+        'WHERE x.indrelid = to_regclass(%s) AND NOT x.indisunique', [_quote(table)])
+    return [(name, definition.split(' USING ', 1)[1]) for name, definition in cursor.fetchall()]
+
+
+def _add_keys(cursor, table, indexes):
+    """Give the partitioned ``table`` its primary key, foreign key and ``indexes``"""
+    # Named explicitly: the default <table>_pkey is still taken by the pre-partitioning table
+    cursor.execute(f'ALTER TABLE {_quote(table)} ADD CONSTRAINT {_quote(table + "_id_ts_pk")} '
+                   f'PRIMARY KEY (id, "timestamp")')
+    cursor.execute(
+        f'ALTER TABLE {_quote(table)} ADD CONSTRAINT {_quote(table + "_account_id_fk")} '
+        f'FOREIGN KEY (account_id) REFERENCES {_quote(Account._meta.db_table)} (id) DEFERRABLE INITIALLY DEFERRED')
+    for name, using in indexes:
+        cursor.execute(f'CREATE INDEX {_quote(name)} ON {_quote(table)} USING {using}')
+
+
+def setup(months_ahead):
+    """Convert Transaction and ArchivedTransaction to monthly partitioned tables; False if already done"""
+    if connection.vendor != 'postgresql':
+        raise PartitioningError('Partitioning needs PostgreSQL; other databases archive rows instead.')
+    if is_partitioned():
+        return False
+    if ArchivedTransaction.objects.exists():
+        raise PartitioningError('ArchivedTransaction already holds rows; partition before archiving.')
+
+    first_month = month_start(timezone.localdate(), 1)
+    legacy = f'{TABLE}_before_{first_month:%Y%m}'
+    sequence = f'{TABLE}_id_seq'
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {_quote(TABLE)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {_quote(TABLE)}')
+        max_id = cursor.fetchone()[0]
+
+        # The existing table becomes the first partition; free its index
+        # names for the partitioned parent, whose indexes it will then join
+        indexes = _plain_indexes(cursor, TABLE)
+        cursor.execute(f'ALTER TABLE {_quote(TABLE)} RENAME TO {_quote(legacy)}')
+        for name, _ in indexes:
+            cursor.execute(f'ALTER INDEX {_quote(name)} RENAME TO {_quote(name[:56] + "_before")}')
+        cursor.execute(f'ALTER TABLE {_quote(legacy)} ALTER COLUMN id DROP IDENTITY IF EXISTS')
+
+        cursor.execute(f'CREATE TABLE {_quote(TABLE)} (LIKE {_quote(legacy)}) PARTITION BY RANGE ("timestamp")')
+        cursor.execute(f'CREATE SEQUENCE {_quote(sequence)} OWNED BY {_quote(TABLE)}.id')
+        cursor.execute('SELECT setval(%s, %s, false)', [_quote(sequence), max_id + 1])
+        cursor.execute(f"ALTER TABLE {_quote(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{_quote(sequence)}')")
+        _add_keys(cursor, TABLE, indexes)
+        cursor.execute(
+            f'ALTER TABLE {_quote(TABLE)} ADD CONSTRAINT {_quote(TABLE + "_reference_ts_uniq")} '
+            f'UNIQUE (reference_number, "timestamp")')
+        _reserve_references(cursor, legacy)
+        cursor.execute(f'ALTER TABLE {_quote(TABLE)} ATTACH PARTITION {_quote(legacy)} '
+                       f'FOR VALUES FROM (MINVALUE) TO ({_literal(first_month)})')
+        cursor.execute(f'CREATE TABLE {_quote(DEFAULT_PARTITION)} PARTITION OF {_quote(TABLE)} DEFAULT')
+
+        # The archive is empty, so it is simply recreated partitioned
+        archive_indexes = _plain_indexes(cursor, ARCHIVE_TABLE)
+        cursor.execute(f'ALTER TABLE {_quote(ARCHIVE_TABLE)} RENAME TO {_quote(ARCHIVE_TABLE + "_old")}')
+        cursor.execute(f'CREATE TABLE {_quote(ARCHIVE_TABLE)} (LIKE {_quote(ARCHIVE_TABLE + "_old")}) '
+                       f'PARTITION BY RANGE ("timestamp")')
+        cursor.execute(f'DROP TABLE {_quote(ARCHIVE_TABLE + "_old")}')
+        _add_keys(cursor, ARCHIVE_TABLE, archive_indexes)
+
+    ensure_partitions(months_ahead)
+    return True
+
+
+def _reserve_references(cursor, legacy):
+    """Keep reference numbers globally unique across every partition and the archive"""
+    cursor.execute(f'CREATE TABLE {_quote(REFERENCE_TABLE)} (reference_number varchar(50) PRIMARY KEY)')
+    cursor.execute(f'INSERT INTO {_quote(REFERENCE_TABLE)} SELECT reference_number FROM {_quote(legacy)}')
+    function = _quote(f'{TABLE}_reserve_reference')
+    cursor.execute(
+        f'CREATE FUNCTION {function}() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN '
+        f"IF TG_OP = 'INSERT' OR NEW.reference_number <> OLD.reference_number THEN "
+        f'INSERT INTO {_quote(REFERENCE_TABLE)} (reference_number) VALUES (NEW.reference_number); '
+        f'END IF; RETURN NULL; END $$')
+    # Defined on the parent, so PostgreSQL clones it onto every partition attached later
+    cursor.execute(f'CREATE TRIGGER {_quote(TABLE + "_reserve_reference")} '
+                   f'AFTER INSERT OR UPDATE OF reference_number ON {_quote(TABLE)} '
+                   f'FOR EACH ROW EXECUTE FUNCTION {function}()')
+
+
+def ensure_partitions(months_ahead):
+    """Create the month partitions up to ``months_ahead`` months from now; return their names"""
+    if not is_partitioned():
+        raise PartitioningError('Transaction is not partitioned; run rollover_transactions --setup.')
+    existing = partitions()
+    month = existing[-1][2]
+    last = month_start(timezone.localdate(), months_ahead)
+    created = []
+    while month <= last:
+        upper = month_start(month, 1)
+        name = f'{TABLE}_p{month:%Y%m}'
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Rows that landed in the DEFAULT partition move into the new month before it is attached
+            cursor.execute(f'CREATE TABLE {_quote(name)} (LIKE {_quote(TABLE)} INCLUDING DEFAULTS)')
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM {_quote(DEFAULT_PARTITION)} '
+                f'WHERE "timestamp" >= {_literal(month)} AND "timestamp" < {_literal(upper)} RETURNING *) '
+                f'INSERT INTO {_quote(name)} SELECT * FROM moved')
+            cursor.execute(f'ALTER TABLE {_quote(TABLE)} ATTACH PARTITION {_quote(name)} '
+                           f'FOR VALUES FROM ({_literal(month)}) TO ({_literal(upper)})')
+        created.append(name)
+        month = upper
+    return created
+
+
+def archive_partitions(before):
+    """Move every Transaction partition that ends on or before ``before`` into the archive; return their names"""
+    if not is_partitioned():
+        raise PartitioningError('Transaction is not partitioned; run rollover_transactions --setup.')
+    moved = []
+    for name, lower, upper in partitions():
+        if upper > before:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {_quote(TABLE)} DETACH PARTITION {_quote(name)}')
+            bound = 'MINVALUE' if lower is None else _literal(lower)
+            cursor.execute(f'ALTER TABLE {_quote(ARCHIVE_TABLE)} ATTACH PARTITION {_quote(name)} '
+                           f'FOR VALUES FROM ({bound}) TO ({_literal(upper)})')
+            cursor.execute(f'UPDATE {_quote(Account._meta.db_table)} SET updated_at = %s '
+                           f'WHERE id IN (SELECT DISTINCT account_id FROM {_quote(name)})', [timezone.now()])
+        moved.append(name)
+    return moved
+
+
+def archive_rows(before, batch_size=1000):
+    """Move transactions older than ``before`` into ArchivedTransaction, ``batch_size`` at a time; return the count"""
+    fields = [field.attname for field in ArchivedTransaction._meta.concrete_fields]
+    moved = 0
+    while True:
+        with serialized_writes('archive'), transaction.atomic():
+            batch = list(Transaction.objects.filter(timestamp__lt=before)
+                         .order_by('timestamp', 'pk').values(*fields)[:batch_size])
+            if not batch:
+                return moved
+            ArchivedTransaction.objects.bulk_create([ArchivedTransaction(**row) for row in batch])
+            Transaction.objects.filter(pk__in=[row['id'] for row in batch]).delete()
+            Account.objects.filter(pk__in={row['account_id'] for row in batch}).update(updated_at=timezone.now())
+        moved += len(batch)
@@ -0,0 +1,153 @@
+"""
+Token-bucket rate limits for login, signup and money movements.
+
+``RateLimitMiddleware`` looks up the resolved view in
+CASHG_RATE_LIMITED_VIEWS and, for POSTs, takes one token from each bucket
+of that scope's CASHG_RATE_LIMITS rules, keyed by client IP, by the
+submitted username from that IP or by the signed-in user: their id if
+something already loaded request.user, otherwise a hash of the session
+cookie, so neither the session nor the User is read just to be limited.
+Login attempts are never limited per username alone: anyone could then
+lock a customer out just by failing to log in as them. It runs in
+process_view, so a refused request never reaches authenticate(), password
+hashing or the ORM.
+
+Buckets live in the CASHG_RATE_LIMIT_CACHE cache: the in-process LocMem
+cache by default, the shared Redis cache when REDIS_URL is set so limits
+hold across workers. Updates are serialized within a process; across
+processes two requests racing for the last token can both get it, which
+is an acceptable overshoot for throttling. If the cache is unreachable,
+requests are let through.
+"""
+import hashlib
+import logging
+import math
+import re
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+from . import metrics
+from .backends import loaded_user
+
+logger = logging.getLogger(__name__)
+
+limited_total = metrics.counter('cashg_rate_limited_total', 'Requests refused by a rate limit, by scope and key.')
+
+_RATE = re.compile(r'^(\d+)/(\d*)([smhd])$')
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """Turn '5/m', '100/h' or '10/30s' into (capacity, period in seconds)"""
+    match = _RATE.match(rate)
+    if match is None:
+        raise ValueError(f'Invalid rate {rate!r}; expected e.g. 5/m, 100/h or 10/30s.')
+    count, multiple, unit = match.groups()
+    return int(count), int(multiple or 1) * _UNITS[unit]
+
+
+def take(key, capacity, period):
+    """Take a token from bucket ``key``; return 0 if one was available, else seconds until one is"""
+    cache = caches[settings.CASHG_RATE_LIMIT_CACHE]
+    with _lock:
+        now = time.time()
+        tokens, stamp = cache.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - stamp) * capacity / period)
+        if tokens < 1:
+            return (1 - tokens) * period / capacity
+        # An untouched bucket is full again after one period, so it can expire then
+        cache.set(key, (tokens - 1, now), timeout=period)
+        return 0
+
+
+def client_ip(request):
+    """The client address, skipping CASHG_TRUSTED_PROXY_COUNT reverse proxies in X-Forwarded-For"""
+    hops = settings.CASHG_TRUSTED_PROXY_COUNT
+    if hops:
+        forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _user_identity(request):
+    user = loaded_user(request)
+    if user is not None:
+        return f'id:{user.pk}' if user.is_authenticated else None
+    # Reading request.session or request.user here would cost a query per request, refused ones included
+    cookie = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    # Hashed: cache keys must stay short and must not expose session keys
+    return f'session:{hashlib.sha256(cookie.encode()).hexdigest()[:32]}' if cookie else None
+
+
+def _identity(request, kind):
+    if kind == 'ip':
+        return client_ip(request)
+    if kind == 'username_ip':
+        username = (request.POST.get('username') or '').strip().lower()
+        return f'{username}@{client_ip(request)}' if username else None
+    if kind == 'user':
+        return _user_identity(request)
+    raise ValueError(f'Unknown rate limit key {kind!r}.')
+
+
+def check(request, scope):
+    """Take a token for every rule of ``scope``; return the longest wait if any bucket is empty, else 0"""
+    wait = 0
+    for kind, rate in settings.CASHG_RATE_LIMITS[scope].items():
+        identity = _identity(request, kind)
+        if identity is None:
+            continue
+        capacity, period = parse_rate(rate)
+        try:
+            retry_after = take(f'cashg:ratelimit:{scope}:{kind}:{identity}', capacity, period)
+        except Exception:
+            logger.exception('Rate limit cache unavailable')
+            return 0
+        if retry_after:
+            limited_total.inc(scope=scope, key=kind)
+            wait = max(wait, retry_after)
+    return wait
+
+
+class RateLimitMiddleware:
+    """Answer 429 Too Many Requests to POSTs over the limits of their view's scope"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method != 'POST':
+            return None
+        scope = settings.CASHG_RATE_LIMITED_VIEWS.get(request.resolver_match.view_name)
+        if scope is None:
+            return None
+        wait = check(request, scope)
+        if not wait:
+            return None
+
+        message = 'Too many requests. Please wait a moment and try again.'
+        if request.resolver_match.namespace == 'api':
+            response = JsonResponse({'error': message}, status=429)
+        else:
+            response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = str(math.ceil(wait))
+        return response
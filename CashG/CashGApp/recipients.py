@@ -0,0 +1,107 @@
+"""
+Transfer recipient lookups.
+
+``lookup(account_number)`` resolves a recipient with one projected query
+(the account_number unique index joined to the holder's name) through a
+bounded per-process LRU of CASHG_RECIPIENT_CACHE_SIZE entries, so frequent
+payees cost no query at all. Saving or deleting an Account, or renaming its
+holder, drops the entry in this process; other processes see the change
+within CASHG_RECIPIENT_CACHE_TTL seconds. A stale entry can't move money
+wrongly: services.transfer locks the recipient by primary key and re-checks
+that it exists and is active before crediting it.
+"""
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import idgen, metrics
+from .account_cache import LRUCache
+from .models import Account
+
+hits_total = metrics.counter('cashg_recipient_cache_hits_total', 'Recipient lookups served from the cache.')
+misses_total = metrics.counter('cashg_recipient_cache_misses_total', 'Recipient lookups that queried the database.')
+
+
+@dataclass(frozen=True)
+class Recipient:
+    pk: int
+    account_number: str
+    is_active: bool
+    user_id: int
+    holder: str
+
+    def account(self):
+        """An Account carrying what services.transfer needs, without loading the row again"""
+        return Account(pk=self.pk, account_number=self.account_number, is_active=self.is_active, user_id=self.user_id)
+
+
+def holder_name(first_name, last_name, username):
+    """The partly masked name shown to someone sending money to this holder"""
+    if first_name:
+        return f'{first_name} {last_name[:1]}.' if last_name else first_name
+    return username[:2] + '*' * max(len(username) - 2, 1)
+
+
+_cache = LRUCache(settings.CASHG_RECIPIENT_CACHE_SIZE)
+
+
+def lookup(account_number):
+    """Return the Recipient for ``account_number``, or None if there is no such account"""
+    account_number = (account_number or '').strip()
+    if not account_number:
+        return None
+    if len(account_number) == settings.CASHG_ACCOUNT_NUMBER_LENGTH and not idgen.is_valid_account_number(account_number):
+        # A mistyped generated number fails its check digit; no need to look it up
+        return None
+    recipient = _cache.get(account_number, None)
+    if recipient is not None:
+        hits_total.inc()
+        return recipient
+    misses_total.inc()
+    row = (Account.objects.filter(account_number=account_number)
+           .values_list('pk', 'is_active', 'user_id', 'user__first_name', 'user__last_name', 'user__username')
+           .first())
+    if row is None:
+        return None
+    pk, is_active, user_id, first_name, last_name, username = row
+    recipient = Recipient(pk, account_number, is_active, user_id, holder_name(first_name, last_name, username))
+    _cache.set(account_number, recipient, settings.CASHG_RECIPIENT_CACHE_TTL)
+    return recipient
+
+
+class InvalidRecipient(ValueError):
+    """A transfer recipient that can't be credited, with the message to show the sender"""
+
+
+def resolve(sender, account_number):
+    """Return the Recipient of a transfer from ``sender``, raising InvalidRecipient if it can't receive it"""
+    recipient = lookup(account_number)
+    if recipient is None:
+        raise InvalidRecipient('Recipient account not found.')
+    if recipient.pk == sender.pk:
+        raise InvalidRecipient('Cannot transfer to your own account.')
+    if not recipient.is_active:
+        raise InvalidRecipient('Recipient account is inactive.')
+    return recipient
+
+
+def forget(*account_numbers):
+    for account_number in account_numbers:
+        _cache.delete(account_number)
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def _account_changed(sender, instance, **kwargs):
+    forget(instance.account_number)
+
+
+@receiver(post_save, sender=User)
+def _holder_renamed(sender, instance, created, update_fields=None, **kwargs):
+    # Logins save only last_login; a new user has no accounts yet
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    forget(*Account.objects.filter(user_id=instance.pk).values_list('account_number', flat=True))
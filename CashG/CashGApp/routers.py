@@ -0,0 +1,141 @@
+"""
+Primary / read-replica routing.
+
+Everything goes to the primary (``default``) unless a view opts in with
+``@replica_reads`` and a ``replica`` database is configured. Inside such a
+view reads go to the replica until the first write, after which the rest
+of the request stays on the primary. ``PinAfterWriteMiddleware`` also sets
+a short-lived cookie on any response whose request wrote, so the user's
+next few page loads read their own writes from the primary instead of a
+replica that may still be catching up.
+"""
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+REPLICA_DB_ALIAS = 'replica'
+PIN_COOKIE = 'cashg_primary'
+
+_read_alias = ContextVar('cashg_read_alias', default=None)
+_wrote = ContextVar('cashg_wrote', default=False)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _wrote.get():
+            return DEFAULT_DB_ALIAS
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication
+        return db != REPLICA_DB_ALIAS
+
+
+@contextmanager
+def use_primary():
+    """Send reads in the block to the primary, even inside a @replica_reads view"""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def replica_reads(view):
+    """Let ``view`` read from the replica unless the user wrote within the last CASHG_REPLICA_PIN_SECONDS"""
+    def use_replica(request):
+        return replica_configured() and request.method in ('GET', 'HEAD') and PIN_COOKIE not in request.COOKIES
+
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if not use_replica(request):
+                return await view(request, *args, **kwargs)
+            token = _read_alias.set(REPLICA_DB_ALIAS)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_alias.reset(token)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not use_replica(request):
+            return view(request, *args, **kwargs)
+        token = _read_alias.set(REPLICA_DB_ALIAS)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+    return wrapper
+
+
+def _detect_writes(execute, sql, params, many, context):
+    """execute_wrapper that notes the first INSERT, UPDATE or DELETE sent to the primary"""
+    if not _wrote.get() and sql.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+        _wrote.set(True)
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def _install_write_detector(sender, connection, **kwargs):
+    # Installed per connection rather than per request so writes made from
+    # sync_to_async threads under ASGI are seen too
+    if connection.alias == DEFAULT_DB_ALIAS and _detect_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_detect_writes)
+
+
+class PinAfterWriteMiddleware:
+    """Pin the client to the primary for CASHG_REPLICA_PIN_SECONDS after a request that wrote"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replica_configured():
+            return self.get_response(request)
+        token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            return self.pin(response, _wrote.get())
+        finally:
+            _wrote.reset(token)
+
+    async def __acall__(self, request):
+        if not replica_configured():
+            return await self.get_response(request)
+        token = _wrote.set(False)
+        try:
+            response = await self.get_response(request)
+            return self.pin(response, _wrote.get())
+        finally:
+            _wrote.reset(token)
+
+    def pin(self, response, wrote):
+        if wrote:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.CASHG_REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,208 @@
+"""
+Server-side filters for the transaction history and the description search index.
+
+``HistoryFilter`` reads the history page's query string (type, date range,
+amount range and a search text) and narrows the account's Transaction
+queryset in SQL, so a filtered page reads only matching rows. Type filters
+use the (account, transaction_type, timestamp, id) index in keyset order;
+date and amount ranges bound the (account, timestamp, id) walk.
+
+Search text matches a reference number exactly or the description:
+  * PostgreSQL: ``description ILIKE %text%`` served by a pg_trgm GIN index
+    on UPPER(description);
+  * SQLite: word-prefix match against an FTS5 table kept in step with
+    Transaction by triggers;
+  * elsewhere (or with CASHG_TRANSACTION_SEARCH_INDEX off): a plain
+    case-insensitive substring match.
+The index is created by ``ensure_index()`` after every ``migrate``, because
+migrations are generated at deploy time and can't carry raw DDL.
+"""
+import datetime
+import functools
+import logging
+import sqlite3
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Transaction
+
+logger = logging.getLogger(__name__)
+
+TABLE = Transaction._meta.db_table
+FTS_TABLE = f'{TABLE}_fts'
+TRIGRAM_INDEX = 'txn_description_trgm_idx'
+TYPES = dict(Transaction.TRANSACTION_TYPE)
+# The largest value Transaction.amount can hold; bigger bounds would overflow the column on PostgreSQL
+_amount = Transaction._meta.get_field('amount')
+MAX_AMOUNT = Decimal(10) ** (_amount.max_digits - _amount.decimal_places) - Decimal(10) ** -_amount.decimal_places
+
+
+@functools.cache
+def fts5_available():
+    """True if this process's SQLite library was built with FTS5"""
+    try:
+        sqlite3.connect(':memory:').execute('CREATE VIRTUAL TABLE probe USING fts5(x)')
+    except sqlite3.Error:
+        return False
+    return True
+
+
+def _uses_fts(connection):
+    return settings.CASHG_TRANSACTION_SEARCH_INDEX and connection.vendor == 'sqlite' and fts5_available()
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query matching every word as a prefix"""
+    return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in text.split())
+
+
+def text_search(queryset, text):
+    """Narrow ``queryset`` to transactions whose reference is ``text`` or whose description contains it"""
+    text = text.strip()
+    reference = Q(reference_number=text.upper())
+    if _uses_fts(connections[queryset.db]):
+        matches = RawSQL(f'SELECT rowid FROM "{FTS_TABLE}" WHERE "{FTS_TABLE}" MATCH %s', [fts_query(text)])
+        return queryset.filter(reference | Q(pk__in=matches))
+    return queryset.filter(reference | Q(description__icontains=text))
+
+
+class HistoryFilter:
+    """The history page's filters, parsed from a query string; invalid values are dropped and reported in ``errors``"""
+    PARAMS = ('type', 'start', 'end', 'min_amount', 'max_amount', 'q')
+
+    def __init__(self, params):
+        self.errors = []
+        self.values = {}
+        for name in self.PARAMS:
+            raw = (params.get(name) or '').strip()
+            if not raw:
+                continue
+            try:
+                self.values[name] = getattr(self, f'_parse_{name}')(raw)
+            except ValueError as e:
+                self.errors.append(str(e))
+        start, end = self.values.get('start'), self.values.get('end')
+        if start and end and end < start:
+            self.errors.append('The end date is before the start date.')
+            del self.values['end']
+
+    def __bool__(self):
+        return bool(self.values)
+
+    def __getitem__(self, name):
+        """The raw value of filter ``name`` for redisplay in the form, '' if unset"""
+        if name not in self.PARAMS:
+            # Lets templates fall through to attributes such as querystring
+            raise KeyError(name)
+        value = self.values.get(name)
+        if value is None:
+            return ''
+        return value.isoformat() if isinstance(value, datetime.date) else str(value)
+
+    @staticmethod
+    def _parse_type(raw):
+        if raw not in TYPES:
+            raise ValueError('Unknown transaction type.')
+        return raw
+
+    @staticmethod
+    def _parse_date(raw):
+        try:
+            day = datetime.date.fromisoformat(raw)
+        except ValueError:
+            raise ValueError('Dates must be given as YYYY-MM-DD.')
+        # The filter reaches to the day after the end, and time zones can shift the start a day back
+        if day in (datetime.date.min, datetime.date.max):
+            raise ValueError('Dates must fall between 0001-01-02 and 9999-12-30.')
+        return day
+
+    _parse_start = _parse_end = _parse_date
+
+    @staticmethod
+    def _parse_amount(raw):
+        try:
+            amount = Decimal(raw)
+        except InvalidOperation:
+            raise ValueError('Amounts must be numbers.')
+        if not amount.is_finite():
+            raise ValueError('Amounts must be numbers.')
+        if abs(amount) > MAX_AMOUNT:
+            raise ValueError(f'Amounts must be at most {MAX_AMOUNT:,}.')
+        return amount
+
+    _parse_min_amount = _parse_max_amount = _parse_amount
+
+    @staticmethod
+    def _parse_q(raw):
+        return raw[:100]
+
+    def apply(self, queryset):
+        """Return ``queryset`` narrowed to the transactions matching every filter"""
+        values = self.values
+        tz = timezone.get_current_timezone()
+        if 'type' in values:
+            queryset = queryset.filter(transaction_type=values['type'])
+        if 'start' in values:
+            queryset = queryset.filter(
+                timestamp__gte=datetime.datetime.combine(values['start'], datetime.time.min, tzinfo=tz))
+        if 'end' in values:
+            queryset = queryset.filter(timestamp__lt=datetime.datetime.combine(
+                values['end'] + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz))
+        if 'min_amount' in values:
+            queryset = queryset.filter(amount__gte=values['min_amount'])
+        if 'max_amount' in values:
+            queryset = queryset.filter(amount__lte=values['max_amount'])
+        if 'q' in values:
+            queryset = text_search(queryset, values['q'])
+        return queryset
+
+    def querystring(self):
+        """The active filters as a query string, for pagination links"""
+        return urlencode({name: self[name] for name in self.PARAMS if name in self.values})
+
+
+def ensure_index(using='default'):
+    """Create the description search index on database ``using`` if it is missing"""
+    connection = connections[using]
+    if not settings.CASHG_TRANSACTION_SEARCH_INDEX:
+        return
+    if connection.vendor == 'postgresql':
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON "{TABLE}" '
+                               f'USING gin (UPPER(description) gin_trgm_ops)')
+        except DatabaseError:
+            # Searches still work, by scanning the account's rows
+            logger.exception('Could not create the trigram index for transaction search')
+    elif _uses_fts(connection):
+        with connection.cursor() as cursor:
+            if FTS_TABLE in connection.introspection.table_names(cursor):
+                return
+            cursor.execute(f'CREATE VIRTUAL TABLE "{FTS_TABLE}" USING fts5('
+                           f'description, content="{TABLE}", content_rowid="id")')
+            cursor.execute(f'CREATE TRIGGER "{FTS_TABLE}_ai" AFTER INSERT ON "{TABLE}" BEGIN '
+                           f'INSERT INTO "{FTS_TABLE}"(rowid, description) VALUES (new.id, new.description); END')
+            cursor.execute(f'CREATE TRIGGER "{FTS_TABLE}_ad" AFTER DELETE ON "{TABLE}" BEGIN '
+                           f'INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, description) '
+                           f"VALUES ('delete', old.id, old.description); END")
+            cursor.execute(f'CREATE TRIGGER "{FTS_TABLE}_au" AFTER UPDATE OF description ON "{TABLE}" BEGIN '
+                           f'INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, description) '
+                           f"VALUES ('delete', old.id, old.description); "
+                           f'INSERT INTO "{FTS_TABLE}"(rowid, description) VALUES (new.id, new.description); END')
+            # Index the rows that predate the table
+            cursor.execute(f'INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}") VALUES (\'rebuild\')')
+
+
+@receiver(post_migrate)
+def _migrated(sender, using, **kwargs):
+    if sender.name == 'CashGApp':
+        ensure_index(using)
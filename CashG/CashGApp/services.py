@@ -0,0 +1,211 @@
+"""
+Money-movement service layer.
+
+Deposits and withdrawals change the balance with a single conditional
+UPDATE (``SET balance = balance - x WHERE balance >= x``) instead of
+SELECT ... FOR UPDATE, arithmetic in Python and a full-row save(); the row
+lock is taken by the UPDATE itself and held only for the rest of the short
+ledger-writing transaction. Transfers lock both accounts with one
+primary-key-ordered SELECT ... FOR UPDATE and move the money with one
+UPDATE. Deadlocks and serialization failures are retried with backoff
+(see ``db.retry_on_conflict``). On SQLite, where select_for_update() is a
+no-op, transactions begin IMMEDIATE and movements within a process queue
+on ``db.serialized_writes``.
+
+Amounts must be positive whole cents (see ``cents``); anything else raises
+InvalidAmount before a row is touched.
+
+With CASHG_LEDGER_ENABLED every movement also appends its double-entry
+postings to the ledger (see ``ledger.post``) in the same transaction.
+
+Each function accepts an optional unsaved IdempotencyKey (see
+``idempotency.pending``) that is stored in the same transaction as the
+ledger rows.
+
+The audit log entry and e-mail receipts are queued as jobs in the same
+transaction (see ``jobs`` and ``tasks``) and sent by a worker after commit.
+"""
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from . import account_cache, idempotency, ledger
+from .aggregates import record_transactions
+from .db import lock_wait_seconds, retry_on_conflict, serialized_writes
+from .models import Account, Transaction, Transfer
+from .tasks import enqueue_movements
+
+CENT = Decimal('0.01')
+
+
+class MovementError(Exception):
+    """Base class for money movements that cannot be completed"""
+
+
+class AccountNotFound(MovementError):
+    pass
+
+
+class InactiveAccount(MovementError):
+    pass
+
+
+class InsufficientFunds(MovementError):
+    pass
+
+
+class InvalidAmount(MovementError):
+    pass
+
+
+class SameAccount(MovementError):
+    pass
+
+
+def cents(amount):
+    """Return ``amount`` as a Decimal, or raise InvalidAmount unless it is finite with at most two decimal places"""
+    try:
+        amount = Decimal(amount)
+        # Balances are stored to the cent; a sub-cent amount would be rounded
+        # by the column but not by the UPDATE arithmetic, so the two drift
+        if amount.is_finite() and amount == amount.quantize(CENT):
+            return amount
+    except (InvalidOperation, TypeError, ValueError):
+        pass
+    raise InvalidAmount(amount)
+
+
+def _positive_cents(amount):
+    amount = cents(amount)
+    if amount <= 0:
+        raise InvalidAmount(amount)
+    return amount
+
+
+def _credit(account_id, amount):
+    updated = Account.objects.filter(pk=account_id).update(
+        balance=F('balance') + amount, updated_at=timezone.now())
+    if not updated:
+        raise AccountNotFound(account_id)
+
+
+def _debit(account_id, amount):
+    updated = Account.objects.filter(pk=account_id, is_active=True, balance__gte=amount).update(
+        balance=F('balance') - amount, updated_at=timezone.now())
+    if updated:
+        return
+    # Only the failure path pays for a read to explain why
+    state = Account.objects.filter(pk=account_id).values_list('is_active', flat=True).first()
+    if state is None:
+        raise AccountNotFound(account_id)
+    if not state:
+        raise InactiveAccount(account_id)
+    raise InsufficientFunds(account_id)
+
+
+@retry_on_conflict('deposit')
+def deposit(account, amount, description='', idempotency_key=None):
+    """Credit ``account`` and return the DEPOSIT Transaction"""
+    amount = _positive_cents(amount)
+    with serialized_writes('deposit'), transaction.atomic():
+        _credit(account.pk, amount)
+        txn = Transaction.objects.create(
+            account=account,
+            amount=amount,
+            transaction_type='DEPOSIT',
+            description=description if description.strip() else f'Deposit to {account.account_type} account'
+        )
+        record_transactions(txn)
+        ledger.post([(txn.reference_number, [(account.pk, amount, txn)])])
+        enqueue_movements([('deposit', txn.reference_number, [txn])])
+        idempotency.complete(idempotency_key, txn.reference_number, amount)
+        account_cache.invalidate_on_commit(account.user_id)
+    return txn
+
+
+@retry_on_conflict('withdraw')
+def withdraw(account, amount, description='', idempotency_key=None):
+    """Debit ``account`` if the balance covers ``amount`` and return the WITHDRAWAL Transaction"""
+    amount = _positive_cents(amount)
+    with serialized_writes('withdraw'), transaction.atomic():
+        _debit(account.pk, amount)
+        txn = Transaction.objects.create(
+            account=account,
+            amount=amount,
+            transaction_type='WITHDRAWAL',
+            description=description if description else f'Withdrawal from {account.account_type} account'
+        )
+        record_transactions(txn)
+        ledger.post([(txn.reference_number, [(account.pk, -amount, txn)])])
+        enqueue_movements([('withdraw', txn.reference_number, [txn])])
+        idempotency.complete(idempotency_key, txn.reference_number, amount)
+        account_cache.invalidate_on_commit(account.user_id)
+    return txn
+
+
+@retry_on_conflict('transfer')
+def transfer(sender, recipient, amount, note='', idempotency_key=None):
+    """Move ``amount`` from ``sender`` to ``recipient`` and return the Transfer"""
+    amount = _positive_cents(amount)
+    if sender.pk == recipient.pk:
+        # One row would get both legs of the CASE and lose the amount
+        raise SameAccount(sender.pk)
+    with serialized_writes('transfer'), transaction.atomic():
+        # Lock both rows in one statement, always in primary-key order, so
+        # concurrent A->B and B->A transfers queue instead of deadlocking
+        started = time.perf_counter()
+        locked = {
+            pk: (balance, is_active, user_id)
+            for pk, balance, is_active, user_id in Account.objects.select_for_update()
+            .filter(pk__in=[sender.pk, recipient.pk])
+            .order_by('pk')
+            .values_list('pk', 'balance', 'is_active', 'user_id')
+        }
+        lock_wait_seconds.observe(time.perf_counter() - started, operation='transfer')
+
+        for account in (sender, recipient):
+            if account.pk not in locked:
+                raise AccountNotFound(account.pk)
+            if not locked[account.pk][1]:
+                raise InactiveAccount(account.pk)
+        if locked[sender.pk][0] < amount:
+            raise InsufficientFunds(sender.pk)
+
+        Account.objects.filter(pk__in=[sender.pk, recipient.pk]).update(
+            balance=F('balance') + Case(
+                When(pk=sender.pk, then=Value(-amount)),
+                default=Value(amount),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            updated_at=timezone.now(),
+        )
+        sent_txn = Transaction.objects.create(
+            account=sender,
+            amount=amount,
+            description=f'Transfer to {recipient.account_number}: {note}' if note else f'Transfer to {recipient.account_number}',
+            transaction_type='TRANSFER'
+        )
+        received_txn = Transaction.objects.create(
+            account=recipient,
+            amount=amount,
+            description=f'Received from {sender.account_number}: {note}' if note else f'Received from {sender.account_number}',
+            transaction_type='RECEIVED'
+        )
+        record_transactions(sent_txn, received_txn)
+        transfer = Transfer.objects.create(
+            sender_account=sender,
+            recipient_account=recipient,
+            amount=amount,
+            note=note
+        )
+        ledger.post([(transfer.transfer_id, [
+            (sender.pk, -amount, sent_txn),
+            (recipient.pk, amount, received_txn),
+        ])])
+        enqueue_movements([('transfer', transfer.transfer_id, [sent_txn, received_txn])])
+        idempotency.complete(idempotency_key, transfer.transfer_id, amount)
+        account_cache.invalidate_on_commit(*(row[2] for row in locked.values()))
+    return transfer
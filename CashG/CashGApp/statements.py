@@ -0,0 +1,217 @@
+"""
+Account statements for a date range, streamed as CSV or JSON Lines.
+
+Rows are read with ``.iterator(chunk_size=...)`` (``.aiterator()`` under
+ASGI) and written out one chunk at a time, optionally through gzip, so
+memory use stays flat however many transactions the range holds.
+Archived transactions (see ``partitions``) are included. The opening
+balance comes from the ledger (``ledger.balance_as_of``) when a checkpoint
+covers the start of the range, otherwise from the current balance less
+everything posted since. The closing balance is the opening balance plus
+the rows and is written after the last row.
+"""
+import csv
+import datetime
+import itertools
+import json
+import zlib
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import ledger
+from .models import Account, ArchivedTransaction, Transaction
+
+CREDIT_TYPES = ('DEPOSIT', 'RECEIVED')
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+CSV_HEADER = ('date', 'reference', 'type', 'description', 'amount', 'balance')
+ROW_FIELDS = ('timestamp', 'reference_number', 'transaction_type', 'description', 'amount')
+
+
+class InvalidPeriod(ValueError):
+    """A statement range that can't be parsed or ends before it starts"""
+
+
+def parse_period(start, end):
+    """Parse ISO ``start`` and ``end`` dates (both inclusive) into a (start, end) pair of dates"""
+    try:
+        start = datetime.date.fromisoformat(start)
+        end = datetime.date.fromisoformat(end)
+    except (TypeError, ValueError):
+        raise InvalidPeriod('Dates must be given as YYYY-MM-DD.')
+    if end < start:
+        raise InvalidPeriod('The end date is before the start date.')
+    # The range is bounded by the day after ``end`` and the instant before ``start``, which must exist
+    if start == datetime.date.min or end == datetime.date.max:
+        raise InvalidPeriod('Dates must fall between 0001-01-02 and 9999-12-30.')
+    return start, end
+
+
+def _bounds(start, end):
+    """Return the [start, end) datetimes covering whole days ``start`` to ``end`` in the current time zone"""
+    tz = timezone.get_current_timezone()
+    return (datetime.datetime.combine(start, datetime.time.min, tzinfo=tz),
+            datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz))
+
+
+def _signed(amount, transaction_type):
+    return amount if transaction_type in CREDIT_TYPES else -amount
+
+
+def opening_balance(account, starts):
+    """Return the account's balance just before ``starts``"""
+    if settings.CASHG_LEDGER_ENABLED:
+        try:
+            return ledger.balance_as_of(account, starts - datetime.timedelta(microseconds=1))
+        except ledger.BalanceUnavailable:
+            pass
+    def since(model):
+        return Coalesce(Subquery(
+            model.objects.filter(account=OuterRef('pk'), timestamp__gte=starts)
+            .values('account')
+            .annotate(total=Sum(Case(When(transaction_type__in=CREDIT_TYPES, then=F('amount')),
+                                     default=-F('amount'))))
+            .values('total')
+        ), Value(Decimal('0')))
+
+    # Balance and the sums come from one statement, so a concurrent movement is in all or none
+    balance, live, archived = (Account.objects.filter(pk=account.pk)
+                               .annotate(live=since(Transaction), archived=since(ArchivedTransaction))
+                               .values_list('balance', 'live', 'archived').get())
+    return balance - live - archived
+
+
+class _Echo:
+    """File-like object whose write() hands back what it was given, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+class _Formatter:
+    def __init__(self, fmt, account, start, end):
+        self.fmt = fmt
+        self.account = account
+        self.start = start
+        self.end = end
+        self.writer = csv.writer(_Echo())
+
+    def head(self, opening):
+        if self.fmt == 'csv':
+            return (self.writer.writerow(CSV_HEADER)
+                    + self.writer.writerow([self.start.isoformat(), '', 'OPENING', 'Opening balance', '', opening]))
+        return json.dumps({'type': 'OPENING', 'account_number': self.account.account_number,
+                           'date': self.start.isoformat(), 'balance': str(opening)}) + '\n'
+
+    def row(self, row, balance):
+        if self.fmt == 'csv':
+            return self.writer.writerow([row['timestamp'].isoformat(), row['reference_number'], row['transaction_type'],
+                                         row['description'], row['amount'], balance])
+        return json.dumps({'timestamp': row['timestamp'].isoformat(), 'reference': row['reference_number'],
+                           'type': row['transaction_type'], 'description': row['description'],
+                           'amount': str(row['amount']), 'balance': str(balance)}) + '\n'
+
+    def tail(self, closing, count):
+        if self.fmt == 'csv':
+            return self.writer.writerow([self.end.isoformat(), '', 'CLOSING', f'{count} transactions', '', closing])
+        return json.dumps({'type': 'CLOSING', 'date': self.end.isoformat(), 'balance': str(closing),
+                           'transactions': count}) + '\n'
+
+
+class _Encoder:
+    """UTF-8 encode text, optionally through a streaming gzip compressor"""
+
+    def __init__(self, compress):
+        self.compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+
+    def encode(self, text):
+        data = text.encode()
+        return self.compressor.compress(data) if self.compressor else data
+
+    def flush(self):
+        return self.compressor.flush() if self.compressor else b''
+
+
+def filename(account, start, end, fmt, compress=False):
+    name = f'cashg-statement-{account.account_number}-{start.isoformat()}-{end.isoformat()}.{fmt}'
+    return f'{name}.gz' if compress else name
+
+
+def _rows(account, starts, ends):
+    """Return the querysets for the range, archived rows (which are all older) first"""
+    querysets = []
+    for model in (ArchivedTransaction, Transaction):
+        rows = (model.objects.filter(account_id=account.pk, timestamp__gte=starts, timestamp__lt=ends)
+                .order_by('timestamp', 'pk')
+                .values(*ROW_FIELDS))
+        # The rows are read after the caller returns, so fix the database the router picked now
+        querysets.append(rows.using(rows.db))
+    return querysets
+
+
+def stream(account, start, end, fmt='csv', compress=False, chunk_size=None):
+    """
+    Return an iterator of bytes for the statement of ``account`` from ``start`` to ``end``.
+
+    The opening balance is read before this returns; the rows are read
+    ``chunk_size`` (default CASHG_STATEMENT_CHUNK_SIZE) at a time as the
+    iterator is consumed.
+    """
+    chunk_size = chunk_size or settings.CASHG_STATEMENT_CHUNK_SIZE
+    starts, ends = _bounds(start, end)
+    opening = opening_balance(account, starts)
+    querysets = _rows(account, starts, ends)
+    formatter = _Formatter(fmt, account, start, end)
+
+    def generate():
+        encoder = _Encoder(compress)
+        balance = opening
+        count = 0
+        lines = [formatter.head(opening)]
+        for row in itertools.chain.from_iterable(qs.iterator(chunk_size=chunk_size) for qs in querysets):
+            balance += _signed(row['amount'], row['transaction_type'])
+            count += 1
+            lines.append(formatter.row(row, balance))
+            if len(lines) >= chunk_size:
+                yield encoder.encode(''.join(lines))
+                lines = []
+        lines.append(formatter.tail(balance, count))
+        yield encoder.encode(''.join(lines)) + encoder.flush()
+
+    return generate()
+
+
+async def _achain(querysets, chunk_size):
+    for queryset in querysets:
+        async for row in queryset.aiterator(chunk_size=chunk_size):
+            yield row
+
+
+async def astream(account, start, end, fmt='csv', compress=False, chunk_size=None):
+    """Async version of stream(), returning an async iterator of bytes"""
+    chunk_size = chunk_size or settings.CASHG_STATEMENT_CHUNK_SIZE
+    starts, ends = _bounds(start, end)
+    opening = await sync_to_async(opening_balance)(account, starts)
+    querysets = _rows(account, starts, ends)
+    formatter = _Formatter(fmt, account, start, end)
+
+    async def generate():
+        encoder = _Encoder(compress)
+        balance = opening
+        count = 0
+        lines = [formatter.head(opening)]
+        async for row in _achain(querysets, chunk_size):
+            balance += _signed(row['amount'], row['transaction_type'])
+            count += 1
+            lines.append(formatter.row(row, balance))
+            if len(lines) >= chunk_size:
+                yield encoder.encode(''.join(lines))
+                lines = []
+        lines.append(formatter.tail(balance, count))
+        yield encoder.encode(''.join(lines)) + encoder.flush()
+
+    return generate()
@@ -0,0 +1,63 @@
+"""
+Job handlers for the side effects of money movements (see jobs.py).
+
+services.py and batch.py queue both for every deposit, withdrawal and
+transfer through ``enqueue_movements``, with ``{'operation', 'reference',
+'transactions'}``, where ``transactions`` are the reference numbers of the
+Transaction rows the movement wrote. Jobs can run more than once, so each
+handler only reads and reports.
+"""
+import logging
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.utils import timezone
+
+from . import jobs
+from .models import Transaction
+
+audit_logger = logging.getLogger('CashGApp.audit')
+
+MOVEMENT_JOBS = ('audit_movement', 'send_receipts')
+
+
+def movement_jobs(operation, reference, *txns):
+    """Return the (name, payload) pairs to enqueue for a movement that wrote ``txns``"""
+    payload = {'operation': operation, 'reference': reference,
+               'transactions': [txn.reference_number for txn in txns]}
+    return [(name, payload) for name in MOVEMENT_JOBS]
+
+
+def enqueue_movements(movements):
+    """Queue the jobs for (operation, reference, txns) movements with one INSERT, in the movements' transaction"""
+    return jobs.enqueue_many([job for operation, reference, txns in movements
+                              for job in movement_jobs(operation, reference, *txns)])
+
+
+def _transactions(references):
+    return Transaction.objects.filter(reference_number__in=references).select_related('account__user')
+
+
+@jobs.task('audit_movement')
+def audit_movement(operation, reference, transactions):
+    for txn in _transactions(transactions):
+        audit_logger.info('%s %s: %s %s %s on account %s (user %s) at %s', operation, reference, txn.reference_number,
+                          txn.transaction_type, txn.amount, txn.account.account_number, txn.account.user_id,
+                          txn.timestamp.isoformat())
+
+
+@jobs.task('send_receipts')
+def send_receipts(operation, reference, transactions):
+    messages = []
+    for txn in _transactions(transactions):
+        user = txn.account.user
+        if not user.email:
+            continue
+        body = (f'Hello {user.get_full_name() or user.username},\n\n'
+                f'{txn.get_transaction_type_display()} of ₱{txn.amount:,.2f} on account {txn.account.account_number}\n'
+                f'{txn.description}\n'
+                f'Reference: {txn.reference_number}\n'
+                f'Date: {timezone.localtime(txn.timestamp):%Y-%m-%d %H:%M %Z}\n')
+        messages.append((f'CashG receipt {txn.reference_number}', body, settings.DEFAULT_FROM_EMAIL, [user.email]))
+    if messages:
+        send_mass_mail(messages, fail_silently=False)
@@ -0,0 +1,51 @@
+import threading
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connections
+
+from CashGApp import account_cache, recipients
+from CashGApp.models import Account, Profile
+
+
+def make_account(username, balance='0.00', **fields):
+    """Create a client User, Profile and Account holding ``balance``"""
+    user = User.objects.create_user(username, f'{username}@example.com', 'correct-horse-battery')
+    Profile.objects.create(user=user, account_type='Client')
+    return Account.objects.create(user=user, account_type='SAVINGS', balance=Decimal(balance), **fields)
+
+
+def reset_caches():
+    """Empty every cache; test rollbacks skip the on-commit invalidations and reuse primary keys"""
+    for cache in caches.all():
+        cache.clear()
+    account_cache._local.clear()
+    account_cache._local_versions.clear()
+    recipients._cache.clear()
+
+
+def balance_of(account):
+    return Account.objects.values_list('balance', flat=True).get(pk=account.pk)
+
+
+def run_threads(target, count):
+    """Run ``target(i)`` in ``count`` threads at once and return what each raised, if anything"""
+    barrier = threading.Barrier(count)
+    errors = [None] * count
+
+    def run(i):
+        try:
+            barrier.wait()
+            target(i)
+        except Exception as e:
+            errors[i] = e
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
@@ -0,0 +1,30 @@
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+
+from CashGApp import account_cache, services
+from CashGApp.models import Account
+
+from .helpers import make_account, reset_caches
+from .test_auth import SHARED
+
+
+class AccountCacheTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.account = make_account('bob', '10.00')
+
+    def test_not_cached_without_a_shared_cache(self):
+        account_cache.account_snapshot(self.account.user)
+        # A movement committed by another worker, which can't invalidate this process
+        Account.objects.filter(pk=self.account.pk).update(balance=Decimal('99.00'))
+        self.assertEqual(account_cache.account_snapshot(self.account.user).balance, Decimal('99.00'))
+
+    @override_settings(**SHARED)
+    def test_shared_cache_invalidated_by_movements(self):
+        self.assertEqual(account_cache.account_snapshot(self.account.user).balance, Decimal('10.00'))
+        with self.assertNumQueries(0):
+            account_cache.account_snapshot(self.account.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            services.deposit(self.account, Decimal('5.00'))
+        self.assertEqual(account_cache.account_snapshot(self.account.user).balance, Decimal('15.00'))
@@ -0,0 +1,52 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from CashGApp import services
+from CashGApp.models import Account
+
+from .helpers import make_account, reset_caches
+
+
+# The admin's stylesheets are not collected in tests, so skip the manifest lookup
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class AdminTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.account = make_account('alice', '0.00')
+        services.deposit(self.account, Decimal('10.00'))
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'correct-horse-battery')
+        self.client.force_login(self.admin)
+
+    def test_accounts_cannot_be_deleted(self):
+        response = self.client.get(reverse('admin:CashGApp_account_delete', args=[self.account.pk]))
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse('admin:CashGApp_account_changelist'))
+        self.assertNotContains(response, 'delete_selected')
+
+    def test_deactivate_accounts(self):
+        response = self.client.post(reverse('admin:CashGApp_account_changelist'),
+                                    {'action': 'deactivate', '_selected_action': [self.account.pk]}, follow=True)
+        self.assertContains(response, '1 account(s) deactivated.')
+        self.assertFalse(Account.objects.get(pk=self.account.pk).is_active)
+
+    def test_customers_cannot_be_deleted(self):
+        response = self.client.get(reverse('admin:auth_user_delete', args=[self.account.user_id]))
+        self.assertEqual(response.status_code, 403)
+        staff = User.objects.create_user('staff', is_staff=True)
+        response = self.client.get(reverse('admin:auth_user_delete', args=[staff.pk]))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('admin:auth_user_changelist'))
+        self.assertNotContains(response, 'delete_selected')
+
+    def test_deactivate_users_and_their_accounts(self):
+        response = self.client.post(reverse('admin:auth_user_changelist'),
+                                    {'action': 'deactivate', '_selected_action': [self.account.user_id]}, follow=True)
+        self.assertContains(response, '1 user(s) deactivated.')
+        self.assertFalse(User.objects.get(pk=self.account.user_id).is_active)
+        self.assertFalse(Account.objects.get(pk=self.account.pk).is_active)
@@ -0,0 +1,67 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from CashGApp import services
+from CashGApp.aggregates import summary_for
+from CashGApp.models import AccountSummary, DailyAccountSummary
+
+from .helpers import make_account, reset_caches, run_threads
+
+
+class AggregateTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.alice = make_account('alice', '1000.00')
+        self.bob = make_account('bob')
+        services.deposit(self.alice, Decimal('100.00'))
+        services.withdraw(self.alice, Decimal('200.00'))
+        services.transfer(self.alice, self.bob, Decimal('50.00'))
+
+    def test_movements_keep_totals(self):
+        summary = summary_for(self.alice)
+        self.assertEqual(
+            (summary.total_deposits, summary.total_withdrawals, summary.total_transfers, summary.transaction_count),
+            (Decimal('100.00'), Decimal('200.00'), Decimal('50.00'), 3))
+        self.assertEqual(summary_for(self.bob).total_received, Decimal('50.00'))
+
+    def test_rebuild_reproduces_the_running_totals(self):
+        before = {row.account_id: row.total_transfers for row in AccountSummary.objects.all()}
+        AccountSummary.objects.all().delete()
+        DailyAccountSummary.objects.filter(account=self.bob).delete()
+        call_command('rebuild_aggregates', stdout=StringIO())
+        self.assertEqual({row.account_id: row.total_transfers for row in AccountSummary.objects.all()}, before)
+        call_command('rebuild_aggregates', '--verify', stdout=StringIO())
+
+    def test_verify_reports_drift(self):
+        AccountSummary.objects.filter(account=self.alice).update(transaction_count=99)
+        with self.assertRaisesMessage(CommandError, '1 aggregate rows disagree'):
+            call_command('rebuild_aggregates', '--verify', stdout=StringIO(), stderr=StringIO())
+
+    def test_profile_shows_totals(self):
+        self.client.force_login(self.alice.user)
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.context['total_transactions'], 3)
+
+
+class ConcurrentRebuildTests(TransactionTestCase):
+    def setUp(self):
+        reset_caches()
+
+    def test_rebuild_aggregates_during_movements(self):
+        account = make_account('dave', '0.00')
+
+        def work(i):
+            if i == 0:
+                for _ in range(5):
+                    call_command('rebuild_aggregates', stdout=StringIO())
+            else:
+                for _ in range(10):
+                    services.deposit(account, Decimal('1.00'))
+
+        self.assertEqual(run_threads(work, 3), [None] * 3)
+        call_command('rebuild_aggregates', '--verify', stdout=StringIO(), stderr=StringIO())
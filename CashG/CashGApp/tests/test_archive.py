@@ -0,0 +1,58 @@
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+
+from CashGApp import partitions, services
+from CashGApp.models import ArchivedTransaction, Transaction
+
+from .helpers import make_account, reset_caches
+
+OLD = datetime(2024, 1, 15, 12, tzinfo=dt_timezone.utc)
+CUTOFF = datetime(2024, 2, 1, tzinfo=dt_timezone.utc)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.account = make_account('alice', '0.00')
+        old = services.deposit(self.account, Decimal('5.00'), 'Old deposit')
+        Transaction.objects.filter(pk=old.pk).update(timestamp=OLD)
+        self.recent = services.deposit(self.account, Decimal('7.00'), 'Recent deposit')
+        self.client.force_login(self.account.user)
+
+    def test_archive_moves_old_rows(self):
+        self.assertEqual(partitions.archive_rows(CUTOFF), 1)
+        self.assertEqual(list(Transaction.objects.values_list('pk', flat=True)), [self.recent.pk])
+        self.assertEqual(ArchivedTransaction.objects.get().description, 'Old deposit')
+        self.assertEqual(partitions.archived_until(self.account.pk), OLD)
+
+    def test_history_says_where_it_stops(self):
+        response = self.client.get(reverse('history'))
+        self.assertNotContains(response, 'are archived')
+        partitions.archive_rows(CUTOFF)
+        response = self.client.get(reverse('history'))
+        self.assertContains(response, 'Transactions up to Jan 15, 2024 are archived')
+        self.assertNotContains(response, 'Old deposit')
+        streamed = self.client.get(reverse('history'), {'stream': 1})
+        self.assertIn('Transactions up to Jan 15, 2024 are archived', b''.join(streamed.streaming_content).decode())
+
+    def test_api_history_etag_changes_when_archiving(self):
+        url = reverse('api:history')
+        first = self.client.get(url)
+        self.assertIsNone(first.json()['archived_until'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        partitions.archive_rows(CUTOFF)
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(len(second.json()['results']), 1)
+        self.assertEqual(second.json()['archived_until'], OLD.isoformat())
+
+    def test_statement_includes_archived_rows(self):
+        partitions.archive_rows(CUTOFF)
+        response = self.client.get(reverse('statement'), {'start': '2024-01-01', 'end': '2030-12-31'})
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('Old deposit', content)
+        self.assertIn('Recent deposit', content)
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .helpers import make_account, reset_caches
+
+SHARED = {
+    'CACHES': {**settings.CACHES, 'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                             'LOCATION': 'test-shared'}},
+    'CASHG_ACCOUNT_CACHE_ALIAS': 'shared',
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+    'SESSION_CACHE_ALIAS': 'shared',
+    'AUTHENTICATION_BACKENDS': ['CashGApp.backends.CachedModelBackend'],
+}
+
+
+class DatabaseAuthTests(TestCase):
+    """Without a shared cache, sessions and users come from the database on every request"""
+
+    def setUp(self):
+        reset_caches()
+        self.account = make_account('alice')
+        self.client.force_login(self.account.user)
+
+    def test_uses_database_sessions_and_the_model_backend(self):
+        self.assertNotIn('shared', settings.CACHES)
+        self.assertEqual(settings.SESSION_ENGINE, 'django.contrib.sessions.backends.db')
+        self.assertEqual(settings.AUTHENTICATION_BACKENDS, ['django.contrib.auth.backends.ModelBackend'])
+
+    def test_deleted_session_is_logged_out_at_once(self):
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+        Session.objects.all().delete()
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 302)
+
+    def test_deactivated_user_is_logged_out_at_once(self):
+        self.client.get(reverse('dashboard'))
+        User.objects.filter(pk=self.account.user_id).update(is_active=False)
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 302)
+
+
+@override_settings(**SHARED)
+class SharedCacheAuthTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.account = make_account('alice')
+        self.client.force_login(self.account.user)
+
+    def test_warm_request_runs_no_session_or_user_query(self):
+        self.client.get(reverse('dashboard'))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+        tables = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('django_session', tables)
+        self.assertNotIn('auth_user', tables)
+
+    def test_deactivation_is_seen_on_the_next_request(self):
+        self.client.get(reverse('dashboard'))
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.get(pk=self.account.user_id)
+            user.is_active = False
+            user.save()
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 302)
+
+    def test_logout_ends_the_session(self):
+        session_cookie = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.client.get(reverse('logout'))
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session_cookie
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 302)
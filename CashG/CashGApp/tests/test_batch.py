@@ -0,0 +1,110 @@
+import csv
+import json
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase
+
+from CashGApp.batch import BatchLine, post_batch
+from CashGApp.models import Job, Transaction, Transfer
+
+from .helpers import balance_of, make_account, reset_caches
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.payroll = make_account('payroll', '0.00')
+        self.staff = make_account('staff', '0.00')
+
+    def post(self, *lines, chunk_size=500):
+        lines = [BatchLine(number, *fields) for number, fields in enumerate(lines, start=1)]
+        return list(post_batch(lines, chunk_size=chunk_size))
+
+    def test_lines_post_against_running_balances(self):
+        payroll, staff = self.payroll.account_number, self.staff.account_number
+        results = self.post(
+            ('DEPOSIT', payroll, '100.00'),
+            ('TRANSFER', payroll, '150.00', staff),
+            ('TRANSFER', payroll, '60.00', staff, 'March'),
+            ('DEPOSIT', staff, '1.005'),
+            ('TRANSFER', payroll, '10.00', payroll),
+            ('DEPOSIT', '000', '10.00'),
+        )
+        self.assertEqual([result.ok for result in results], [True, False, True, False, False, False])
+        self.assertEqual(results[1].error, 'Insufficient balance.')
+        self.assertEqual(results[3].error, "Invalid amount '1.005'.")
+        self.assertEqual(results[4].error, 'Cannot transfer to your own account.')
+        self.assertEqual(balance_of(self.payroll), Decimal('40.00'))
+        self.assertEqual(balance_of(self.staff), Decimal('60.00'))
+        self.assertEqual(Transfer.objects.get().transfer_id, results[2].reference)
+        self.assertEqual(Transaction.objects.count(), 3)
+        call_command('reconcile_ledger', '--full', stdout=StringIO(), stderr=StringIO())
+
+    def test_chunks_carry_balances_forward(self):
+        payroll, staff = self.payroll.account_number, self.staff.account_number
+        results = self.post(
+            ('DEPOSIT', payroll, '30.00'),
+            ('TRANSFER', payroll, '10.00', staff),
+            ('TRANSFER', payroll, '10.00', staff),
+            ('TRANSFER', payroll, '20.00', staff),
+            chunk_size=2,
+        )
+        self.assertEqual([result.ok for result in results], [True, True, True, False])
+        self.assertEqual(balance_of(self.staff), Decimal('20.00'))
+        call_command('reconcile_ledger', stdout=StringIO(), stderr=StringIO())
+
+    def test_inactive_account_line_fails(self):
+        self.staff.is_active = False
+        self.staff.save()
+        results = self.post(('DEPOSIT', self.staff.account_number, '10.00'))
+        self.assertFalse(results[0].ok)
+        self.assertEqual(balance_of(self.staff), Decimal('0.00'))
+
+    def test_rolled_back_chunk_keeps_line_errors(self):
+        payroll, staff = self.payroll.account_number, self.staff.account_number
+        with mock.patch('CashGApp.ledger.post', side_effect=DatabaseError('deadlock detected')):
+            results = self.post(
+                ('DEPOSIT', payroll, '10.00'),
+                ('DEPOSIT', '000', '10.00'),
+                ('TRANSFER', staff, '5.00', payroll),
+            )
+        self.assertEqual([result.ok for result in results], [False, False, False])
+        self.assertEqual(results[0].error, 'Chunk rolled back: deadlock detected')
+        self.assertNotIn('rolled back', results[1].error)
+        self.assertEqual(results[2].error, 'Insufficient balance.')
+        self.assertEqual(Transaction.objects.count(), 0)
+        self.assertEqual(balance_of(self.payroll), Decimal('0.00'))
+
+    def test_postings_queue_movement_jobs(self):
+        payroll, staff = self.payroll.account_number, self.staff.account_number
+        results = self.post(('DEPOSIT', payroll, '10.00'), ('TRANSFER', payroll, '5.00', staff))
+        payloads = Job.objects.filter(name='audit_movement').values_list('payload', flat=True)
+        self.assertEqual(sorted(payload['reference'] for payload in payloads),
+                         sorted(result.reference for result in results))
+        transfer = next(payload for payload in payloads if payload['operation'] == 'transfer')
+        self.assertEqual(len(transfer['transactions']), 2)
+
+
+class PostBatchCommandTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.payroll = make_account('payroll', '0.00')
+
+    def test_jsonl_lines_that_are_not_objects_are_reported(self):
+        path = self.enterContext(tempfile.TemporaryDirectory()) + '/batch.jsonl'
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('[1, 2]\n"x"\n{not json\n')
+            f.write(json.dumps({'type': 'deposit', 'account': self.payroll.account_number, 'amount': 12.5}) + '\n')
+        report = StringIO()
+        call_command('post_batch', path, stdout=report, stderr=StringIO())
+        rows = list(csv.reader(StringIO(report.getvalue())))[1:]
+        self.assertEqual([row[:2] for row in rows], [['1', 'FAILED'], ['2', 'FAILED'], ['3', 'FAILED'], ['4', 'OK']])
+        self.assertEqual(rows[0][3], 'Each line must be a JSON object.')
+        self.assertEqual(rows[1][3], 'Each line must be a JSON object.')
+        self.assertTrue(rows[2][3].startswith('Invalid JSON'))
+        self.assertEqual(balance_of(self.payroll), Decimal('12.50'))
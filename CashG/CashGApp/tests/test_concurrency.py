@@ -0,0 +1,129 @@
+import random
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import OperationalError, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from CashGApp import services
+from CashGApp.db import retry_on_conflict
+from CashGApp.models import Account, Transaction, Transfer
+
+from .helpers import balance_of, make_account, reset_caches, run_threads
+
+
+class ConcurrentMovementTests(TransactionTestCase):
+    def setUp(self):
+        reset_caches()
+
+    def test_concurrent_transfers_conserve_money(self):
+        accounts = [make_account(f'user{i}', '500.00') for i in range(3)]
+        done = []
+
+        def transfer_many(i):
+            rng = random.Random(i)
+            for _ in range(15):
+                sender, recipient = rng.sample(accounts, 2)
+                try:
+                    services.transfer(sender, recipient, Decimal(rng.randint(1, 20000)) / 100)
+                except services.InsufficientFunds:
+                    continue
+                done.append(1)
+
+        self.assertEqual(run_threads(transfer_many, 4), [None] * 4)
+        balances = [balance_of(account) for account in accounts]
+        self.assertEqual(sum(balances), Decimal('1500.00'))
+        self.assertTrue(all(balance >= 0 for balance in balances))
+        self.assertEqual(Transfer.objects.count(), len(done))
+        self.assertEqual(Transaction.objects.count(), 2 * len(done))
+        call_command('reconcile_ledger', '--full', stdout=StringIO(), stderr=StringIO())
+
+    def test_opposite_transfers_do_not_deadlock(self):
+        alice, bob = make_account('alice', '1000.00'), make_account('bob', '1000.00')
+
+        def transfer(i):
+            sender, recipient = (alice, bob) if i % 2 else (bob, alice)
+            for _ in range(10):
+                services.transfer(sender, recipient, Decimal('10.00'))
+
+        self.assertEqual(run_threads(transfer, 4), [None] * 4)
+        self.assertEqual(balance_of(alice), Decimal('1000.00'))
+        self.assertEqual(balance_of(bob), Decimal('1000.00'))
+
+    def test_concurrent_withdrawals_never_overdraw(self):
+        account = make_account('carol', '1000.00')
+        errors = run_threads(lambda i: services.withdraw(account, Decimal('300.00')), 5)
+        self.assertEqual(sum(error is None for error in errors), 3)
+        self.assertTrue(all(isinstance(error, services.InsufficientFunds) for error in errors if error))
+        self.assertEqual(balance_of(account), Decimal('100.00'))
+        self.assertEqual(Account.objects.get(pk=account.pk).transactions.count(), 3)
+        call_command('reconcile_ledger', stdout=StringIO(), stderr=StringIO())
+
+
+def flaky(failures, error='database is locked'):
+    """A retry_on_conflict-wrapped operation failing ``failures`` times, and the list of its calls"""
+    calls = []
+
+    @retry_on_conflict('test')
+    def operation():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise OperationalError(error)
+        return len(calls)
+    return operation, calls
+
+
+@override_settings(CASHG_DB_RETRY_BASE_DELAY=0, CASHG_DB_RETRY_MAX_DELAY=0, CASHG_DB_RETRY_ATTEMPTS=3)
+class RetryOnConflictTests(SimpleTestCase):
+    def test_retries_until_success(self):
+        operation, calls = flaky(2)
+        self.assertEqual(operation(), 3)
+
+    def test_gives_up_after_the_last_attempt(self):
+        operation, calls = flaky(5)
+        with self.assertRaises(OperationalError):
+            operation()
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_are_not_retried(self):
+        operation, calls = flaky(1, error='no such table')
+        with self.assertRaises(OperationalError):
+            operation()
+        self.assertEqual(len(calls), 1)
+
+
+class RetryInsideTransactionTests(TestCase):
+    def test_runs_once_inside_an_outer_transaction(self):
+        operation, calls = flaky(1)
+        with self.assertRaises(OperationalError), transaction.atomic():
+            operation()
+        self.assertEqual(len(calls), 1)
+
+
+class BusyDatabaseViewTests(TestCase):
+    """Views report a conflict that outlasted its retries instead of failing with a 500"""
+
+    def setUp(self):
+        reset_caches()
+        self.alice = make_account('alice', '1000.00')
+        self.bob = make_account('bob')
+        self.client.force_login(self.alice.user)
+
+    def post(self, view, operation, **data):
+        with mock.patch(f'CashGApp.services.{operation}', side_effect=OperationalError('database is locked')):
+            response = self.client.post(reverse(view), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('The bank is busy right now.', str(list(response.context['messages'])[0]))
+        self.assertEqual(balance_of(self.alice), Decimal('1000.00'))
+
+    def test_deposit(self):
+        self.post('deposit', 'deposit', amount='50.00')
+
+    def test_withdraw(self):
+        self.post('withdraw', 'withdraw', amount='500.00')
+
+    def test_transfer(self):
+        self.post('transfer', 'transfer', amount='50.00', recipient_account=self.bob.account_number)
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from CashGApp import services
+from CashGApp.models import Transaction
+from CashGApp.pagination import InvalidCursor, decode_cursor, encode_cursor, iter_rows, paginate
+
+from .helpers import make_account, reset_caches
+
+START = datetime(2025, 3, 1, 12, tzinfo=dt_timezone.utc)
+
+
+class HistoryFixture(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.account = make_account('alice', '0.00')
+        for i in range(8):
+            services.deposit(self.account, Decimal(i + 1), f'Deposit {i}')
+        # Three rows share a timestamp, so the id must break the tie
+        for i, txn in enumerate(Transaction.objects.order_by('pk')):
+            Transaction.objects.filter(pk=txn.pk).update(timestamp=START + timedelta(hours=max(i, 2)))
+        self.transactions = Transaction.objects.filter(account=self.account)
+        self.newest_first = list(self.transactions.order_by('-timestamp', '-pk'))
+
+
+class PaginationTests(HistoryFixture):
+    def walk(self, page_size):
+        pages, cursor = [], None
+        while True:
+            page = paginate(self.transactions, cursor=cursor, page_size=page_size)
+            pages.append(page)
+            if not page.has_next:
+                return pages
+            cursor = page.next_cursor
+
+    def test_next_cursors_visit_every_row_once_in_order(self):
+        for page_size in (1, 3, 8, 50):
+            with self.subTest(page_size=page_size):
+                pages = self.walk(page_size)
+                self.assertEqual([txn for page in pages for txn in page], self.newest_first)
+                self.assertFalse(pages[0].has_previous)
+
+    def test_prev_cursor_returns_the_page_before(self):
+        pages = self.walk(3)
+        back = paginate(self.transactions, cursor=pages[2].prev_cursor, page_size=3)
+        self.assertEqual(list(back), list(pages[1]))
+        first = paginate(self.transactions, cursor=pages[1].prev_cursor, page_size=3)
+        self.assertEqual(list(first), list(pages[0]))
+        self.assertFalse(first.has_previous)
+        self.assertTrue(first.has_next)
+
+    def test_rows_added_while_paging_are_not_repeated(self):
+        first = paginate(self.transactions, page_size=4)
+        services.deposit(self.account, Decimal('99.00'))
+        second = paginate(self.transactions, cursor=first.next_cursor, page_size=4)
+        self.assertEqual(list(first) + list(second), self.newest_first)
+
+    def test_cursor_round_trip_and_garbage(self):
+        self.assertEqual(decode_cursor(encode_cursor('next', START, 7)), ('next', START, 7))
+        for token in ('', 'garbage', encode_cursor('next', START, 7)[:-3], 'c2lkZXxub3R8YQ'):
+            with self.subTest(token=token), self.assertRaises(InvalidCursor):
+                decode_cursor(token)
+
+    def test_iter_rows_streams_every_row(self):
+        self.assertEqual(list(iter_rows(self.transactions, chunk_size=3)), self.newest_first)
+
+
+@override_settings(CASHG_HISTORY_PAGE_SIZE=3)
+class HistoryViewTests(HistoryFixture):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.account.user)
+
+    def test_pages_follow_next_cursor(self):
+        response = self.client.get(reverse('history'))
+        page = response.context['transactions']
+        self.assertEqual(list(page), self.newest_first[:3])
+        response = self.client.get(reverse('history'), {'cursor': page.next_cursor})
+        self.assertEqual(list(response.context['transactions']), self.newest_first[3:6])
+
+    def test_invalid_cursor_shows_the_first_page(self):
+        response = self.client.get(reverse('history'), {'cursor': 'garbage'})
+        self.assertEqual(list(response.context['transactions']), self.newest_first[:3])
+        self.assertIn('Invalid page link', str(list(response.context['messages'])[0]))
+
+    def test_stream_renders_every_row(self):
+        response = self.client.get(reverse('history'), {'stream': '1'})
+        body = b''.join(response.streaming_content).decode()
+        for txn in self.newest_first:
+            self.assertIn(txn.reference_number, body)
+
+    def test_api_pages(self):
+        references, url, params = [], reverse('api:history'), {'limit': 3}
+        while True:
+            data = self.client.get(url, params).json()
+            references += [row['reference_number'] for row in data['results']]
+            if not data['next']:
+                break
+            params = {'limit': 3, 'cursor': data['next']}
+        self.assertEqual(references, [txn.reference_number for txn in self.newest_first])
+        self.assertEqual(self.client.get(url, {'cursor': 'garbage'}).status_code, 400)
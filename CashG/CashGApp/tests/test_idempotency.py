@@ -0,0 +1,100 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from CashGApp import idempotency
+from CashGApp.models import Account, IdempotencyKey, Transaction, Transfer
+
+from .helpers import balance_of, make_account, reset_caches
+
+
+class IdempotentViewTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.alice = make_account('alice', '1000.00')
+        self.bob = make_account('bob')
+        self.client.force_login(self.alice.user)
+
+    def post(self, view, key, **data):
+        return self.client.post(reverse(view), data, HTTP_IDEMPOTENCY_KEY=key, follow=True)
+
+    def messages(self, response):
+        return [str(message) for message in response.context['messages']]
+
+    def test_deposit_replay_is_processed_once(self):
+        self.post('deposit', 'key-1', amount='100.00')
+        response = self.post('deposit', 'key-1', amount='100.00')
+        self.assertEqual(balance_of(self.alice), Decimal('1100.00'))
+        self.assertEqual(Transaction.objects.filter(account=self.alice).count(), 1)
+        reference = Transaction.objects.get(account=self.alice).reference_number
+        self.assertIn(f'already processed (Ref: {reference})', self.messages(response)[0])
+
+    def test_transfer_replay_is_processed_once(self):
+        for _ in range(2):
+            self.post('transfer', 'key-2', recipient_account=self.bob.account_number, amount='40.00')
+        self.assertEqual(Transfer.objects.count(), 1)
+        self.assertEqual(balance_of(self.bob), Decimal('40.00'))
+
+    def test_key_reused_with_different_details(self):
+        self.post('withdraw', 'key-3', amount='200.00')
+        response = self.post('withdraw', 'key-3', amount='300.00')
+        self.assertEqual(self.messages(response)[0], 'This request was already submitted with different details.')
+        self.assertEqual(balance_of(self.alice), Decimal('800.00'))
+
+    def test_key_reused_for_another_operation(self):
+        self.post('deposit', 'key-4', amount='200.00')
+        self.post('withdraw', 'key-4', amount='200.00')
+        self.assertEqual(balance_of(self.alice), Decimal('1200.00'))
+
+    def test_keys_are_per_user(self):
+        self.post('deposit', 'shared', amount='10.00')
+        self.client.force_login(self.bob.user)
+        self.post('deposit', 'shared', amount='10.00')
+        self.assertEqual(balance_of(self.bob), Decimal('10.00'))
+
+    def test_failed_movement_does_not_store_the_key(self):
+        self.client.force_login(self.bob.user)
+        self.post('withdraw', 'key-5', amount='200.00')
+        self.assertFalse(IdempotencyKey.objects.exists())
+        Account.objects.filter(pk=self.bob.pk).update(balance=Decimal('500.00'))
+        reset_caches()
+        self.post('withdraw', 'key-5', amount='200.00')
+        self.assertEqual(balance_of(self.bob), Decimal('300.00'))
+
+    def test_expired_key_can_be_used_again(self):
+        self.post('deposit', 'key-6', amount='10.00')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.post('deposit', 'key-6', amount='10.00')
+        self.assertEqual(balance_of(self.alice), Decimal('1020.00'))
+        self.assertEqual(idempotency.purge_expired(), 0)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(idempotency.purge_expired(), 1)
+
+
+class IdempotentApiTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.alice = make_account('alice', '1000.00')
+        self.client.force_login(self.alice.user)
+
+    def post(self, key, amount):
+        return self.client.post(reverse('api:withdraw'), {'amount': amount}, content_type='application/json',
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_returns_the_original_reference(self):
+        first = self.post('api-1', '250.00')
+        second = self.post('api-1', '250.00')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(first.json()['reference'], second.json()['reference'])
+        self.assertEqual(balance_of(self.alice), Decimal('750.00'))
+
+    def test_conflicting_reuse_is_refused(self):
+        self.post('api-2', '250.00')
+        response = self.post('api-2', '260.00')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(balance_of(self.alice), Decimal('750.00'))
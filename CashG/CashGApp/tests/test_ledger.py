@@ -0,0 +1,78 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F
+from django.test import TestCase
+from django.utils import timezone
+
+from CashGApp import ledger, services
+from CashGApp.models import Account, BalanceCheckpoint, LedgerEntry
+
+from .helpers import make_account, reset_caches
+
+
+def reconcile(*args):
+    call_command('reconcile_ledger', *args, stdout=StringIO(), stderr=StringIO())
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.alice = make_account('alice', '500.00')
+        self.bob = make_account('bob', '20.00')
+
+    def move_money(self):
+        services.deposit(self.alice, Decimal('100.00'))
+        services.withdraw(self.alice, Decimal('250.00'))
+        services.transfer(self.alice, self.bob, Decimal('75.25'))
+        services.transfer(self.bob, self.alice, Decimal('5.25'))
+
+    def test_opening_checkpoint_holds_the_starting_balance(self):
+        checkpoint = BalanceCheckpoint.objects.get(account=self.alice)
+        self.assertEqual(checkpoint.balance, Decimal('500.00'))
+        self.assertEqual(checkpoint.last_entry_id, 0)
+
+    def test_ledger_matches_balances(self):
+        self.move_money()
+        reconcile('--full')
+        for account in Account.objects.all():
+            last = LedgerEntry.objects.filter(account=account).latest('pk')
+            self.assertEqual(last.balance_after, account.balance)
+
+    def test_every_journal_balances(self):
+        self.move_money()
+        for journal in LedgerEntry.objects.values_list('journal', flat=True).distinct():
+            legs = LedgerEntry.objects.filter(journal=journal).values_list('amount', flat=True)
+            self.assertEqual(sum(legs), 0, journal)
+
+    def test_balance_changed_outside_the_ledger_is_reported(self):
+        self.move_money()
+        Account.objects.filter(pk=self.bob.pk).update(balance=F('balance') + 1)
+        with self.assertRaisesMessage(CommandError, '1 ledger mismatches'):
+            reconcile()
+
+    def test_reconcile_from_checkpoints(self):
+        self.move_money()
+        call_command('ledger_checkpoint', stdout=StringIO())
+        services.deposit(self.bob, Decimal('1.00'))
+        reconcile()
+        reconcile('--full')
+
+    def test_balance_as_of(self):
+        services.deposit(self.alice, Decimal('100.00'))
+        between = timezone.now()
+        services.withdraw(self.alice, Decimal('300.00'))
+        self.assertEqual(ledger.balance_as_of(self.alice, between), Decimal('600.00'))
+        self.assertEqual(ledger.balance_as_of(self.alice, timezone.now()), Decimal('300.00'))
+        with self.assertRaises(ledger.BalanceUnavailable):
+            ledger.balance_as_of(self.alice, self.alice.created_at.replace(year=2000))
+
+    def test_entries_are_append_only(self):
+        services.deposit(self.alice, Decimal('1.00'))
+        entry = LedgerEntry.objects.first()
+        with self.assertRaises(ValueError):
+            entry.save()
+        with self.assertRaises(ValueError):
+            entry.delete()
@@ -0,0 +1,63 @@
+import re
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from CashGApp import services
+from CashGApp.middleware import db_queries
+
+from .helpers import make_account, reset_caches
+
+
+def queries_recorded(view):
+    """Total queries db_queries has observed for ``view``"""
+    return sum(total for key, _, total in db_queries.samples() if key == (('view', view),))
+
+
+@override_settings(DEBUG=False)
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.account = make_account('alice', '0.00')
+        for i in range(3):
+            services.deposit(self.account, Decimal('1.00'), f'Deposit {i}')
+
+    def test_hidden_from_customers(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('login')))
+        self.client.force_login(self.account.user)
+        self.assertNotIn('Server-Timing', self.client.get(reverse('history')))
+
+    def test_shown_to_staff(self):
+        self.account.user.is_staff = True
+        self.account.user.save()
+        self.client.force_login(self.account.user)
+        self.assertRegex(self.client.get(reverse('dashboard'))['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries"')
+        # Pages that never load the user don't load it just for the header
+        with self.assertNumQueries(0):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('login')))
+
+    async def test_async_requests(self):
+        response = await self.async_client.get(reverse('login'))
+        self.assertNotIn('Server-Timing', response)
+        self.account.user.is_staff = True
+        await self.account.user.asave()
+        await self.async_client.aforce_login(self.account.user)
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertIn('Server-Timing', response)
+
+    @override_settings(DEBUG=True)
+    def test_shown_in_debug(self):
+        self.assertIn('Server-Timing', self.client.get(reverse('login')))
+
+    def test_streamed_queries_are_recorded(self):
+        self.account.user.is_staff = True
+        self.account.user.save()
+        self.client.force_login(self.account.user)
+        before = queries_recorded('history')
+        response = self.client.get(reverse('history'), {'stream': 1})
+        self.assertEqual(queries_recorded('history'), before)
+        header = int(re.search(r'(\d+) queries before streaming', response['Server-Timing']).group(1))
+        b''.join(response.streaming_content)
+        # The row chunks are fetched while streaming and still counted
+        self.assertGreater(queries_recorded('history'), before + header)
@@ -0,0 +1,29 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from CashGApp.models import Account, Profile
+
+from .helpers import make_account, reset_caches
+
+
+class ProfileViewTests(TestCase):
+    def setUp(self):
+        reset_caches()
+
+    def test_existing_rows_are_only_read(self):
+        account = make_account('alice')
+        self.client.force_login(account.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('profile')).status_code, 200)
+        self.assertFalse([query for query in queries.captured_queries if query['sql'].startswith('INSERT')])
+
+    def test_missing_rows_are_created_once(self):
+        user = User.objects.create_user('bob')
+        self.client.force_login(user)
+        self.client.get(reverse('profile'))
+        self.client.get(reverse('profile'))
+        self.assertEqual(Account.objects.filter(user=user).count(), 1)
+        self.assertEqual(Profile.objects.filter(user=user).count(), 1)
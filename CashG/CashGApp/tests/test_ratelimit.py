@@ -0,0 +1,52 @@
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .helpers import make_account, reset_caches
+
+
+class LoginRateLimitTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        make_account('alice')
+
+    def login(self, password, ip):
+        return self.client.post(reverse('login'), {'username': 'alice', 'password': password}, REMOTE_ADDR=ip)
+
+    def test_failures_from_one_address_do_not_lock_out_another(self):
+        for _ in range(5):
+            self.assertEqual(self.login('wrong-password', '203.0.113.9').status_code, 200)
+        refused = self.login('wrong-password', '203.0.113.9')
+        self.assertEqual(refused.status_code, 429)
+        self.assertIn('Retry-After', refused)
+
+        response = self.login('correct-horse-battery', '198.51.100.7')
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+    def test_username_is_case_insensitive(self):
+        for username in ('alice', 'Alice', 'ALICE ', 'alice', 'aLice'):
+            self.client.post(reverse('login'), {'username': username, 'password': 'x'}, REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(self.login('wrong-password', '203.0.113.9').status_code, 429)
+
+
+@override_settings(CASHG_RATE_LIMITS={'money': {'user': '2/m'}})
+class UserRateLimitTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.account = make_account('alice')
+        self.client.force_login(self.account.user)
+
+    def deposit(self, client):
+        return client.post(reverse('deposit'), {'amount': '10.00'})
+
+    def test_refused_requests_run_no_queries(self):
+        for _ in range(2):
+            self.assertEqual(self.deposit(self.client).status_code, 302)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.deposit(self.client).status_code, 429)
+
+    def test_sessions_have_their_own_buckets(self):
+        for _ in range(2):
+            self.deposit(self.client)
+        other = Client()
+        other.force_login(make_account('bob').user)
+        self.assertEqual(self.deposit(other).status_code, 302)
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from CashGApp import services
+from CashGApp.models import Transaction
+from CashGApp.search import HistoryFilter
+
+from .helpers import make_account, reset_caches
+
+DAY_ONE = datetime(2025, 3, 1, 12, tzinfo=dt_timezone.utc)
+
+
+class HistoryFilterTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.account = make_account('alice', '1000.00')
+        self.other = make_account('bob', '0.00')
+        services.deposit(self.account, Decimal('1500.00'), 'Salary for March')      # day 1
+        services.withdraw(self.account, Decimal('200.00'), 'Groceries')              # day 2
+        services.transfer(self.account, self.other, Decimal('75.00'), 'Rent share')  # day 3
+        services.deposit(self.account, Decimal('20.00'), 'Cashback')                 # day 4
+        for day, txn in enumerate(Transaction.objects.filter(account=self.account).order_by('pk')):
+            Transaction.objects.filter(pk=txn.pk).update(timestamp=DAY_ONE + timedelta(days=day))
+        self.transactions = Transaction.objects.filter(account=self.account)
+
+    def descriptions(self, **params):
+        return sorted(HistoryFilter(params).apply(self.transactions).values_list('description', flat=True))
+
+    def test_no_filters(self):
+        filters = HistoryFilter({})
+        self.assertFalse(filters)
+        self.assertEqual(filters.apply(self.transactions).count(), 4)
+
+    def test_type(self):
+        self.assertEqual(self.descriptions(type='DEPOSIT'), ['Cashback', 'Salary for March'])
+
+    def test_date_range_includes_both_days(self):
+        self.assertEqual(self.descriptions(start='2025-03-02', end='2025-03-03'),
+                         ['Groceries', f'Transfer to {self.other.account_number}: Rent share'])
+
+    def test_amount_range(self):
+        self.assertEqual(self.descriptions(min_amount='20', max_amount='200'),
+                         ['Cashback', 'Groceries', f'Transfer to {self.other.account_number}: Rent share'])
+
+    def test_text_matches_word_prefixes_case_insensitively(self):
+        self.assertEqual(self.descriptions(q='sal'), ['Salary for March'])
+        self.assertEqual(self.descriptions(q='RENT'), [f'Transfer to {self.other.account_number}: Rent share'])
+        self.assertEqual(self.descriptions(q='nothing'), [])
+
+    def test_text_matches_a_reference_number(self):
+        txn = self.transactions.get(description='Groceries')
+        self.assertEqual(self.descriptions(q=txn.reference_number.lower()), ['Groceries'])
+
+    def test_filters_combine(self):
+        self.assertEqual(self.descriptions(type='DEPOSIT', min_amount='100'), ['Salary for March'])
+
+    def test_invalid_values_are_reported_and_dropped(self):
+        filters = HistoryFilter({'type': 'BOGUS', 'start': '2025-13-01', 'min_amount': 'lots'})
+        self.assertEqual(len(filters.errors), 3)
+        self.assertFalse(filters)
+        filters = HistoryFilter({'start': '2025-03-03', 'end': '2025-03-01'})
+        self.assertEqual(filters.errors, ['The end date is before the start date.'])
+        self.assertEqual(filters.apply(self.transactions).count(), 2)
+
+    def test_out_of_range_values_are_reported_and_dropped(self):
+        filters = HistoryFilter({'start': '0001-01-01', 'end': '9999-12-31', 'min_amount': '1e999999',
+                                 'max_amount': '-100000000'})
+        self.assertEqual(filters.errors, ['Dates must fall between 0001-01-02 and 9999-12-30.'] * 2 +
+                         ['Amounts must be at most 99,999,999.99.'] * 2)
+        self.assertFalse(filters)
+        self.assertEqual(self.descriptions(start='0001-01-02', end='9999-12-30', max_amount='99999999.99'),
+                         self.descriptions())
+
+    def test_view_reports_the_latest_end_date(self):
+        self.client.force_login(self.account.user)
+        response = self.client.get(reverse('history'), {'end': '9999-12-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Dates must fall between 0001-01-02 and 9999-12-30.')
+        self.assertEqual(len(response.context['transactions']), 4)
+
+    def test_querystring_keeps_active_filters(self):
+        filters = HistoryFilter({'type': 'DEPOSIT', 'q': 'sal ary', 'start': ''})
+        self.assertEqual(filters.querystring(), 'type=DEPOSIT&q=sal+ary')
+
+    @override_settings(CASHG_HISTORY_PAGE_SIZE=1)
+    def test_view_pages_within_the_filter(self):
+        self.client.force_login(self.account.user)
+        response = self.client.get(reverse('history'), {'type': 'DEPOSIT'})
+        page = response.context['transactions']
+        self.assertEqual([txn.description for txn in page], ['Cashback'])
+        self.assertContains(response, f'?cursor={page.next_cursor}&amp;type=DEPOSIT')
+        response = self.client.get(reverse('history'), {'type': 'DEPOSIT', 'cursor': page.next_cursor})
+        page = response.context['transactions']
+        self.assertEqual([txn.description for txn in page], ['Salary for March'])
+        self.assertFalse(page.has_next)
@@ -0,0 +1,124 @@
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+
+from CashGApp import services
+from CashGApp.models import LedgerEntry, Transaction, Transfer
+
+from .helpers import balance_of, make_account, reset_caches
+
+
+class MovementTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.alice = make_account('alice', '1000.00')
+        self.bob = make_account('bob', '50.00')
+
+    def test_deposit_credits_and_records(self):
+        txn = services.deposit(self.alice, Decimal('25.50'), 'Salary')
+        self.assertEqual(balance_of(self.alice), Decimal('1025.50'))
+        self.assertEqual(txn.transaction_type, 'DEPOSIT')
+        self.assertEqual(LedgerEntry.objects.filter(journal=txn.reference_number).count(), 2)
+
+    def test_withdraw_debits(self):
+        services.withdraw(self.alice, Decimal('200.00'))
+        self.assertEqual(balance_of(self.alice), Decimal('800.00'))
+
+    def test_withdraw_insufficient_funds_changes_nothing(self):
+        with self.assertRaises(services.InsufficientFunds):
+            services.withdraw(self.bob, Decimal('50.01'))
+        self.assertEqual(balance_of(self.bob), Decimal('50.00'))
+        self.assertFalse(Transaction.objects.filter(account=self.bob).exists())
+        self.assertFalse(LedgerEntry.objects.filter(account=self.bob).exists())
+
+    def test_withdraw_inactive_account(self):
+        self.alice.is_active = False
+        self.alice.save()
+        with self.assertRaises(services.InactiveAccount):
+            services.withdraw(self.alice, Decimal('10.00'))
+        self.assertEqual(balance_of(self.alice), Decimal('1000.00'))
+
+    def test_transfer_moves_money_both_ways(self):
+        transfer = services.transfer(self.alice, self.bob, Decimal('300.00'), 'Rent')
+        self.assertEqual(balance_of(self.alice), Decimal('700.00'))
+        self.assertEqual(balance_of(self.bob), Decimal('350.00'))
+        legs = LedgerEntry.objects.filter(journal=transfer.transfer_id)
+        self.assertEqual(sorted(leg.amount for leg in legs), [Decimal('-300.00'), Decimal('300.00')])
+
+    def test_transfer_insufficient_funds_changes_nothing(self):
+        with self.assertRaises(services.InsufficientFunds):
+            services.transfer(self.bob, self.alice, Decimal('60.00'))
+        self.assertEqual(balance_of(self.bob), Decimal('50.00'))
+        self.assertEqual(balance_of(self.alice), Decimal('1000.00'))
+        self.assertFalse(Transfer.objects.exists())
+
+    def test_transfer_to_inactive_recipient(self):
+        self.bob.is_active = False
+        self.bob.save()
+        with self.assertRaises(services.InactiveAccount) as raised:
+            services.transfer(self.alice, self.bob, Decimal('10.00'))
+        self.assertEqual(raised.exception.args[0], self.bob.pk)
+        self.assertEqual(balance_of(self.alice), Decimal('1000.00'))
+
+    def test_self_transfer_rejected(self):
+        with self.assertRaises(services.SameAccount):
+            services.transfer(self.alice, self.alice, Decimal('10.00'))
+        self.assertEqual(balance_of(self.alice), Decimal('1000.00'))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_sub_cent_and_non_positive_amounts_rejected(self):
+        for amount in ('1.005', '0', '-5.00', 'NaN', 'Infinity'):
+            with self.subTest(amount=amount):
+                with self.assertRaises(services.InvalidAmount):
+                    services.deposit(self.alice, Decimal(amount))
+                with self.assertRaises(services.InvalidAmount):
+                    services.transfer(self.alice, self.bob, Decimal(amount))
+        self.assertEqual(balance_of(self.alice), Decimal('1000.00'))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_cents_accepts_whole_cents(self):
+        self.assertEqual(services.cents('12.5'), Decimal('12.5'))
+        self.assertEqual(services.cents('1.000'), Decimal('1.000'))
+        with self.assertRaises(services.InvalidAmount):
+            services.cents('abc')
+
+
+class MovementViewTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.alice = make_account('alice', '1000.00')
+        self.bob = make_account('bob')
+        self.client.force_login(self.alice.user)
+
+    def messages(self, response):
+        return [str(message) for message in response.context['messages']]
+
+    def test_deposit_rejects_sub_cent_amount(self):
+        response = self.client.post(reverse('deposit'), {'amount': '1.005'})
+        self.assertIn('at most two decimal places', self.messages(response)[0])
+        self.assertEqual(balance_of(self.alice), Decimal('1000.00'))
+
+    def test_transfer_to_own_account_rejected(self):
+        response = self.client.post(reverse('transfer'), {
+            'recipient_account': self.alice.account_number, 'amount': '10.00'})
+        self.assertEqual(self.messages(response), ['Cannot transfer to your own account.'])
+        self.assertEqual(balance_of(self.alice), Decimal('1000.00'))
+
+    def test_withdraw_insufficient_balance(self):
+        self.client.force_login(self.bob.user)
+        response = self.client.post(reverse('withdraw'), {'amount': '200.00'})
+        self.assertEqual(self.messages(response), ['Insufficient balance.'])
+        self.assertEqual(balance_of(self.bob), Decimal('0.00'))
+
+    def test_transfer(self):
+        response = self.client.post(reverse('transfer'), {
+            'recipient_account': self.bob.account_number, 'amount': '250.00'})
+        self.assertRedirects(response, reverse('dashboard'))
+        self.assertEqual(balance_of(self.alice), Decimal('750.00'))
+        self.assertEqual(balance_of(self.bob), Decimal('250.00'))
+
+    def test_api_rejects_sub_cent_amount(self):
+        response = self.client.post(reverse('api:deposit'), {'amount': '2.001'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(balance_of(self.alice), Decimal('1000.00'))
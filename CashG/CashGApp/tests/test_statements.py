@@ -0,0 +1,46 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.urls import reverse
+
+from CashGApp import services, statements
+
+from .helpers import make_account, reset_caches
+
+
+class PeriodTests(TestCase):
+    def test_parses_inclusive_dates(self):
+        self.assertEqual(statements.parse_period('2024-01-01', '2024-01-31'),
+                         (datetime.date(2024, 1, 1), datetime.date(2024, 1, 31)))
+
+    def test_rejects_bad_periods(self):
+        for start, end in (('2024-02-01', '2024-01-31'), ('2024-01-01', 'soon'), (None, '2024-01-01'),
+                           ('2024-01-01', '9999-12-31'), ('0001-01-01', '2024-01-01')):
+            with self.subTest(start=start, end=end), self.assertRaises(statements.InvalidPeriod):
+                statements.parse_period(start, end)
+
+
+class StatementViewTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.account = make_account('alice', '0.00')
+        services.deposit(self.account, Decimal('12.50'), 'Salary')
+        self.client.force_login(self.account.user)
+
+    def test_latest_end_date_is_reported_not_a_server_error(self):
+        response = self.client.get(reverse('statement'), {'start': '2024-01-01', 'end': '9999-12-31'}, follow=True)
+        self.assertRedirects(response, reverse('history'))
+        self.assertContains(response, 'Dates must fall between 0001-01-02 and 9999-12-30.')
+
+    def test_widest_period_streams(self):
+        response = self.client.get(reverse('statement'), {'start': '0001-01-02', 'end': '9999-12-30'})
+        self.assertIn('Salary', b''.join(response.streaming_content).decode())
+
+    def test_export_command_rejects_latest_end_date(self):
+        with self.assertRaisesMessage(CommandError, '9999-12-30'):
+            call_command('export_statement', self.account.account_number, '--start', '2024-01-01',
+                         '--end', '9999-12-31', stdout=StringIO())
@@ -1,16 +1,26 @@
+from django.conf import settings
 from django.contrib.auth import views as auth_views
-from django.urls import path
+from django.urls import include, path
 from . import views
 
+# Under ASGI the read pages are async views and money movements run in a bounded thread pool
+if settings.CASHG_ASYNC_VIEWS:
+    from . import async_views as page_views
+else:
+    page_views = views
+
 urlpatterns = [
     path('test/', views.test_view, name='test'),
+    path('metrics/', views.metrics_view, name='metrics'),
     path('', views.Login, name='login'),
-    path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/', page_views.dashboard, name='dashboard'),
     path('logout/', views.logout_view, name='logout'),
-    path('deposit/', views.deposit, name='deposit'),
-    path('withdraw/', views.withdraw, name='withdraw'),
-    path('transfer/', views.transfer, name='transfer'),
-    path('history/', views.history, name='history'),
+    path('deposit/', page_views.deposit, name='deposit'),
+    path('withdraw/', page_views.withdraw, name='withdraw'),
+    path('transfer/', page_views.transfer, name='transfer'),
+    path('history/', page_views.history, name='history'),
+    path('history/statement/', page_views.statement, name='statement'),
     path('signup/', views.signup, name='signup'),
-    path('profile/', views.profile, name='profile'),
+    path('profile/', page_views.profile, name='profile'),
+    path('api/v1/', include('CashGApp.api_urls')),
 ]
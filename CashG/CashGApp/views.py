@@ -7,8 +7,17 @@ from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 import random
 from django.views.decorators.csrf import csrf_protect
-from django.db import transaction
-from django.http import HttpResponse
+from django.db import IntegrityError, OperationalError, transaction
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.conf import settings
+from django.template.loader import get_template, render_to_string
+from . import account_cache, idempotency, metrics, partitions, recipients, services, statements
+from .aggregates import summary_for
+from .pagination import InvalidCursor, iter_chunks, paginate
+from .routers import replica_reads, use_primary
+from .search import HistoryFilter
+
+HISTORY_STREAM_MARKER = '<!--cashg:history-rows-->'
 
 
 
@@ -17,6 +26,13 @@ def test_view(request):
     return HttpResponse("CashG Bank is working! Server is running properly.")
 
 
+def metrics_view(request):
+    """Prometheus scrape endpoint; only answers CASHG_METRICS_ALLOWED_IPS"""
+    if request.META.get('REMOTE_ADDR') not in settings.CASHG_METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @csrf_protect
 def Login(request):
     if request.method == 'POST':
@@ -46,10 +62,11 @@ def logout_view(request):
 
 
 @login_required
+@replica_reads
 def dashboard(request):
     try:
-        account = Account.objects.get(user=request.user)
-        recent_transactions = Transaction.objects.filter(account=account).order_by('-timestamp')[:5]
+        account = account_cache.account_snapshot(request.user)
+        recent_transactions = account_cache.recent_transactions(account)
     except Account.DoesNotExist:
         messages.error(request, "Account not found. Please contact support.")
         return redirect('login')
@@ -114,12 +131,32 @@ def signup(request):
     
     return render(request, 'sign_up.html')
 
+def _replay(request, key, operation, request_fingerprint):
+    """Answer a retried money-movement POST from its stored outcome, or return None to process it"""
+    if key is None:
+        return None
+    try:
+        prior = idempotency.lookup(request.user, key, operation, request_fingerprint)
+    except idempotency.KeyReused:
+        messages.error(request, "This request was already submitted with different details.")
+        return redirect(operation)
+    if prior is None:
+        return None
+    label = 'withdrawal' if operation == 'withdraw' else operation
+    messages.success(request, f"This {label} of ₱{prior.amount:,.2f} was already processed (Ref: {prior.reference}).")
+    return redirect('dashboard')
+
+
+def _pending(request, key, operation, request_fingerprint):
+    return idempotency.pending(request.user, key, operation, request_fingerprint) if key else None
+
+
 @login_required
 @csrf_protect  
 def deposit(request):
     try:
-        # For GET requests, just get the account normally
-        account = Account.objects.get(user=request.user)
+        # Cached snapshot; services.deposit only needs its pk and type
+        account = account_cache.account_snapshot(request.user)
     except Account.DoesNotExist:
         messages.error(request, "Account not found.")
         return redirect('dashboard')
@@ -129,32 +166,32 @@ def deposit(request):
         description = request.POST.get('description', '')  # Get optional description
         
         try:
-            amount = Decimal(amount_str)
+            amount = services.cents(amount_str)
             if amount >= 1.00:
-                # Use transaction.atomic() for the POST operation
-                with transaction.atomic():
-                    # Now use select_for_update inside the transaction
-                    account = Account.objects.select_for_update().get(user=request.user)
-                    account.balance += amount
-                    account.save()
-                    
-                    # Create transaction record with custom description if provided
-                    transaction_description = description if description.strip() else f'Deposit to {account.account_type} account'
-                    
-                    Transaction.objects.create(
-                        account=account,
-                        amount=amount,
-                        transaction_type='DEPOSIT',
-                        description=transaction_description
-                    )
-                
+                key = idempotency.get_key(request)
+                request_fingerprint = idempotency.fingerprint('deposit', amount=amount, description=description)
+                replay = _replay(request, key, 'deposit', request_fingerprint)
+                if replay:
+                    return replay
+                try:
+                    services.deposit(account, amount, description, idempotency_key=_pending(request, key, 'deposit', request_fingerprint))
+                except IntegrityError:
+                    # A concurrent request with the same key committed first
+                    replay = _replay(request, key, 'deposit', request_fingerprint)
+                    if replay:
+                        return replay
+                    raise
+                except OperationalError:
+                    # Still locked or deadlocked after bounded retries
+                    messages.error(request, "The bank is busy right now. Your deposit was not made; please try again.")
+                    return render(request, 'deposit.html', {'account': account})
                 messages.success(request, f"Successfully deposited ₱{amount:,.2f}.")
                 return redirect('dashboard')
             else:
                 messages.error(request, "Amount must be at least ₱1.00.")
-        except (ValueError, TypeError, Decimal.InvalidOperation):
-            messages.error(request, "Invalid amount format. Please enter a valid number.")
-        except Account.DoesNotExist:
+        except services.InvalidAmount:
+            messages.error(request, "Invalid amount format. Please enter a number with at most two decimal places.")
+        except services.AccountNotFound:
             messages.error(request, "Account not found during transaction.")
             return redirect('dashboard')
     
@@ -163,62 +200,67 @@ def deposit(request):
 @login_required
 @csrf_protect
 def withdraw(request):
-    # For GET requests, we don't need select_for_update
+    # For GET requests, the cached snapshot is enough
     if request.method == 'GET':
         try:
-            account = Account.objects.get(user=request.user)
+            account = account_cache.account_snapshot(request.user)
         except Account.DoesNotExist:
             messages.error(request, "Account not found.")
             return redirect('dashboard')
         return render(request, 'withdraw.html', {'account': account})
     
-    # For POST requests, we need select_for_update inside a transaction
+    # For POST requests, the balance check and debit happen in one conditional UPDATE
     elif request.method == 'POST':
         amount_str = request.POST.get('amount')
         description = request.POST.get('description', '')
         
         try:
-            amount = Decimal(amount_str)
+            amount = services.cents(amount_str)
             
             # Validate amount range
             if not (200.00 <= amount <= 50000.00):
                 messages.error(request, "Withdrawal must be between ₱200 and ₱50,000.")
                 # Get account for re-rendering the form
-                account = Account.objects.get(user=request.user)
+                account = account_cache.account_snapshot(request.user)
                 return render(request, 'withdraw.html', {'account': account})
             
-            # Use atomic transaction for the withdrawal
-            with transaction.atomic():
-                account = Account.objects.select_for_update().get(user=request.user)
-                
-                # Check sufficient balance
-                if amount > account.balance:
-                    messages.error(request, "Insufficient balance.")
-                    return render(request, 'withdraw.html', {'account': account})
-                
-                # Process withdrawal
-                account.balance -= amount
-                account.save()
-                
-                # Create transaction record
-                Transaction.objects.create(
-                    account=account,
-                    amount=amount,
-                    transaction_type='WITHDRAWAL',
-                    description=description if description else f'Withdrawal from {account.account_type} account'
-                )
+            key = idempotency.get_key(request)
+            request_fingerprint = idempotency.fingerprint('withdraw', amount=amount, description=description)
+            replay = _replay(request, key, 'withdraw', request_fingerprint)
+            if replay:
+                return replay
+            
+            account = account_cache.account_snapshot(request.user)
+            try:
+                services.withdraw(account, amount, description, idempotency_key=_pending(request, key, 'withdraw', request_fingerprint))
+            except IntegrityError:
+                replay = _replay(request, key, 'withdraw', request_fingerprint)
+                if replay:
+                    return replay
+                raise
+            except services.InsufficientFunds:
+                messages.error(request, "Insufficient balance.")
+                account.refresh_from_db(fields=['balance'])
+                return render(request, 'withdraw.html', {'account': account})
+            except services.InactiveAccount:
+                messages.error(request, "Your account is inactive. Please contact support.")
+                return render(request, 'withdraw.html', {'account': account})
+            except OperationalError:
+                # Still locked or deadlocked after bounded retries
+                messages.error(request, "The bank is busy right now. Your withdrawal was not made; please try again.")
+                return render(request, 'withdraw.html', {'account': account})
                 
             messages.success(request, f"Successfully withdrew ₱{amount:,.2f}.")
             return redirect('dashboard')
             
-        except Account.DoesNotExist:
+        except (Account.DoesNotExist, services.AccountNotFound):
             messages.error(request, "Account not found.")
             return redirect('dashboard')
-        except (ValueError, TypeError, Decimal.InvalidOperation):
-            messages.error(request, "Invalid amount format.")
+        except services.InvalidAmount:
+            messages.error(request, "Invalid amount format. Please enter a number with at most two decimal places.")
             # Get account for re-rendering the form
             try:
-                account = Account.objects.get(user=request.user)
+                account = account_cache.account_snapshot(request.user)
                 return render(request, 'withdraw.html', {'account': account})
             except Account.DoesNotExist:
                 return redirect('dashboard')
@@ -227,9 +269,9 @@ def withdraw(request):
 @login_required
 @csrf_protect
 def transfer(request):
-    # Get account without select_for_update for GET requests
+    # Cached snapshot; services.transfer re-reads and locks the rows it changes
     try:
-        account = Account.objects.get(user=request.user)
+        account = account_cache.account_snapshot(request.user)
     except Account.DoesNotExist:
         messages.error(request, "Account not found.")
         return redirect('dashboard')
@@ -240,9 +282,9 @@ def transfer(request):
         note = request.POST.get('description', '')  # Changed from 'note' to match HTML form
         
         try:
-            amount = Decimal(amount_str)
-        except (ValueError, TypeError, Decimal.InvalidOperation):
-            messages.error(request, "Invalid amount.")
+            amount = services.cents(amount_str)
+        except services.InvalidAmount:
+            messages.error(request, "Invalid amount. Please enter a number with at most two decimal places.")
             return render(request, 'transfer.html', {'account': account})
         
         # Basic validation before entering transaction
@@ -250,107 +292,188 @@ def transfer(request):
             messages.error(request, "Transfer amount must be between ₱1 and ₱50,000.")
             return render(request, 'transfer.html', {'account': account})
         
-        # Find recipient by account number instead of username
-        try:
-            recipient_account = Account.objects.get(account_number=recipient_account_number)
-            recipient_user = recipient_account.user
-        except Account.DoesNotExist:
-            messages.error(request, "Recipient account not found.")
-            return render(request, 'transfer.html', {'account': account})
+        key = idempotency.get_key(request)
+        request_fingerprint = idempotency.fingerprint(
+            'transfer', recipient=recipient_account_number, amount=amount, note=note)
+        replay = _replay(request, key, 'transfer', request_fingerprint)
+        if replay:
+            return replay
         
-        # Check if trying to transfer to own account
-        if recipient_account.account_number == account.account_number:
-            messages.error(request, "Cannot transfer to your own account.")
+        # Cached projection of the recipient; services.transfer locks it by primary key
+        try:
+            recipient = recipients.resolve(account, recipient_account_number)
+        except recipients.InvalidRecipient as e:
+            messages.error(request, str(e))
             return render(request, 'transfer.html', {'account': account})
         
-        # Use atomic transaction with select_for_update
         try:
-            with transaction.atomic():
-                # Lock both accounts to prevent race conditions
-                sender_account = Account.objects.select_for_update().get(user=request.user)
-                recipient_account = Account.objects.select_for_update().get(account_number=recipient_account_number)
-                
-                # Check balance after locking
-                if amount > sender_account.balance:
-                    messages.error(request, "Insufficient balance.")
-                    return render(request, 'transfer.html', {'account': sender_account})
-                
-                # Perform the transfer
-                sender_account.balance -= amount
-                recipient_account.balance += amount
-                sender_account.save()
-                recipient_account.save()
-                
-                # Create transaction records
-                Transaction.objects.create(
-                    account=sender_account,
-                    amount=amount,
-                    description=f'Transfer to {recipient_account.account_number}: {note}' if note else f'Transfer to {recipient_account.account_number}',
-                    transaction_type='TRANSFER'
-                )
-                Transaction.objects.create(
-                    account=recipient_account,
-                    amount=amount,
-                    description=f'Received from {sender_account.account_number}: {note}' if note else f'Received from {sender_account.account_number}',
-                    transaction_type='RECEIVED'
-                )
-                Transfer.objects.create(
-                    sender_account=sender_account,
-                    recipient_account=recipient_account,
-                    amount=amount,
-                    note=note
-                )
-                
-            messages.success(request, f"Successfully transferred ₱{amount:,.2f} to account {recipient_account_number}.")
-            return redirect('dashboard')
-            
-        except Exception as e:
-            messages.error(request, "Transfer failed. Please try again.")
+            services.transfer(account, recipient.account(), amount, note,
+                              idempotency_key=_pending(request, key, 'transfer', request_fingerprint))
+        except IntegrityError:
+            replay = _replay(request, key, 'transfer', request_fingerprint)
+            if replay:
+                return replay
+            raise
+        except services.InsufficientFunds:
+            messages.error(request, "Insufficient balance.")
+            account.refresh_from_db(fields=['balance'])
+            return render(request, 'transfer.html', {'account': account})
+        except services.InactiveAccount as e:
+            if e.args[0] == account.pk:
+                messages.error(request, "Your account is inactive. Please contact support.")
+            else:
+                messages.error(request, "Recipient account is inactive.")
+            return render(request, 'transfer.html', {'account': account})
+        except services.AccountNotFound:
+            messages.error(request, "Recipient account not found.")
             return render(request, 'transfer.html', {'account': account})
+        except OperationalError:
+            # Still deadlocked or serialization-failed after bounded retries
+            messages.error(request, "The bank is busy right now. Your transfer was not made; please try again.")
+            return render(request, 'transfer.html', {'account': account})
+        
+        messages.success(request, f"Successfully transferred ₱{amount:,.2f} to account {recipient_account_number}.")
+        return redirect('dashboard')
     
     return render(request, 'transfer.html', {'account': account})
 
 @login_required
+@replica_reads
 def history(request):
     try:
         account = Account.objects.get(user=request.user)
-        transactions = Transaction.objects.filter(account=account).order_by('-timestamp')
     except Account.DoesNotExist:
         messages.error(request, "Account not found.")
         return redirect('dashboard')
 
+    filters = HistoryFilter(request.GET)
+    for error in filters.errors:
+        messages.error(request, error)
+    transactions = filters.apply(Transaction.objects.filter(account=account))
+    summary = summary_for(account)
     context = {
         'account': account,
-        'transactions': transactions,
+        'total_deposits': summary.total_deposits,
+        'total_withdrawals': summary.total_withdrawals,
+        'total_transfers': summary.total_transfers,
+        'total_transactions': summary.transaction_count,
+        'filters': filters,
+        'transaction_types': Transaction.TRANSACTION_TYPE,
     }
+
+    # Streaming mode renders every row without materializing the queryset
+    if request.GET.get('stream') and context['total_transactions']:
+        context['archived_until'] = partitions.archived_until(account.pk)
+        return _stream_history(request, context, transactions)
+
+    try:
+        context['transactions'] = paginate(
+            transactions,
+            cursor=request.GET.get('cursor'),
+            page_size=settings.CASHG_HISTORY_PAGE_SIZE,
+        )
+    except InvalidCursor:
+        messages.error(request, "Invalid page link. Showing your latest transactions.")
+        context['transactions'] = paginate(transactions, page_size=settings.CASHG_HISTORY_PAGE_SIZE)
+    # Archived rows are not listed; the last page says where the history stops
+    if not context['transactions'].has_next:
+        context['archived_until'] = partitions.archived_until(account.pk)
+
     return render(request, 'transactions.html', context)
 
 
+def _stream_history(request, context, transactions):
+    """Stream the history page, rendering rows one keyset chunk at a time"""
+    page = render_to_string(
+        'transactions.html',
+        {**context, 'streaming': True, 'stream_marker': HISTORY_STREAM_MARKER},
+        request=request,
+    )
+    head, tail = page.split(HISTORY_STREAM_MARKER, 1)
+    rows_template = get_template('transaction_rows.html')
+    # The rows are fetched after the view returns, so fix the database the router picked now
+    transactions = transactions.using(transactions.db)
+
+    def render_page():
+        yield head
+        for chunk in iter_chunks(transactions, settings.CASHG_HISTORY_STREAM_CHUNK_SIZE):
+            yield rows_template.render({'transactions': chunk})
+        yield tail
+
+    return StreamingHttpResponse(render_page(), content_type='text/html; charset=utf-8')
+
+
+def statement_options(request):
+    """Return (start, end, format, gzip) from the statement query string or raise statements.InvalidPeriod"""
+    start, end = statements.parse_period(request.GET.get('start'), request.GET.get('end'))
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in statements.FORMATS:
+        raise statements.InvalidPeriod(f'Unknown format {fmt!r}.')
+    return start, end, fmt, bool(request.GET.get('gzip'))
+
+
+def statement_response(content, account, start, end, fmt, compress):
+    response = StreamingHttpResponse(content, content_type='application/gzip' if compress else statements.FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{statements.filename(account, start, end, fmt, compress)}"'
+    return response
+
+
+@login_required
+@replica_reads
+def statement(request):
+    try:
+        account = Account.objects.get(user=request.user)
+    except Account.DoesNotExist:
+        messages.error(request, "Account not found.")
+        return redirect('dashboard')
+
+    try:
+        start, end, fmt, compress = statement_options(request)
+    except statements.InvalidPeriod as e:
+        messages.error(request, str(e))
+        return redirect('history')
+
+    content = statements.stream(account, start, end, fmt, compress)
+    return statement_response(content, account, start, end, fmt, compress)
+
+
+def _account_and_profile(user):
+    """Return the user's Account and Profile, creating either one if it is missing"""
+    account = Account.objects.filter(user=user).first()
+    user_profile = Profile.objects.filter(user=user).first()
+    if account is None or user_profile is None:
+        # The replica may only be lagging; look again on the primary before creating
+        with use_primary():
+            if account is None:
+                account, created = Account.objects.get_or_create(
+                    user=user,
+                    defaults={
+                        'account_number': f"ACC{user.id:06d}",
+                        'account_type': 'Savings',
+                        'balance': 0.00
+                    }
+                )
+            if user_profile is None:
+                user_profile, created = Profile.objects.get_or_create(user=user)
+    return account, user_profile
+
+
 @login_required
+@replica_reads
 def profile(request):
-    # Get or create Account
-    account, created = Account.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'account_number': f"ACC{request.user.id:06d}",
-            'account_type': 'Savings',
-            'balance': 0.00
-        }
-    )
-    
-    # Get or create Profile
-    user_profile, created = Profile.objects.get_or_create(user=request.user)
+    account, user_profile = _account_and_profile(request.user)
     
     if request.method == 'POST':
         messages.success(request, "Profile updated successfully.")
         return redirect('profile')
     
+    summary = summary_for(account)
     context = {
         'account': account,
         'profile': user_profile,
-        'total_deposits': 0,
-        'total_withdrawals': 0,
-        'total_transfers': 0,
-        'total_transactions': 0,
+        'total_deposits': summary.total_deposits,
+        'total_withdrawals': summary.total_withdrawals,
+        'total_transfers': summary.total_transfers,
+        'total_transactions': summary.transaction_count,
     }
     return render(request, 'profile.html', context)
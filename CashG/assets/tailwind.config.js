@@ -0,0 +1,22 @@
+// Built by `python manage.py build_assets`; only classes that appear in the
+// templates end up in the stylesheet, so add any class built at runtime in
+// JavaScript as a complete string somewhere in a template. Keep the theme in
+// step with the CDN fallback in base.html.
+module.exports = {
+    content: {
+        relative: true,
+        files: ['../CashGApp/templates/**/*.html'],
+    },
+    theme: {
+        extend: {
+            colors: {
+                primary: {
+                    50: '#eff6ff',
+                    500: '#3b82f6',
+                    600: '#2563eb',
+                    700: '#1d4ed8',
+                }
+            }
+        }
+    },
+}
@@ -11,5 +11,8 @@ python manage.py makemigrations CashGApp
 # Run database migrations
 python manage.py migrate
 
+# Build the purged stylesheet and subset icon font
+python manage.py build_assets
+
 # Collect static files
 python manage.py collectstatic --noinput